@@ -0,0 +1,126 @@
+"""
+Сравнение бэкендов кэша: LocMemCache, FileBasedCache и MmapCache.
+
+Меряем скорость set/get/get_many/incr в одном процессе и долю попаданий,
+когда ключи записал один процесс, а читают несколько воркеров - как
+gunicorn с несколькими воркерами на одной машине.
+
+    python benchmarks/cache_backends.py [--operations 10000] [--workers 4]
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import django  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+DIRECTORY = tempfile.mkdtemp(prefix='yatube-cache-bench-')
+BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+    'filebased': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(DIRECTORY, 'files'),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+    'mmap': {
+        'BACKEND': 'yatube.mmap_cache.MmapCache',
+        'LOCATION': os.path.join(DIRECTORY, 'mmap'),
+        'OPTIONS': {'MAX_ENTRIES': 100000, 'MAX_SIZE': 256 * 1024 * 1024},
+    },
+}
+settings.configure(CACHES={'default': BACKENDS['locmem'], **BACKENDS})
+django.setup()
+
+from django.core.cache import caches  # noqa: E402
+
+# примерно как фрагмент ленты на главной
+VALUE = 'x' * 4096
+
+
+def timed(function, operations):
+    start = time.perf_counter()
+    function()
+    return operations / (time.perf_counter() - start)
+
+
+def throughput(cache, operations):
+    keys = [f'key:{i}' for i in range(operations)]
+    cache.clear()
+    cache.set('counter', 0)
+    results = {
+        'set': timed(
+            lambda: [cache.set(key, VALUE) for key in keys], operations),
+        'get': timed(lambda: [cache.get(key) for key in keys], operations),
+        'get_many': timed(
+            lambda: [
+                cache.get_many(keys[i:i + 10])
+                for i in range(0, operations, 10)],
+            operations),
+        'incr': timed(
+            lambda: [cache.incr('counter') for _ in keys], operations),
+    }
+    return results
+
+
+def read_keys(name, keys, queue):
+    cache = caches[name]
+    queue.put(sum(cache.get(key) is not None for key in keys))
+
+
+def shared_hit_rate(name, operations, workers):
+    """
+    Доля попаданий у воркеров-потомков по ключам, записанным родителем
+    """
+    cache = caches[name]
+    keys = [f'shared:{i}' for i in range(operations)]
+    cache.clear()
+    # LocMemCache потомок унаследовал бы при fork, поэтому пишем после
+    # запуска воркеров: процессы ждут сигнала
+    queue = multiprocessing.Queue()
+    start = multiprocessing.Event()
+
+    def worker():
+        start.wait()
+        read_keys(name, keys, queue)
+
+    processes = [
+        multiprocessing.Process(target=worker) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    cache.set_many({key: VALUE for key in keys})
+    start.set()
+    hits = sum(queue.get() for _ in processes)
+    for process in processes:
+        process.join()
+    return hits / (operations * workers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--operations', type=int, default=10000)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    print(f'{"backend":<10} {"set/s":>10} {"get/s":>10} '
+          f'{"get_many/s":>11} {"incr/s":>10} {"shared hits":>12}')
+    for name in BACKENDS:
+        results = throughput(caches[name], args.operations)
+        hit_rate = shared_hit_rate(name, args.operations // 10, args.workers)
+        print(f'{name:<10} {results["set"]:>10.0f} {results["get"]:>10.0f} '
+              f'{results["get_many"]:>11.0f} {results["incr"]:>10.0f} '
+              f'{hit_rate:>12.0%}')
+    shutil.rmtree(DIRECTORY, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    multiprocessing.set_start_method('fork')
+    main()
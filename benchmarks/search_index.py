@@ -0,0 +1,114 @@
+"""
+Нагрузочная проверка встроенного поискового индекса (posts.search.index)
+на синтетических постах: время построения, размер сегментов, время
+открытия индекса и задержки запросов.
+
+    python benchmarks/search_index.py [--posts 1000000] [--queries 200]
+"""
+import argparse
+import itertools
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from posts.search.index import SearchIndex  # noqa: E402
+
+STEMS = (
+    'гор', 'мор', 'лес', 'город', 'дорог', 'книг', 'музык', 'фотограф',
+    'кот', 'собак', 'поезд', 'самолет', 'работ', 'школ', 'погод', 'зим',
+    'лет', 'весн', 'осен', 'друг', 'семь', 'кухн', 'рецепт', 'кофе',
+    'python', 'django', 'travel', 'photo', 'code', 'music',
+)
+ENDINGS = ('', 'а', 'ы', 'у', 'ой', 'ам', 'ах', 'ами', 'ский', 'ная')
+
+
+def vocabulary(size, rng):
+    words = set()
+    while len(words) < size:
+        stem = rng.choice(STEMS) + ''.join(
+            rng.choice('абвгдеклмнопрст') for _ in range(rng.randint(0, 3)))
+        words.add(stem + rng.choice(ENDINGS))
+    return sorted(words)
+
+
+def zipf_weights(size):
+    """
+    Накопленные частоты слов по закону Ципфа, как в живом тексте
+    """
+    return list(itertools.accumulate(
+        1 / rank for rank in range(1, size + 1)))
+
+
+def posts(start, count, words, weights, rng):
+    for doc_id in range(start, start + count):
+        yield doc_id, ' '.join(
+            rng.choices(words, cum_weights=weights, k=rng.randint(5, 60)))
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def percentiles(timings):
+    timings = sorted(timings)
+    return (
+        statistics.median(timings) * 1000,
+        timings[int(len(timings) * 0.95)] * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--posts', type=int, default=1000000)
+    parser.add_argument('--words', type=int, default=50000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    words = vocabulary(args.words, rng)
+    weights = zipf_weights(len(words))
+    directory = tempfile.mkdtemp(prefix='yatube-search-bench-')
+    try:
+        index = SearchIndex(directory)
+        _, elapsed = timed(
+            lambda: index.rebuild(posts(1, args.posts, words, weights, rng)))
+        size = sum(
+            os.path.getsize(os.path.join(directory, name))
+            for name in os.listdir(directory) if name.endswith('.seg'))
+        print(f'posts: {args.posts}, build: {elapsed:.1f} s, '
+              f'segments: {size / 2 ** 20:.1f} MiB')
+
+        _, elapsed = timed(lambda: SearchIndex(directory))
+        print(f'open (mmap): {elapsed * 1000:.1f} ms')
+
+        queries = {
+            'frequent term': lambda: rng.choice(words[:20]),
+            'rare term': lambda: rng.choice(words[-1000:]),
+            'two terms': lambda: ' '.join(rng.sample(words[:2000], 2)),
+        }
+        for name, query in queries.items():
+            timings = [
+                timed(lambda: index.search(query()))[1]
+                for _ in range(args.queries)]
+            median, p95 = percentiles(timings)
+            print(f'{name:<14} p50 {median:8.2f} ms  p95 {p95:8.2f} ms')
+
+        timings = [
+            timed(lambda: index.add(posts(doc_id, 1, words, weights, rng)))[1]
+            for doc_id in range(args.posts + 1, args.posts + args.queries)]
+        median, p95 = percentiles(timings)
+        print(f'{"add":<14} p50 {median:8.2f} ms  p95 {p95:8.2f} ms')
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
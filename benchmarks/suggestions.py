@@ -0,0 +1,58 @@
+"""
+Расчет рекомендаций "Кого почитать" (posts.suggestions) на синтетическом
+графе подписок: популярность авторов распределена по степенному закону,
+как в живой сети. Меряем построение CSR и векторный расчет без записи
+в базу.
+
+    python benchmarks/suggestions.py [--edges 1000000] [--users 100000]
+"""
+import argparse
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+import numpy as np  # noqa: E402
+
+from posts.dataset import follow_edges  # noqa: E402
+from posts.suggestions import FollowGraph  # noqa: E402
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--edges', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    followers, authors = follow_edges(
+        args.users, args.edges, np.random.default_rng(args.seed))
+    graph, elapsed = timed(lambda: FollowGraph(followers, authors))
+    print(f'edges: {len(followers)}, users: {graph.size}, '
+          f'csr: {elapsed:.2f} s')
+
+    blocks, elapsed = timed(lambda: list(graph.suggestions(args.limit)))
+    suggestions = sum(len(users) for users, _, _ in blocks)
+    paths = int(graph.path_counts().sum())
+    print(f'blocks: {len(blocks)}, paths: {paths}, '
+          f'suggestions: {suggestions}, scoring: {elapsed:.2f} s')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f'peak RSS: {peak / 1024:.0f} MiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""
+Время ответа страниц на текущей базе, например после generate_dataset.
+Каждый адрес из posts/urls.py и private_messages/urls.py запрашивается
+тестовым клиентом Django --requests раз после одного прогревочного;
+печатаем p50/p95/p99, число запросов к базе и размер ответа. --output
+сохраняет то же в JSON, чтобы сравнивать прогоны.
+
+Страницы смотрит самый активный читатель (больше всего подписок),
+автором и сообществом берем тех, у кого больше всего постов.
+Адреса, которые меняют данные на GET, пропускаем.
+
+    python benchmarks/views.py [--requests 50] [--user user0]
+                               [--anonymous] [--output run.json]
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.db.models import Count, Q  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from django.urls import reverse  # noqa: E402
+
+from posts import urls as posts_urls  # noqa: E402
+from posts.models import Group, Post, Profile  # noqa: E402
+from private_messages import urls as messages_urls  # noqa: E402
+from private_messages.models import Topic  # noqa: E402
+
+User = get_user_model()
+
+# меняют данные на GET или принимают только POST
+SKIPPED = {
+    'profile_follow', 'profile_unfollow', 'post_delete', 'follow_batch',
+    'private_messages_topic_delete'}
+QUERY_PARAMS = {
+    'search_results': {'q': 'море'},
+    'private_messages_since': {'after_id': 0},
+}
+
+
+def percentile(values, percent):
+    """
+    Ближайший ранг: значение, не меньше которого percent% выборки
+    """
+    values = sorted(values)
+    return values[max(math.ceil(percent / 100 * len(values)) - 1, 0)]
+
+
+def url_arguments(reader):
+    author = Profile.objects.order_by('-post_count').first().user
+    post = Post.objects.filter(author=author).first()
+    group = Group.objects.annotate(
+        count=Count('posts')).order_by('-count').first()
+    topic = Topic.objects.filter(
+        Q(sender=reader) | Q(recipient=reader)).first()
+    return {
+        'username': author.username,
+        'user_id': author.id,
+        'post_id': post and post.id,
+        'slug': group and group.slug,
+        'topic_id': topic and topic.id,
+    }
+
+
+def pages(arguments):
+    """
+    (имя, адрес) всех страниц, для которых нашлись аргументы
+    """
+    for pattern in posts_urls.urlpatterns + messages_urls.urlpatterns:
+        if pattern.name in SKIPPED:
+            continue
+        kwargs = {
+            name: arguments[name] for name in pattern.pattern.converters}
+        if None in kwargs.values():
+            continue
+        yield pattern.name, reverse(pattern.name, kwargs=kwargs)
+
+
+def measure(client, url, params, requests):
+    client.get(url, params)
+    latencies, queries = [], []
+    for _ in range(requests):
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = client.get(url, params)
+            latencies.append((time.perf_counter() - start) * 1000)
+        queries.append(len(captured))
+    return {
+        'url': url,
+        'status': response.status_code,
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'queries': percentile(queries, 50),
+        'max_queries': max(queries),
+        'bytes': len(response.content),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument(
+        '--user', help='Кто смотрит страницы (по умолчанию - у кого '
+                       'больше всего подписок)')
+    parser.add_argument(
+        '--anonymous', action='store_true', help='Смотреть без входа')
+    parser.add_argument('--output', help='Куда сохранить результат в JSON')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    # без панели отладки: она меняет и время, и размер ответа
+    settings.DEBUG = False
+    settings.PM_LONG_POLL_TIMEOUT = 0
+    # синтетические запросы не должны попасть в /metrics сайта
+    settings.METRICS_DIR = None
+
+    if args.user:
+        reader = User.objects.get(username=args.user)
+    else:
+        # с перепиской, если такие есть, чтобы открыть и ее страницы
+        profiles = Profile.objects.order_by('-follower_count')
+        reader = (
+            profiles.filter(user__pm_participants__isnull=False).first()
+            or profiles.first()).user
+    client = Client()
+    if not args.anonymous:
+        client.force_login(reader)
+
+    results = {}
+    print(f'{"страница":<32} {"код":>4} {"p50":>8} {"p95":>8} {"p99":>8} '
+          f'{"запросы":>8} {"байт":>8}')
+    for name, url in pages(url_arguments(reader)):
+        result = measure(
+            client, url, QUERY_PARAMS.get(name, {}), args.requests)
+        results[name] = result
+        print(f'{name:<32} {result["status"]:>4} {result["p50_ms"]:>8.1f} '
+              f'{result["p95_ms"]:>8.1f} {result["p99_ms"]:>8.1f} '
+              f'{result["queries"]:>8} {result["bytes"]:>8}')
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({
+                'database': connection.vendor,
+                'user': None if args.anonymous else reader.username,
+                'requests': args.requests,
+                'pages': results,
+            }, output, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+TAG_PREFIX = 'tag:'
+
+
+def initial_version():
+    """
+    Новая версия тега больше любой прежней, даже если тег вытеснен из кэша
+    """
+    return int(time.time() * 1000)
+
+
+def get_versions(tags):
+    """
+    Текущие версии тегов одним запросом к кэшу
+    """
+    keys = [TAG_PREFIX + tag for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, initial_version(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def invalidate(*tags):
+    """
+    Сбрасываем все фрагменты, помеченные любым из тегов. Внутри
+    транзакции - еще раз после коммита: параллельный запрос мог успеть
+    прочитать старые данные и закэшировать их под новой версией
+    """
+    _increment(tags)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _increment(tags))
+
+
+def _increment(tags):
+    for tag in tags:
+        key = TAG_PREFIX + tag
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, initial_version(), None)
+
+
+def tag_request(request, *tags):
+    """
+    Помечаем страницу тегами. Версии читаем до запросов к базе: если
+    данные изменятся во время рендера, кэш страницы сразу устареет
+    """
+    if not hasattr(request, 'cache_tags'):
+        request.cache_tags = []
+        request.cache_versions = []
+    request.cache_tags += tags
+    request.cache_versions += get_versions(tags)
+    return request.cache_tags
+
+
+def post_tags(post):
+    tags = ['posts', f'post:{post.id}', f'author:{post.author_id}']
+    if post.group_id:
+        tags.append(f'group:{post.group.slug}')
+    return tags
@@ -0,0 +1,39 @@
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Post, Profile
+
+# (модель, счетчик, считаемая модель, ее внешний ключ, поле модели)
+COUNTERS = (
+    (Post, 'comment_count', Comment, 'post', 'pk'),
+    (Profile, 'post_count', Post, 'author', 'user_id'),
+    (Profile, 'follower_count', Follow, 'user', 'user_id'),
+    (Profile, 'following_count', Follow, 'author', 'user_id'),
+)
+
+
+def count_subquery(model, field, outer):
+    """
+    Число строк model, ссылающихся на строку внешнего запроса
+    """
+    counts = (
+        model.objects.filter(**{field: OuterRef(outer)})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total'))
+    return Coalesce(
+        Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def repair():
+    """
+    Пересчитываем разошедшиеся счетчики, по одному UPDATE на счетчик
+    """
+    fixed = {}
+    for model, counter, related, field, outer in COUNTERS:
+        actual = count_subquery(related, field, outer)
+        fixed[f'{model.__name__}.{counter}'] = (
+            model.objects.exclude(**{counter: actual})
+            .update(**{counter: actual}))
+    return fixed
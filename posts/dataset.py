@@ -0,0 +1,328 @@
+"""
+Синтетический набор данных для нагрузочных замеров (команда
+generate_dataset): пользователи, граф подписок, посты с картинками,
+комментарии и личные переписки. Популярность авторов распределена по
+степенному закону, как в живой сети: на первых подписываются, пишут
+и комментируют чаще остальных.
+
+Все строки пишутся пачками через bulk_create, сигналы не срабатывают,
+поэтому производные данные - счетчики, ленты подписок, поисковый
+индекс, активность для популярного - заполняются отдельно в конце.
+Один и тот же seed дает тот же набор
+"""
+import io
+import itertools
+from contextlib import contextmanager
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.db.models import Count, F, Max
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+from PIL import Image
+
+from private_messages.models import Message, Participant, Topic
+
+from . import counters, trending
+from .models import (Comment, Follow, Group, GroupActivity, Post, PostActivity,
+                     Profile, StoredFile, TimelineEntry)
+from .search import get_backend
+
+User = get_user_model()
+
+BATCH_SIZE = 10000
+IMAGE_SIZE = (640, 480)
+WORDS = (
+    'утро', 'город', 'море', 'горы', 'поездка', 'кофе', 'книга', 'кино',
+    'музыка', 'друзья', 'работа', 'дождь', 'солнце', 'лес', 'река',
+    'дорога', 'поезд', 'ужин', 'рецепт', 'выставка', 'концерт', 'футбол',
+    'осень', 'зима', 'весна', 'лето', 'фото', 'прогулка', 'вечер', 'кот')
+
+
+def insert(model, objects):
+    """
+    bulk_create пачками по BATCH_SIZE, не держа в памяти все строки
+    """
+    objects = iter(objects)
+    while True:
+        batch = list(itertools.islice(objects, BATCH_SIZE))
+        if not batch:
+            return
+        model.objects.bulk_create(batch)
+
+
+def last_id(model):
+    return model.objects.aggregate(last=Max('id'))['last'] or 0
+
+
+@contextmanager
+def explicit_dates(model, name):
+    """
+    Даты из набора вместо текущего времени, которое подставил бы
+    auto_now_add
+    """
+    field = model._meta.get_field(name)
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def power_law(rng, size, count):
+    """
+    count номеров из 0..size-1; номер i выпадает с весом 1 / (i + 1)
+    """
+    weights = 1 / np.arange(1, size + 1)
+    return rng.choice(size, size=count, p=weights / weights.sum())
+
+
+def follow_edges(users, edges, rng):
+    """
+    До edges подписок между номерами 0..users-1 без повторов и подписок
+    на себя; автора выбираем с весом 1 / (номер + 1)
+    """
+    followers = rng.integers(0, users, size=edges * 2)
+    authors = power_law(rng, users, edges * 2)
+    pairs = np.unique(
+        np.stack((followers, authors), axis=1)[followers != authors], axis=0)
+    pairs = pairs[rng.permutation(len(pairs))[:edges]]
+    return pairs[:, 0], pairs[:, 1]
+
+
+class DatasetGenerator:
+    def __init__(self, prefix='user', seed=1, days=365):
+        self.prefix = prefix
+        self.rng = np.random.default_rng(seed)
+        self.now = timezone.now()
+        self.start = self.now - timedelta(days=days)
+        self.span = (self.now - self.start).total_seconds()
+
+    def dates(self, count):
+        """
+        count моментов внутри периода набора по возрастанию
+        """
+        seconds = np.sort(self.rng.uniform(0, self.span, count))
+        return [self.start + timedelta(seconds=value) for value in seconds]
+
+    def text(self, low, high):
+        return ' '.join(self.rng.choice(WORDS, self.rng.integers(low, high)))
+
+    def users(self, count):
+        before = last_id(User)
+        # вход в эти аккаунты по паролю невозможен
+        password = make_password(None)
+        insert(User, (
+            User(username=f'{self.prefix}{n}', password=password,
+                 date_joined=self.start)
+            for n in range(count)))
+        self.user_ids = np.array(User.objects.filter(
+            id__gt=before).order_by('id').values_list('id', flat=True))
+        insert(Profile, (Profile(user_id=user_id)
+                         for user_id in self.user_ids.tolist()))
+
+    def groups(self, count):
+        before = last_id(Group)
+        insert(Group, (
+            Group(title=f'Сообщество {n}', slug=f'{self.prefix}-group-{n}',
+                  description=self.text(5, 20))
+            for n in range(count)))
+        self.group_ids = list(Group.objects.filter(
+            id__gt=before).order_by('id').values_list('id', flat=True))
+
+    def follows(self, count):
+        followers, authors = follow_edges(
+            len(self.user_ids), count, self.rng)
+        insert(Follow, (
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id, author_id in zip(
+                self.user_ids[followers].tolist(),
+                self.user_ids[authors].tolist())))
+
+    def images(self, count):
+        """
+        count разных картинок через хранилище по умолчанию: из мелкого
+        шума, увеличенного блоками, - сжимается как фотография
+        """
+        self.image_names = []
+        for n in range(count):
+            noise = self.rng.integers(0, 256, (60, 80, 3), dtype=np.uint8)
+            image = Image.fromarray(noise).resize(IMAGE_SIZE, Image.NEAREST)
+            content = io.BytesIO()
+            image.save(content, 'JPEG', quality=85)
+            self.image_names.append(default_storage.save(
+                f'posts/{self.prefix}{n}.jpg',
+                ContentFile(content.getvalue())))
+
+    def posts(self, count, image_share):
+        before = last_id(Post)
+        authors = self.user_ids[power_law(
+            self.rng, len(self.user_ids), count)].tolist()
+        # половина постов вне сообществ
+        groups = self.rng.integers(
+            0, max(len(self.group_ids) * 2, 1), count).tolist()
+        images = [
+            self.image_names[index] if self.image_names and share else ''
+            for share, index in zip(
+                self.rng.random(count) < image_share,
+                self.rng.integers(0, max(len(self.image_names), 1), count))]
+        with explicit_dates(Post, 'pub_date'):
+            insert(Post, (
+                Post(text=self.text(5, 60), author_id=author,
+                     group_id=(self.group_ids[group]
+                               if group < len(self.group_ids) else None),
+                     pub_date=pub_date, image=image)
+                for author, group, image, pub_date in zip(
+                    authors, groups, images, self.dates(count))))
+        # одна ссылка на картинку уже есть после сохранения
+        for name in self.image_names:
+            uses = images.count(name)
+            if uses:
+                StoredFile.objects.filter(name=name).update(
+                    ref_count=F('ref_count') + uses - 1)
+            else:
+                default_storage.delete(name)
+        self.post_rows = list(Post.objects.filter(id__gt=before).order_by(
+            'id').values_list('id', 'author_id', 'pub_date'))
+
+    def comments(self, count):
+        # популярны случайные посты, а не самые старые
+        order = self.rng.permutation(len(self.post_rows))
+        posts = order[power_law(self.rng, len(self.post_rows), count)]
+        authors = self.rng.choice(self.user_ids, count).tolist()
+        delays = self.rng.exponential(24 * 60 * 60, count).tolist()
+        with explicit_dates(Comment, 'created'):
+            insert(Comment, (
+                Comment(post_id=self.post_rows[post][0], author_id=author,
+                        text=self.text(3, 20),
+                        created=min(
+                            self.post_rows[post][2]
+                            + timedelta(seconds=delay), self.now))
+                for post, author, delay in zip(
+                    posts.tolist(), authors, delays)))
+
+    def topics(self, count, messages):
+        """
+        Переписки: пишут кому угодно, но чаще популярным авторам;
+        в каждой в среднем messages сообщений, последнее не прочитано
+        """
+        before = last_id(Topic)
+        senders = self.rng.choice(self.user_ids, count)
+        recipients = self.user_ids[power_law(
+            self.rng, len(self.user_ids), count)]
+        keep = senders != recipients
+        pairs = list(zip(senders[keep].tolist(), recipients[keep].tolist()))
+        lengths = self.rng.geometric(1 / messages, len(pairs)).tolist()
+        histories = []
+        for length in lengths:
+            seconds = np.sort(self.rng.uniform(0, self.span, length))
+            from_sender = self.rng.random(length) < 0.5
+            from_sender[0] = True
+            histories.append(list(zip(
+                [self.start + timedelta(seconds=value) for value in seconds],
+                from_sender.tolist())))
+        insert(Topic, (
+            Topic(sender_id=sender, recipient_id=recipient,
+                  subject=self.text(1, 4), last_sent_at=history[-1][0])
+            for (sender, recipient), history in zip(pairs, histories)))
+        topic_ids = Topic.objects.filter(id__gt=before).order_by(
+            'id').values_list('id', flat=True)
+
+        rows = list(zip(topic_ids, pairs, histories))
+        with explicit_dates(Message, 'sent_at'):
+            insert(Message, (
+                Message(topic_id=topic_id,
+                        sender_id=sender if from_sender else recipient,
+                        body=self.text(3, 30), sent_at=sent_at,
+                        read_at=sent_at if n < len(history) - 1 else None)
+                for topic_id, (sender, recipient), history in rows
+                for n, (sent_at, from_sender) in enumerate(history)))
+
+        # последнее сообщение прочитал только его автор, второй участник
+        # - все до него
+        last_ids = {}
+        for topic_id, message_id in Message.objects.filter(
+                topic_id__gt=before).order_by('topic_id', 'id').values_list(
+                'topic_id', 'id').iterator():
+            last_ids[topic_id] = (
+                last_ids.get(topic_id, (None, None))[1], message_id)
+
+        def participants():
+            for topic_id, (sender, recipient), history in rows:
+                previous, last = last_ids[topic_id]
+                from_sender = history[-1][1]
+                yield Participant(
+                    topic_id=topic_id, user_id=sender,
+                    unread_count=0 if from_sender else 1,
+                    last_read_id=last if from_sender else previous)
+                yield Participant(
+                    topic_id=topic_id, user_id=recipient,
+                    unread_count=1 if from_sender else 0,
+                    last_read_id=previous if from_sender else last)
+        insert(Participant, participants())
+
+    def activity(self, first, last):
+        """
+        Почасовая активность за окно популярного (posts/trending.py)
+        из дат постов и комментариев и готовые списки популярного
+        """
+        since = trending.current_hour(self.now) - timedelta(
+            hours=settings.TRENDING_WINDOW)
+
+        def hourly(queryset, date, *fields):
+            return queryset.filter(**{f'{date}__gte': since}).annotate(
+                hour=TruncHour(date, tzinfo=timezone.utc),
+            ).order_by().values(*fields, 'hour').annotate(count=Count('id'))
+
+        comments = Comment.objects.filter(post__id__range=(first, last))
+        insert(PostActivity, (
+            PostActivity(post_id=row['post_id'], hour=row['hour'],
+                         comments=row['count'])
+            for row in hourly(comments, 'created', 'post_id')))
+
+        groups = {}
+        for row in hourly(
+                Post.objects.filter(
+                    id__range=(first, last), group__isnull=False),
+                'pub_date', 'group_id'):
+            groups[row['group_id'], row['hour']] = GroupActivity(
+                group_id=row['group_id'], hour=row['hour'],
+                posts=row['count'])
+        for row in hourly(
+                comments.filter(post__group__isnull=False), 'created',
+                'post__group_id'):
+            key = row['post__group_id'], row['hour']
+            groups.setdefault(key, GroupActivity(
+                group_id=key[0], hour=key[1])).comments = row['count']
+        insert(GroupActivity, groups.values())
+        trending.refresh(self.now)
+
+    def derived(self):
+        """
+        Счетчики, ленты подписок, поисковый индекс и популярное
+        для новых постов
+        """
+        counters.repair()
+        if not self.post_rows:
+            return
+        first, last = self.post_rows[0][0], self.post_rows[-1][0]
+        # ленты - одним INSERT ... SELECT на стороне базы: строк в них
+        # на порядок больше, чем подписок
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {TimelineEntry._meta.db_table} '
+                f'(user_id, post_id, pub_date) '
+                f'SELECT f.user_id, p.id, p.pub_date '
+                f'FROM {Follow._meta.db_table} f '
+                f'JOIN {Post._meta.db_table} p ON p.author_id = f.author_id '
+                f'JOIN {Profile._meta.db_table} a ON a.user_id = f.author_id '
+                f'WHERE p.id BETWEEN %s AND %s AND a.following_count <= %s',
+                [first, last, settings.TIMELINE_FANOUT_LIMIT])
+        get_backend().update(Post.objects.filter(id__range=(first, last)))
+        self.activity(first, last)
@@ -0,0 +1,95 @@
+"""
+Подписки пользователя: множество id авторов хранится в кэше и читается
+один раз за запрос. Подписка и отписка идемпотентны - повторный клик
+или параллельный запрос ничего не ломают
+"""
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+
+from .models import Follow, Suggestion
+
+FOLLOWS_PREFIX = 'follows:'
+# сбой сброса не оставит неверный список навсегда
+FOLLOWS_TIMEOUT = 60 * 60
+# сколько рекомендаций показываем на странице
+SUGGESTIONS_SHOWN = 5
+
+
+def followed_ids(user):
+    """
+    id авторов, на которых подписан user; запоминаем в объекте
+    пользователя, чтобы в пределах запроса не ходить даже в кэш
+    """
+    if not user.is_authenticated:
+        return frozenset()
+    if not hasattr(user, '_followed_ids'):
+        key = FOLLOWS_PREFIX + str(user.id)
+        ids = cache.get(key)
+        if ids is None:
+            ids = frozenset(Follow.objects.filter(
+                user=user.id).values_list('author_id', flat=True))
+            cache.set(key, ids, FOLLOWS_TIMEOUT)
+        user._followed_ids = ids
+    return user._followed_ids
+
+
+def invalidate(user_id):
+    """
+    Как и теги кэша, сбрасываем сейчас и еще раз после коммита: до него
+    параллельный запрос еще видит прежние подписки
+    """
+    key = FOLLOWS_PREFIX + str(user_id)
+    cache.delete(key)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: cache.delete(key))
+
+
+def follow(user, author_ids):
+    """
+    Подписываем user на авторов; возвращает id тех, на кого подписка
+    появилась сейчас. Каждая подписка - один INSERT: уже существующую
+    отсекает ограничение unique subscribers
+    """
+    followed = []
+    with transaction.atomic():
+        for author_id in author_ids:
+            if author_id == user.id:
+                continue
+            try:
+                with transaction.atomic():
+                    Follow.objects.create(user=user, author_id=author_id)
+            except IntegrityError:
+                continue
+            followed.append(author_id)
+    return followed
+
+
+def unfollow(user, author_ids):
+    """
+    Отписываем user от авторов; возвращает id тех, от кого отписались
+    сейчас. Строки блокируются до удаления, поэтому при двух
+    одновременных отписках сигналы счетчиков сработают один раз
+    """
+    with transaction.atomic():
+        follows = Follow.objects.select_for_update().filter(
+            user=user, author__in=author_ids)
+        unfollowed = list(follows.values_list('author_id', flat=True))
+        if unfollowed:
+            follows.delete()
+    return unfollowed
+
+
+def suggested_authors(user, limit=SUGGESTIONS_SHOWN):
+    """
+    Рекомендации из таблицы, которую заполняет compute_suggestions:
+    один запрос по индексу. Авторов, на которых user подписался
+    после расчета, отбрасываем
+    """
+    if not user.is_authenticated:
+        return []
+    followed = followed_ids(user)
+    suggestions = Suggestion.objects.filter(
+        user=user.id).select_related('author')
+    return [
+        suggestion.author for suggestion in suggestions
+        if suggestion.author_id not in followed][:limit]
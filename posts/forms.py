@@ -1,6 +1,8 @@
 from django import forms
 from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import UploadedFile
 
+from .images import normalize_image
 from .models import Comment, Post
 
 User = get_user_model()
@@ -11,6 +13,12 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ['text', 'group', 'image']
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            return normalize_image(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     text = forms.CharField(widget=forms.Textarea)
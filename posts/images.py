@@ -0,0 +1,63 @@
+"""
+Обработка загруженных картинок: поворот по EXIF, ограничение размера,
+удаление метаданных и пересохранение. Загрузка уже лежит во временном
+файле (FILE_UPLOAD_HANDLERS), результат пишется в него же
+"""
+import os
+
+from django import forms
+from django.conf import settings
+from PIL import Image, ImageOps
+
+# форматы, которые сохраняем как есть: прозрачность и палитра
+KEEP_FORMATS = {'GIF': 'image/gif', 'PNG': 'image/png'}
+# что оставляем из метаданных картинки; EXIF и прочее выбрасываем
+KEEP_INFO = ('transparency', 'background')
+
+
+def normalize_image(uploaded, max_size=None):
+    """
+    Пересохраняем uploaded на месте: не больше max_size пикселей
+    по большей стороне, без EXIF. Фотографии становятся JPEG,
+    GIF и PNG остаются в своем формате и с прежним именем
+    """
+    max_size = max_size or settings.IMAGE_MAX_SIZE
+    uploaded.seek(0)
+    # ImageField проверяет только заголовок, битые данные всплывают
+    # при декодировании
+    try:
+        with Image.open(uploaded) as source:
+            if getattr(source, 'is_animated', False):
+                # пересохранение потеряло бы анимацию
+                uploaded.seek(0)
+                return uploaded
+            image_format = source.format
+            image = ImageOps.exif_transpose(source)
+        image.thumbnail((max_size, max_size), Image.LANCZOS)
+    except (OSError, SyntaxError, Image.DecompressionBombError) as error:
+        raise forms.ValidationError(
+            forms.ImageField.default_error_messages['invalid_image'],
+            code='invalid_image') from error
+    image.info = {
+        key: value for key, value in image.info.items() if key in KEEP_INFO}
+
+    name, extension = os.path.splitext(os.path.basename(uploaded.name))
+    if image_format in KEEP_FORMATS:
+        content_type = KEEP_FORMATS[image_format]
+        options = {'optimize': True}
+    else:
+        image_format, content_type, extension = 'JPEG', 'image/jpeg', '.jpg'
+        image = image.convert('RGB')
+        options = {
+            'quality': settings.IMAGE_JPEG_QUALITY,
+            'optimize': True,
+            'progressive': True}
+
+    uploaded.seek(0)
+    uploaded.truncate()
+    image.save(uploaded, image_format, **options)
+    uploaded.size = uploaded.tell()
+    uploaded.seek(0)
+    uploaded.name = name + extension
+    uploaded.content_type = content_type
+    return uploaded
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import suggestions
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рекомендации "Кого почитать" по графу подписок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int, default=suggestions.SUGGESTIONS_PER_USER,
+            help='Сколько рекомендаций хранить на пользователя')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        graph = suggestions.FollowGraph.load()
+        loaded = time.perf_counter()
+        saved = suggestions.save(graph.suggestions(options['limit']))
+        self.stdout.write(
+            f'Подписок: {len(graph.sources)}, рекомендаций: {saved}; '
+            f'загрузка {loaded - start:.1f} с, '
+            f'расчет и запись {time.perf_counter() - loaded:.1f} с')
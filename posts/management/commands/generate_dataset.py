@@ -0,0 +1,67 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts.dataset import DatasetGenerator
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическим набором данных для нагрузочных '
+            'замеров; один и тот же --seed дает тот же набор')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--follows', type=int, default=200000)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument(
+            '--images', type=int, default=20,
+            help='Сколько разных картинок создать')
+        parser.add_argument(
+            '--image-share', type=float, default=0.2,
+            help='Доля постов с картинкой')
+        parser.add_argument('--comments', type=int, default=200000)
+        parser.add_argument('--topics', type=int, default=20000)
+        parser.add_argument(
+            '--messages', type=int, default=10,
+            help='Среднее число сообщений в переписке')
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней распределить даты')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--prefix', default='user',
+            help='Начало имен создаваемых пользователей')
+
+    def handle(self, *args, **options):
+        if options['users'] < 2:
+            raise CommandError('Нужно хотя бы два пользователя')
+        if User.objects.filter(
+                username__startswith=options['prefix']).exists():
+            raise CommandError(
+                f'Пользователи {options["prefix"]}* уже есть, '
+                f'выберите другой --prefix')
+        generator = DatasetGenerator(
+            options['prefix'], options['seed'], options['days'])
+        steps = (
+            ('пользователи', generator.users, options['users']),
+            ('сообщества', generator.groups, options['groups']),
+            ('подписки', generator.follows, options['follows']),
+            ('картинки', generator.images, options['images']),
+            ('посты', generator.posts, options['posts'],
+             options['image_share']),
+            ('комментарии', generator.comments, options['comments']),
+            ('переписки', generator.topics, options['topics'],
+             options['messages']),
+            ('счетчики, ленты и поиск', generator.derived),
+        )
+        with transaction.atomic():
+            for title, step, *arguments in steps:
+                start = time.perf_counter()
+                step(*arguments)
+                self.stdout.write(
+                    f'{title}: {time.perf_counter() - start:.1f} с')
@@ -0,0 +1,32 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post, Profile
+
+
+class Command(BaseCommand):
+    help = 'Создает превью для всех загруженных картинок и аватарок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Сколько картинок обрабатывать параллельно')
+
+    def handle(self, *args, **options):
+        images = Post.objects.exclude(image='').exclude(image=None)
+        photos = Profile.objects.exclude(photo='')
+        jobs = [
+            (name, ('post',)) for name in
+            images.order_by().values_list('image', flat=True).distinct()]
+        jobs += [
+            (name, ('avatar',)) for name in
+            photos.order_by().values_list('photo', flat=True).distinct()]
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            generated = sum(pool.map(
+                lambda job: thumbnails.generate_in_worker(*job), jobs))
+        self.stdout.write(
+            f'Картинок: {len(jobs)}, создано превью: {generated}')
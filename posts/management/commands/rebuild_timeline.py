@@ -0,0 +1,27 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from posts import timeline
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames', nargs='*',
+            help='Чьи ленты пересобрать (по умолчанию все)')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(
+            Q(follower__isnull=False) | Q(timeline__isnull=False)).distinct()
+        if options['usernames']:
+            users = User.objects.filter(username__in=options['usernames'])
+        count = 0
+        for user in users.iterator():
+            timeline.rebuild(user)
+            count += 1
+        self.stdout.write(f'Пересобрано лент: {count}')
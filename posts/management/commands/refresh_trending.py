@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает популярные посты и сообщества; запускать '
+            'по расписанию, например раз в 10 минут')
+
+    def handle(self, *args, **options):
+        posts, groups = trending.refresh()
+        self.stdout.write(
+            f'Популярных постов: {posts}, сообществ: {groups}')
@@ -0,0 +1,91 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                set_response_etag)
+
+from .cache_tags import get_versions
+
+# страницы, которые анонимные читатели получают из кэша
+CACHED_VIEWS = {'index', 'group_posts', 'profile', 'post'}
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+class AnonymousPageCacheMiddleware:
+    """
+    Кэш целых страниц для анонимных читателей. Запись действительна,
+    пока не изменилась версия ни одного из ее тегов (posts.cache_tags);
+    клиентам и прокси отдаем ETag и 304 Not Modified. Last-Modified не
+    ставим: после правки или удаления поста самая свежая дата на
+    странице не растет, а ETag меняется вместе с содержимым
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self.is_cacheable(request):
+            return self.get_response(request)
+
+        key = self.cache_key(request)
+        entry = cache.get(key)
+        if entry and get_versions(entry['tags']) == entry['versions']:
+            response = self.build_response(entry)
+        else:
+            response = self.get_response(request)
+            self.strip_cookies(response)
+            if self.can_store(request, response):
+                set_response_etag(response)
+                patch_cache_control(response, public=True, max_age=0)
+                cache.set(
+                    key, self.build_entry(request, response),
+                    PAGE_CACHE_TIMEOUT)
+
+        return get_conditional_response(
+            request, etag=response.get('ETag'), response=response)
+
+    def is_cacheable(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            return False
+        # без сессии пользователь заведомо анонимный
+        if settings.SESSION_COOKIE_NAME in request.COOKIES:
+            return False
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return False
+        return match.url_name in CACHED_VIEWS
+
+    def cache_key(self, request):
+        path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        return f'page:{path}'
+
+    def strip_cookies(self, response):
+        """
+        Анонимному читателю не нужны ни сессия, ни CSRF-токен, а куки
+        не дают закэшировать страницу ни у нас, ни на прокси
+        """
+        for name in (settings.SESSION_COOKIE_NAME, settings.CSRF_COOKIE_NAME):
+            response.cookies.pop(name, None)
+
+    def can_store(self, request, response):
+        return (
+            response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+            and hasattr(request, 'cache_tags'))
+
+    def build_entry(self, request, response):
+        return {
+            'content': response.content,
+            'headers': dict(response.items()),
+            'tags': request.cache_tags,
+            'versions': request.cache_versions}
+
+    def build_response(self, entry):
+        response = HttpResponse(entry['content'])
+        for header, value in entry['headers'].items():
+            response[header] = value
+        return response
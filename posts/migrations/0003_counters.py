@@ -0,0 +1,57 @@
+# Generated by Django 2.2.6 on 2026-10-18 18:16
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ('Post', 'comment_count', 'Comment', 'post', 'pk'),
+    ('Profile', 'post_count', 'Post', 'author', 'user_id'),
+    ('Profile', 'follower_count', 'Follow', 'user', 'user_id'),
+    ('Profile', 'following_count', 'Follow', 'author', 'user_id'),
+)
+
+
+def fill_counters(apps, schema_editor):
+    for model, counter, related, field, outer in COUNTERS:
+        counts = (
+            apps.get_model('posts', related).objects
+            .filter(**{field: OuterRef(outer)})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total'))
+        apps.get_model('posts', model).objects.update(**{
+            counter: Coalesce(
+                Subquery(counts, output_field=IntegerField()), Value(0))})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0002_timelineentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Комментариев'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='follower_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Подписок'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='following_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Подписчиков'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='post_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Записей'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 2.2.6 on 2026-10-18 18:25
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+SEARCH_CONFIG = 'russian'
+
+
+class PostgresAddIndex(migrations.AddIndex):
+    """
+    GIN-индекс есть только в PostgreSQL, на других базах меняем
+    лишь состояние моделей
+    """
+    def database_forwards(self, app_label, schema_editor, *args):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, *args)
+
+    def database_backwards(self, app_label, schema_editor, *args):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, *args)
+
+
+def fill_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    User = apps.get_model('auth', 'User')
+    Group = apps.get_model('posts', 'Group')
+
+    def related_value(model, outer, field):
+        return Subquery(
+            model.objects.filter(pk=OuterRef(outer)).values(field)[:1])
+
+    apps.get_model('posts', 'Post').objects.update(search_vector=(
+        SearchVector('text', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(
+            related_value(User, 'author', 'username'),
+            related_value(User, 'author', 'first_name'),
+            related_value(User, 'author', 'last_name'),
+            weight='B', config=SEARCH_CONFIG)
+        + SearchVector(
+            related_value(Group, 'group', 'title'),
+            weight='B', config=SEARCH_CONFIG)
+        + SearchVector(
+            related_value(Group, 'group', 'description'),
+            weight='C', config=SEARCH_CONFIG)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0003_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        PostgresAddIndex(
+            model_name='post',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='post_search_idx'),
+        ),
+        migrations.RunPython(fill_search_vector, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 2.2.6 on 2026-10-18 19:02
+
+from django.db import migrations
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ('post_count', 'Post', 'author'),
+    ('follower_count', 'Follow', 'user'),
+    ('following_count', 'Follow', 'author'),
+)
+
+
+def create_missing_profiles(apps, schema_editor):
+    """
+    Профиль теперь создается только при регистрации, а не при каждом
+    сохранении пользователя: создаем недостающие заранее. Счетчики
+    остальных профилей заполнила 0003, новым считаем их так же
+    """
+    User = apps.get_model('auth', 'User')
+    Profile = apps.get_model('posts', 'Profile')
+    user_ids = list(User.objects.filter(
+        profile__isnull=True).values_list('pk', flat=True))
+    if not user_ids:
+        return
+    Profile.objects.bulk_create(
+        Profile(user_id=user_id) for user_id in user_ids)
+    counters = {}
+    for counter, related, field in COUNTERS:
+        counts = (
+            apps.get_model('posts', related).objects
+            .filter(**{field: OuterRef('user_id')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total'))
+        counters[counter] = Coalesce(
+            Subquery(counts, output_field=IntegerField()), Value(0))
+    Profile.objects.filter(user__in=user_ids).update(**counters)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0005_stored_file'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            create_missing_profiles, migrations.RunPython.noop),
+    ]
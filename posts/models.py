@@ -1,4 +1,6 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
 User = get_user_model()
@@ -11,6 +13,13 @@ class Profile(models.Model):
         default='users/avatar180.jpg',
         verbose_name='Аватарка',
         help_text='Добавьте аватарку')
+    # счетчики поддерживаются сигналами, см. posts/signals.py
+    post_count = models.IntegerField(
+        default=0, editable=False, verbose_name='Записей')
+    follower_count = models.IntegerField(
+        default=0, editable=False, verbose_name='Подписок')
+    following_count = models.IntegerField(
+        default=0, editable=False, verbose_name='Подписчиков')
 
     class Meta:
         verbose_name_plural = 'Профили пользователей'
@@ -33,6 +42,20 @@ class Group(models.Model):
         verbose_name = 'Группа'
 
 
+class PostQuerySet(models.QuerySet):
+    # поля, которые выводит карточка поста posts/includes/post_item.html
+    FEED_FIELDS = (
+        'text', 'pub_date', 'image', 'comment_count', 'author', 'group',
+        'author__username', 'author__first_name', 'author__last_name',
+        'group__slug', 'group__title')
+
+    def for_feed(self):
+        """
+        Посты для ленты: автор и группа одним запросом, только нужные поля
+        """
+        return self.select_related('author', 'group').only(*self.FEED_FIELDS)
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name='Текст',
@@ -56,11 +79,29 @@ class Post(models.Model):
         null=True,
         verbose_name='Изображение',
         help_text='Добавьте изображение к посту')
+    comment_count = models.IntegerField(
+        default=0, editable=False, verbose_name='Комментариев')
+    # обновляется сигналами, см. posts/search.py
+    search_vector = SearchVectorField(null=True, blank=True, editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         verbose_name_plural = 'Посты'
         verbose_name = 'Пост'
         ordering = ('-pub_date',)
+        indexes = (
+            GinIndex(fields=('search_vector',), name='post_search_idx'),
+            # ленты: главная, автора и сообщества в порядке CursorPaginator
+            models.Index(
+                fields=('-pub_date', '-id'), name='post_pub_date_idx'),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_pub_date_idx'),
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_pub_date_idx'),
+        )
 
     def __str__(self):
         return self.text[:15]
@@ -85,6 +126,11 @@ class Comment(models.Model):
         ordering = ('-created',)
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            # комментарии поста в порядке CursorPaginator
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='comment_post_created_idx')]
 
 
 class Follow(models.Model):
@@ -108,3 +154,159 @@ class Follow(models.Model):
 
     def __str__(self):
         return f'{self.user} подписан на {self.author}'
+
+
+class TimelineEntry(models.Model):
+    """
+    Материализованная лента подписок: пост автора копируется в ленту
+    каждого подписчика при публикации
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель')
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост')
+    # копия Post.pub_date, чтобы лента читалась по одному индексу
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+        ordering = ('-pub_date', '-post')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique timeline entry')]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx')]
+
+
+class StoredFile(models.Model):
+    """
+    Файл в хранилище с адресацией по содержимому (posts/storage.py):
+    сколько полей моделей ссылается на одну копию
+    """
+    name = models.CharField(
+        max_length=255, primary_key=True, verbose_name='Имя файла')
+    ref_count = models.PositiveIntegerField(
+        default=1, verbose_name='Ссылок')
+
+    class Meta:
+        verbose_name = 'Файл'
+        verbose_name_plural = 'Файлы'
+
+    def __str__(self):
+        return self.name
+
+
+class Suggestion(models.Model):
+    """
+    Кого почитать пользователю. Таблицу целиком пересчитывает команда
+    compute_suggestions (posts/suggestions.py), страницы только читают
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='suggestions',
+        verbose_name='Читатель')
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор')
+    score = models.FloatField(verbose_name='Оценка')
+
+    class Meta:
+        verbose_name = 'Рекомендация'
+        verbose_name_plural = 'Рекомендации'
+        ordering = ('-score',)
+        indexes = [
+            models.Index(
+                fields=['user', '-score'], name='suggestion_user_score_idx')]
+
+
+class PostActivity(models.Model):
+    """
+    Новые комментарии к посту по часам; пишут сигналы, читает
+    команда refresh_trending (posts/trending.py)
+    """
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='activity',
+        verbose_name='Пост')
+    hour = models.DateTimeField(verbose_name='Час')
+    comments = models.PositiveIntegerField(
+        default=0, verbose_name='Комментариев')
+
+    class Meta:
+        verbose_name = 'Активность поста'
+        verbose_name_plural = 'Активность постов'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['post', 'hour'], name='unique post activity hour')]
+        indexes = [
+            models.Index(fields=['hour'], name='post_activity_hour_idx')]
+
+
+class GroupActivity(models.Model):
+    """
+    Новые посты и комментарии в сообществе по часам
+    """
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.CASCADE,
+        related_name='activity',
+        verbose_name='Сообщество')
+    hour = models.DateTimeField(verbose_name='Час')
+    posts = models.PositiveIntegerField(default=0, verbose_name='Постов')
+    comments = models.PositiveIntegerField(
+        default=0, verbose_name='Комментариев')
+
+    class Meta:
+        verbose_name = 'Активность сообщества'
+        verbose_name_plural = 'Активность сообществ'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['group', 'hour'], name='unique group activity hour')]
+        indexes = [
+            models.Index(fields=['hour'], name='group_activity_hour_idx')]
+
+
+class TrendingPost(models.Model):
+    """
+    Готовый список популярных постов, его заменяет refresh_trending
+    """
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending',
+        verbose_name='Пост')
+    score = models.FloatField(verbose_name='Оценка')
+
+    class Meta:
+        verbose_name = 'Популярный пост'
+        verbose_name_plural = 'Популярные посты'
+        ordering = ('-score',)
+
+
+class TrendingGroup(models.Model):
+    group = models.OneToOneField(
+        Group,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending',
+        verbose_name='Сообщество')
+    score = models.FloatField(verbose_name='Оценка')
+
+    class Meta:
+        verbose_name = 'Популярное сообщество'
+        verbose_name_plural = 'Популярные сообщества'
+        ordering = ('-score',)
@@ -0,0 +1,130 @@
+import datetime
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.encoding import force_bytes, force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
+
+
+class CursorPaginator(Paginator):
+    """
+    Пагинация по курсору (keyset): страница выбирается условием на ключ
+    сортировки, а не через OFFSET, поэтому любая страница стоит одинаково
+    и не требует COUNT(*).
+
+    Номера страниц условные: у первой страницы номер 1, у любой другой - 2,
+    а num_pages на единицу больше, если есть следующая страница. Этого
+    достаточно для has_next/has_previous стандартного Page.
+    """
+    def __init__(self, object_list, per_page, ordering=('-pub_date', '-id')):
+        self.ordering = ordering
+        self.next_cursor = None
+        self.previous_cursor = None
+        self._num_pages = 1
+        super().__init__(object_list.order_by(*ordering), per_page)
+
+    @property
+    def num_pages(self):
+        return self._num_pages
+
+    @property
+    def fields(self):
+        return [field.lstrip('-') for field in self.ordering]
+
+    def get_cursor_page(self, after=None, before=None):
+        """
+        Страница после курсора after (дальше по сортировке)
+        или перед курсором before
+        """
+        before_key = self.decode(before)
+        after_key = None if before_key else self.decode(after)
+        items = []
+        if before_key is not None:
+            items = list(self.fetch(before_key, reverse=True))
+            has_previous = len(items) > self.per_page
+            items = items[:self.per_page][::-1]
+            has_next = True
+        if not items:
+            items = list(self.fetch(after_key))
+            has_previous = after_key is not None
+            has_next = len(items) > self.per_page
+            items = items[:self.per_page]
+
+        if has_next and items:
+            self.next_cursor = self.encode(items[-1])
+        if has_previous and items:
+            self.previous_cursor = self.encode(items[0])
+        number = 2 if self.previous_cursor else 1
+        self._num_pages = number + 1 if self.next_cursor else number
+        return self._get_page(items, number, self)
+
+    def fetch(self, key, reverse=False):
+        return self.slice(self.object_list, self.ordering, key, reverse)
+
+    def slice(self, queryset, ordering, key, reverse=False):
+        """
+        На одну запись больше страницы, чтобы узнать, есть ли продолжение
+        """
+        queryset = queryset.order_by(*ordering)
+        if reverse:
+            queryset = queryset.reverse()
+        if key is not None:
+            queryset = queryset.filter(keyset_filter(ordering, key, reverse))
+        return queryset[:self.per_page + 1]
+
+    def encode(self, obj):
+        values = []
+        for field in self.fields:
+            value = getattr(obj, field)
+            if isinstance(value, datetime.datetime):
+                value = value.isoformat()
+            values.append(value)
+        return urlsafe_base64_encode(force_bytes(json.dumps(values)))
+
+    def decode(self, cursor):
+        """
+        Некорректный курсор равносилен его отсутствию
+        """
+        if not cursor:
+            return None
+        try:
+            values = json.loads(force_str(urlsafe_base64_decode(cursor)))
+            if len(values) != len(self.fields):
+                return None
+            return [
+                self.to_python(field, value)
+                for field, value in zip(self.fields, values)]
+        except (ValueError, TypeError, ValidationError):
+            return None
+
+    def to_python(self, field, value):
+        try:
+            model_field = self.object_list.model._meta.get_field(field)
+        except FieldDoesNotExist:
+            return value
+        return model_field.to_python(value)
+
+
+def keyset_filter(ordering, key, reverse=False):
+    """
+    (a < a0) OR (a = a0 AND b < b0) ... для ключа (a0, b0, ...)
+    """
+    condition = Q()
+    equal = {}
+    for field, value in zip(ordering, key):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') != reverse else 'gt'
+        condition |= Q(**equal, **{f'{name}__{lookup}': value})
+        equal[name] = value
+    return condition
+
+
+def paginate(request, object_list, per_page=POSTS_PER_PAGE, **kwargs):
+    paginator = CursorPaginator(object_list, per_page, **kwargs)
+    return paginator.get_cursor_page(
+        after=request.GET.get('after'), before=request.GET.get('before'))
@@ -0,0 +1,30 @@
+"""
+Поиск по постам. Бэкенд задает настройка SEARCH_BACKEND; если она
+не задана, на PostgreSQL ищет сама база, на остальных базах -
+встроенный инвертированный индекс
+"""
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connection
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+DEFAULT_BACKENDS = {
+    'postgresql': 'posts.search.postgres.PostgresBackend',
+}
+FALLBACK_BACKEND = 'posts.search.inverted.InvertedIndexBackend'
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    path = settings.SEARCH_BACKEND or DEFAULT_BACKENDS.get(
+        connection.vendor, FALLBACK_BACKEND)
+    return import_string(path)()
+
+
+@receiver(setting_changed)
+def reset_backend(setting, **kwargs):
+    if setting.startswith('SEARCH_'):
+        get_backend.cache_clear()
@@ -0,0 +1,118 @@
+"""
+Разбор текста на термины для инвертированного индекса: токенизация,
+стоп-слова и стемминг. Русские слова обрабатываются по алгоритму
+Snowball, английские - облегченным стеммером суффиксов
+"""
+import re
+
+TOKEN = re.compile(r'\w+')
+MAX_TOKEN_LENGTH = 64
+
+STOP_WORDS = frozenset((
+    'а', 'без', 'бы', 'в', 'во', 'вот', 'все', 'да', 'для', 'до', 'же',
+    'за', 'и', 'из', 'или', 'к', 'как', 'ли', 'мы', 'на', 'не', 'ни',
+    'но', 'о', 'об', 'от', 'по', 'при', 'с', 'со', 'так', 'то', 'у',
+    'что', 'это', 'я', 'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by',
+    'for', 'from', 'in', 'is', 'it', 'of', 'on', 'or', 'that', 'the',
+    'this', 'to', 'was', 'with',
+))
+
+RU_VOWELS = 'аеиоуыэюя'
+RU_PERFECTIVE_GERUND = re.compile(
+    r'((?<=[ая])(в|вши|вшись)|(ив|ивши|ившись|ыв|ывши|ывшись))$')
+RU_REFLEXIVE = re.compile(r'(ся|сь)$')
+RU_ADJECTIVAL = re.compile(
+    r'((?<=[ая])(ем|нн|вш|ющ|щ)|(ивш|ывш|ующ))?'
+    r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому'
+    r'|их|ых|ую|юю|ая|яя|ою|ею)$')
+RU_VERB = re.compile(
+    r'((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)'
+    r'|(ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло'
+    r'|ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю))$')
+RU_NOUN = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием'
+    r'|ем|ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$')
+RU_DERIVATIONAL = re.compile(r'ость?$')
+RU_SUPERLATIVE = re.compile(r'(ейше|ейш)$')
+
+EN_SUFFIXES = ('ingly', 'edly', 'ing', 'ed', 'ly')
+EN_VOWELS = 'aeiouy'
+
+
+def ru_region(word, start):
+    """
+    Начало области после первой пары гласная-согласная с позиции start
+    """
+    for i in range(start, len(word) - 1):
+        if word[i] in RU_VOWELS and word[i + 1] not in RU_VOWELS:
+            return i + 2
+    return len(word)
+
+
+def stem_ru(word):
+    match = re.search(f'[{RU_VOWELS}]', word)
+    if not match:
+        return word
+    prefix, rv = word[:match.end()], word[match.end():]
+    r2 = max(ru_region(word, ru_region(word, 0)) - len(prefix), 0)
+
+    stripped = RU_PERFECTIVE_GERUND.sub('', rv, 1)
+    if stripped == rv:
+        rv = RU_REFLEXIVE.sub('', rv, 1)
+        for ending in (RU_ADJECTIVAL, RU_VERB, RU_NOUN):
+            stripped = ending.sub('', rv, 1)
+            if stripped != rv:
+                break
+    rv = stripped
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    match = RU_DERIVATIONAL.search(rv)
+    if match and match.start() >= r2:
+        rv = rv[:match.start()]
+    if rv.endswith('нн'):
+        rv = rv[:-1]
+    else:
+        rv = RU_SUPERLATIVE.sub('', rv, 1)
+        if rv.endswith('нн'):
+            rv = rv[:-1]
+        elif rv.endswith('ь'):
+            rv = rv[:-1]
+    return prefix + rv
+
+
+def stem_en(word):
+    if len(word) <= 3:
+        return word
+    if word.endswith('ies') and len(word) > 4:
+        return word[:-3] + 'y'
+    for suffix in EN_SUFFIXES:
+        stem = word[:-len(suffix)]
+        if (word.endswith(suffix) and len(stem) >= 3
+                and any(char in EN_VOWELS for char in stem)):
+            # running -> run, hopped -> hop
+            if stem[-1] == stem[-2] and stem[-1] not in 'lsz':
+                stem = stem[:-1]
+            return stem
+    if word.endswith('sses'):
+        return word[:-2]
+    if word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+        return word[:-1]
+    return word
+
+
+def stem(token):
+    if token[0] in 'abcdefghijklmnopqrstuvwxyz':
+        return stem_en(token)
+    if 'а' <= token[0] <= 'я':
+        return stem_ru(token)
+    return token
+
+
+def analyze(text):
+    """
+    Список терминов текста в порядке появления
+    """
+    tokens = TOKEN.findall(text.lower().replace('ё', 'е'))
+    return [
+        stem(token) for token in tokens
+        if token not in STOP_WORDS and len(token) <= MAX_TOKEN_LENGTH]
@@ -0,0 +1,25 @@
+# сортировка выдачи для CursorPaginator: курсор - пара (rank, id)
+SEARCH_ORDERING = ('-rank', '-id')
+
+
+class BaseSearchBackend:
+    """
+    Бэкенд поиска: выдача в виде CursorPaginator и обновление индекса
+    """
+    def paginator(self, text, per_page):
+        raise NotImplementedError
+
+    def update(self, queryset):
+        """
+        Переиндексировать посты из queryset
+        """
+        raise NotImplementedError
+
+    def remove(self, ids):
+        """
+        Убрать из индекса удаленные посты
+        """
+        raise NotImplementedError
+
+    def rebuild(self):
+        raise NotImplementedError
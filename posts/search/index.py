@@ -0,0 +1,595 @@
+"""
+Инвертированный индекс с ранжированием BM25, не зависящий от базы.
+
+Индекс живет в каталоге:
+
+    manifest.json  поколение и список действующих сегментов
+    *.seg          неизменяемые сегменты, открываются через mmap
+    journal.log    журнал изменений после последнего сегмента
+    lock           файл для flock
+    rebuild.lock   flock перестройки, пока он взят, журнал не сбрасывается
+
+Сегмент хранит отсортированные таблицы документов и терминов и списки
+вхождений (id, tf, длина документа) в виде массивов uint32, поэтому
+открытие сегмента ничего не читает с диска заранее. Новые и измененные
+документы сначала пишутся в журнал; каждый процесс дочитывает журнал
+в память перед поиском. Когда журнал вырастает, он сбрасывается
+в новый сегмент, а при избытке сегментов они сливаются в один.
+
+Документ, измененный или удаленный позже, скрывается в более старых
+сегментах списком deleted нового сегмента или записью в журнале.
+"""
+import bisect
+import fcntl
+import heapq
+import json
+import math
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import time
+from array import array
+from collections import Counter
+from contextlib import contextmanager
+
+from .analysis import analyze
+
+MAGIC = b'YTSEG001'
+# magic, docs, terms, deleted, total_length, смещения секций docs,
+# deleted, terms, postings и strings
+HEADER = struct.Struct('<8sIIIQQQQQQ')
+HEADER_SIZE = 128
+# в таблице терминов на термин четыре числа: смещение и длина строки,
+# смещение и количество вхождений
+TERM_FIELDS = 4
+# вхождение - id документа, частота термина и длина документа
+POSTING_FIELDS = 3
+
+# параметры BM25
+K1 = 1.2
+B = 0.75
+
+
+class Segment:
+    """
+    Неизменяемый сегмент индекса, отображенный в память
+    """
+    def __init__(self, path):
+        self.name = os.path.basename(path)
+        with open(path, 'rb') as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self.doc_count, self.term_count, deleted_count,
+         self.total_length, docs_offset, deleted_offset, terms_offset,
+         postings_offset, strings_offset) = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError(f'{path} не является сегментом индекса')
+        view = memoryview(self._map)
+        ids_end = docs_offset + self.doc_count * 4
+        self._doc_ids = view[docs_offset:ids_end].cast('I')
+        self._doc_lengths = view[ids_end:deleted_offset].cast('I')
+        deleted = view[deleted_offset:terms_offset].cast('I')
+        self.deleted = frozenset(deleted)
+        deleted.release()
+        self._terms = view[terms_offset:postings_offset].cast('I')
+        self._postings = view[postings_offset:strings_offset].cast('I')
+        self._strings_offset = strings_offset
+        view.release()
+
+    def close(self):
+        for view in (
+                self._doc_ids, self._doc_lengths, self._terms,
+                self._postings):
+            view.release()
+        self._map.close()
+
+    def term(self, index):
+        offset = self._strings_offset + self._terms[index * TERM_FIELDS]
+        length = self._terms[index * TERM_FIELDS + 1]
+        return self._map[offset:offset + length]
+
+    def terms(self):
+        return (self.term(index) for index in range(self.term_count))
+
+    def find(self, term):
+        """
+        Номер термина (bytes) в таблице или None
+        """
+        low, high = 0, self.term_count
+        while low < high:
+            middle = (low + high) // 2
+            if self.term(middle) < term:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.term_count and self.term(low) == term:
+            return low
+        return None
+
+    def df(self, term):
+        index = self.find(term)
+        if index is None:
+            return 0
+        return self._terms[index * TERM_FIELDS + 3]
+
+    def postings(self, term):
+        """
+        Вхождения термина плоским массивом id, tf, длина, id, ...
+        """
+        index = self.find(term)
+        if index is None:
+            return self._postings[:0]
+        start = self._terms[index * TERM_FIELDS + 2] * POSTING_FIELDS
+        count = self._terms[index * TERM_FIELDS + 3] * POSTING_FIELDS
+        return self._postings[start:start + count]
+
+    def docs(self):
+        return zip(self._doc_ids, self._doc_lengths)
+
+    def doc_length(self, doc_id):
+        index = bisect.bisect_left(self._doc_ids, doc_id)
+        if index < self.doc_count and self._doc_ids[index] == doc_id:
+            return self._doc_lengths[index]
+        return None
+
+
+def triples(postings):
+    values = iter(postings)
+    return zip(values, values, values)
+
+
+def write_segment(path, docs, deleted, postings):
+    """
+    docs - пары (id, длина) по возрастанию id, deleted - id, которые
+    сегмент скрывает в более старых сегментах, postings - пары
+    (термин в bytes, array('I') вхождений) по возрастанию термина
+    """
+    doc_ids, lengths = array('I'), array('I')
+    for doc_id, length in docs:
+        doc_ids.append(doc_id)
+        lengths.append(length)
+    deleted = array('I', sorted(deleted))
+    terms, strings = array('I'), bytearray()
+    temporary = f'{path}.tmp'
+    with tempfile.TemporaryFile(dir=os.path.dirname(path)) as buffer:
+        offset = 0
+        for term, term_postings in postings:
+            count = len(term_postings) // POSTING_FIELDS
+            terms.extend((len(strings), len(term), offset, count))
+            strings += term
+            term_postings.tofile(buffer)
+            offset += count
+        buffer.seek(0)
+
+        docs_offset = HEADER_SIZE
+        deleted_offset = docs_offset + 8 * len(doc_ids)
+        terms_offset = deleted_offset + 4 * len(deleted)
+        postings_offset = terms_offset + 4 * len(terms)
+        strings_offset = postings_offset + 4 * POSTING_FIELDS * offset
+        with open(temporary, 'wb') as file:
+            file.write(HEADER.pack(
+                MAGIC, len(doc_ids), len(terms) // TERM_FIELDS,
+                len(deleted), sum(lengths), docs_offset, deleted_offset,
+                terms_offset, postings_offset, strings_offset,
+            ).ljust(HEADER_SIZE, b'\0'))
+            for section in (doc_ids, lengths, deleted, terms):
+                section.tofile(file)
+            shutil.copyfileobj(buffer, file)
+            file.write(strings)
+            file.flush()
+            os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+
+def invert(docs):
+    """
+    Вхождения по терминам для словаря id -> (Counter терминов, длина)
+    """
+    inverted = {}
+    for doc_id in sorted(docs):
+        terms, length = docs[doc_id]
+        for term, frequency in terms.items():
+            inverted.setdefault(term.encode(), array('I')).extend(
+                (doc_id, frequency, length))
+    return ((term, inverted[term]) for term in sorted(inverted))
+
+
+def live_docs(segment, mask):
+    return (
+        (doc_id, length) for doc_id, length in segment.docs()
+        if doc_id not in mask)
+
+
+def merge(segments, masks):
+    """
+    Аргументы write_segment для слияния сегментов: живые документы
+    и их вхождения. Скрывать в старых сегментах нечего - результат
+    слияния сам становится самым старым сегментом
+    """
+    docs = heapq.merge(*(
+        live_docs(segment, mask) for segment, mask in zip(segments, masks)))
+
+    def postings():
+        previous = None
+        for term in heapq.merge(*(segment.terms() for segment in segments)):
+            if term == previous:
+                continue
+            previous = term
+            merged = array('I')
+            for segment, mask in zip(segments, masks):
+                found = segment.postings(term)
+                if not mask:
+                    merged.frombytes(found.tobytes())
+                    continue
+                for posting in triples(found):
+                    if posting[0] not in mask:
+                        merged.extend(posting)
+            if merged:
+                yield term, merged
+
+    return docs, (), postings()
+
+
+class MemorySegment:
+    """
+    Документы из журнала, еще не сброшенные в сегмент
+    """
+    def __init__(self):
+        self.docs = {}
+        self.postings = {}
+        # все id из журнала: в сегментах их старые версии скрыты
+        self.touched = set()
+
+    def remove(self, doc_id):
+        self.touched.add(doc_id)
+        terms, length = self.docs.pop(doc_id, ((), 0))
+        for term in terms:
+            del self.postings[term][doc_id]
+        return length
+
+    def add(self, doc_id, terms, length):
+        self.docs[doc_id] = (terms, length)
+        for term, frequency in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = frequency
+
+
+def segment_name():
+    return f'{time.time_ns():x}-{os.getpid()}.seg'
+
+
+class SearchIndex:
+    """
+    Индекс в каталоге directory, общий для всех процессов
+    """
+    # размер журнала, после которого он сбрасывается в сегмент
+    flush_size = 4 * 1024 * 1024
+    max_segments = 8
+    rebuild_chunk = 100000
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._generation = None
+        self._segments = []
+        self._masks = []
+        self._memory = MemorySegment()
+        self._journal_offset = 0
+        self._doc_count = 0
+        self._total_length = 0
+        with self._lock, self._locked():
+            self._refresh()
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    @contextmanager
+    def _locked(self, exclusive=False):
+        with open(self.path('lock'), 'a') as file:
+            fcntl.flock(file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+
+    @contextmanager
+    def _rebuilding(self):
+        with open(self.path('rebuild.lock'), 'a') as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            yield
+
+    def _rebuild_running(self):
+        with open(self.path('rebuild.lock'), 'a') as file:
+            try:
+                fcntl.flock(file, fcntl.LOCK_SH | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True
+        return False
+
+    def _read_manifest(self):
+        try:
+            with open(self.path('manifest.json')) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {'generation': 0, 'segments': []}
+
+    def _write_manifest(self, segments):
+        temporary = self.path('manifest.json.tmp')
+        with open(temporary, 'w') as file:
+            json.dump(
+                {'generation': self._generation + 1, 'segments': segments},
+                file)
+        os.replace(temporary, self.path('manifest.json'))
+        for name in os.listdir(self.directory):
+            if name.endswith('.seg') and name not in segments:
+                os.remove(self.path(name))
+
+    # чтение
+
+    def _refresh(self):
+        """
+        Подхватываем новые сегменты и дочитываем журнал
+        """
+        manifest = self._read_manifest()
+        if manifest['generation'] != self._generation:
+            self._open_segments(manifest['segments'])
+            self._generation = manifest['generation']
+        try:
+            with open(self.path('journal.log'), 'rb') as file:
+                file.seek(self._journal_offset)
+                data = file.read()
+        except FileNotFoundError:
+            return
+        # запись могла быть дописана не до конца
+        data = data[:data.rfind(b'\n') + 1]
+        self._journal_offset += len(data)
+        for line in data.splitlines():
+            self._apply(json.loads(line))
+
+    def _open_segments(self, names):
+        opened = {segment.name: segment for segment in self._segments}
+        self._segments = [
+            opened.pop(name, None) or Segment(self.path(name))
+            for name in names]
+        for segment in opened.values():
+            segment.close()
+
+        self._masks, hidden = [], set()
+        for segment in reversed(self._segments):
+            self._masks.insert(0, frozenset(hidden))
+            hidden |= segment.deleted
+
+        self._memory = MemorySegment()
+        self._journal_offset = 0
+        self._doc_count = self._total_length = 0
+        for segment, mask in zip(self._segments, self._masks):
+            self._doc_count += segment.doc_count
+            self._total_length += segment.total_length
+            for doc_id in mask:
+                length = segment.doc_length(doc_id)
+                if length is not None:
+                    self._doc_count -= 1
+                    self._total_length -= length
+
+    def _stored_length(self, doc_id):
+        for segment, mask in zip(self._segments, self._masks):
+            if doc_id not in mask:
+                length = segment.doc_length(doc_id)
+                if length is not None:
+                    return length
+        return None
+
+    def _apply(self, record):
+        doc_id = record['id']
+        if doc_id in self._memory.docs:
+            self._doc_count -= 1
+            self._total_length -= self._memory.remove(doc_id)
+        elif doc_id not in self._memory.touched:
+            length = self._stored_length(doc_id)
+            if length is not None:
+                self._doc_count -= 1
+                self._total_length -= length
+            self._memory.remove(doc_id)
+        if 'terms' in record:
+            self._memory.add(doc_id, record['terms'], record['length'])
+            self._doc_count += 1
+            self._total_length += record['length']
+
+    def search(self, text):
+        """
+        Пары (оценка, id) документов со всеми терминами запроса,
+        по возрастанию
+        """
+        terms = list(dict.fromkeys(analyze(text)))
+        if not terms:
+            return []
+        with self._lock, self._locked():
+            self._refresh()
+            return sorted(
+                (score, doc_id)
+                for doc_id, score in self._score(terms).items())
+
+    def _df(self, term):
+        return (
+            sum(segment.df(term.encode()) for segment in self._segments)
+            + len(self._memory.postings.get(term, ())))
+
+    def _score(self, terms):
+        doc_count = max(self._doc_count, 1)
+        average_length = self._total_length / doc_count or 1
+        scores = None
+        # с редких терминов: кандидатов сразу мало
+        for term in sorted(terms, key=self._df):
+            df = self._df(term)
+            idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+            found = self._term_scores(term, idf, average_length, scores)
+            if scores is not None:
+                found = {
+                    doc_id: score + scores[doc_id]
+                    for doc_id, score in found.items()}
+            scores = found
+            if not scores:
+                break
+        return scores
+
+    def _term_scores(self, term, idf, average_length, candidates):
+        """
+        Вклад термина в BM25 живых документов из candidates (None - всех)
+        """
+        postings = [
+            (doc_id, frequency, length)
+            for segment, mask in zip(self._segments, self._masks)
+            for doc_id, frequency, length in triples(
+                segment.postings(term.encode()))
+            if doc_id not in mask and doc_id not in self._memory.touched]
+        postings.extend(
+            (doc_id, frequency, self._memory.docs[doc_id][1])
+            for doc_id, frequency in self._memory.postings.get(
+                term, {}).items())
+        return {
+            doc_id: idf * frequency * (K1 + 1) / (
+                frequency + K1 * (1 - B + B * length / average_length))
+            for doc_id, frequency, length in postings
+            if candidates is None or doc_id in candidates}
+
+    # запись
+
+    def add(self, documents):
+        """
+        Добавляем или заменяем документы - пары (id, текст)
+        """
+        records = []
+        for doc_id, text in documents:
+            terms = Counter(analyze(text))
+            records.append({
+                'id': doc_id,
+                'terms': terms,
+                'length': sum(terms.values())})
+        self._write(records)
+
+    def remove(self, ids):
+        self._write([{'id': doc_id} for doc_id in ids])
+
+    def _write(self, records):
+        if not records:
+            return
+        data = ''.join(
+            json.dumps(record, ensure_ascii=False) + '\n'
+            for record in records).encode()
+        with self._lock, self._locked(exclusive=True):
+            with open(self.path('journal.log'), 'ab') as file:
+                file.write(data)
+                size = file.tell()
+            if size > self.flush_size:
+                self._flush()
+
+    def flush(self):
+        with self._lock, self._locked(exclusive=True):
+            self._flush()
+
+    def _flush(self):
+        """
+        Журнал - в новый сегмент, лишние сегменты сливаем. Во время
+        перестройки журнал копится: она оставит из него только записи,
+        сделанные после ее начала
+        """
+        if self._rebuild_running():
+            return
+        self._refresh()
+        names = [segment.name for segment in self._segments]
+        memory = self._memory
+        if memory.touched:
+            name = segment_name()
+            write_segment(
+                self.path(name),
+                sorted(
+                    (doc_id, length)
+                    for doc_id, (_, length) in memory.docs.items()),
+                memory.touched, invert(memory.docs))
+            names.append(name)
+        self._write_manifest(names)
+        open(self.path('journal.log'), 'wb').close()
+        self._refresh()
+
+        if len(self._segments) > self.max_segments:
+            name = segment_name()
+            write_segment(
+                self.path(name), *merge(self._segments, self._masks))
+            self._write_manifest([name])
+            self._refresh()
+
+    def rebuild(self, documents):
+        """
+        Строим индекс заново из пар (id, текст) по возрастанию id.
+        Записи журнала, сделанные во время перестройки, остаются
+        и применяются поверх нового сегмента
+        """
+        with self._rebuilding():
+            self._rebuild(documents)
+
+    def _rebuild(self, documents):
+        with self._lock, self._locked(exclusive=True):
+            self._refresh()
+            started = self._journal_size()
+
+        chunks = []
+        docs = {}
+        for doc_id, text in documents:
+            terms = Counter(analyze(text))
+            docs[doc_id] = (terms, sum(terms.values()))
+            if len(docs) >= self.rebuild_chunk:
+                chunks.append(self._write_chunk(docs))
+                docs = {}
+        if docs or not chunks:
+            chunks.append(self._write_chunk(docs))
+
+        name = segment_name()
+        if len(chunks) > 1:
+            segments = [Segment(self.path(chunk)) for chunk in chunks]
+            write_segment(
+                self.path(f'{name}.part'),
+                *merge(segments, [frozenset()] * len(segments)))
+            for segment in segments:
+                segment.close()
+            for chunk in chunks:
+                os.remove(self.path(chunk))
+        else:
+            os.replace(self.path(chunks[0]), self.path(f'{name}.part'))
+
+        with self._lock, self._locked(exclusive=True):
+            self._refresh()
+            # журнал не сбрасывался, его начало уже учтено в documents
+            self._trim_journal(started)
+            os.replace(self.path(f'{name}.part'), self.path(name))
+            self._write_manifest([name])
+            self._refresh()
+
+    def _journal_size(self):
+        try:
+            return os.path.getsize(self.path('journal.log'))
+        except FileNotFoundError:
+            return 0
+
+    def _trim_journal(self, offset):
+        """
+        Убираем из журнала первые offset байт
+        """
+        if not offset:
+            return
+        with open(self.path('journal.log'), 'rb') as file:
+            file.seek(offset)
+            data = file.read()
+        temporary = self.path('journal.log.tmp')
+        with open(temporary, 'wb') as file:
+            file.write(data)
+        os.replace(temporary, self.path('journal.log'))
+
+    def _write_chunk(self, docs):
+        # .part не попадает в уборку старых сегментов до конца перестройки
+        name = f'{segment_name()}.part'
+        write_segment(
+            self.path(name),
+            sorted(
+                (doc_id, length) for doc_id, (_, length) in docs.items()),
+            (), invert(docs))
+        return name
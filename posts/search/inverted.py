@@ -0,0 +1,73 @@
+import bisect
+
+from django.conf import settings
+
+from ..models import Post
+from ..paginator import CursorPaginator
+from .base import SEARCH_ORDERING, BaseSearchBackend
+from .index import SearchIndex
+
+
+def document(post):
+    """
+    Текст, по которому ищется пост
+    """
+    parts = [post.text, post.author.username]
+    if post.group:
+        parts.append(post.group.title)
+    return '\n'.join(parts)
+
+
+class RankedPaginator(CursorPaginator):
+    """
+    Пагинация по курсору для готовой выдачи индекса - списка пар
+    (оценка, id) по возрастанию. Курсор - те же (rank, id)
+    """
+    def __init__(self, results, per_page):
+        self.results = results
+        super().__init__(
+            Post.objects.for_feed(), per_page, ordering=SEARCH_ORDERING)
+
+    def fetch(self, key, reverse=False):
+        if reverse:
+            start = bisect.bisect_right(self.results, tuple(key))
+            found = self.results[start:start + self.per_page + 1]
+        else:
+            end = (
+                len(self.results) if key is None
+                else bisect.bisect_left(self.results, tuple(key)))
+            found = self.results[max(end - self.per_page - 1, 0):end][::-1]
+        posts = Post.objects.for_feed().in_bulk(
+            [doc_id for _, doc_id in found])
+        items = []
+        for rank, doc_id in found:
+            # индекс мог еще не узнать об удалении поста
+            if doc_id in posts:
+                posts[doc_id].rank = rank
+                items.append(posts[doc_id])
+        return items
+
+
+class InvertedIndexBackend(BaseSearchBackend):
+    """
+    Встроенный индекс в каталоге SEARCH_INDEX_DIR: работает на любой
+    базе, сегменты отображаются в память при создании бэкенда
+    """
+    def __init__(self):
+        self.index = SearchIndex(settings.SEARCH_INDEX_DIR)
+
+    def paginator(self, text, per_page):
+        return RankedPaginator(self.index.search(text), per_page)
+
+    def update(self, queryset):
+        self.index.add(
+            (post.pk, document(post))
+            for post in queryset.select_related('author', 'group'))
+
+    def remove(self, ids):
+        self.index.remove(ids)
+
+    def rebuild(self):
+        posts = Post.objects.select_related('author', 'group').order_by('pk')
+        self.index.rebuild(
+            (post.pk, document(post)) for post in posts.iterator())
@@ -0,0 +1,73 @@
+from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db.models import F, FloatField, OuterRef, Subquery, Value
+from django.db.models.functions import Cast
+
+from ..models import Group, Post
+from ..paginator import CursorPaginator
+from .base import SEARCH_ORDERING, BaseSearchBackend
+
+User = get_user_model()
+
+# конфигурация полнотекстового поиска PostgreSQL
+SEARCH_CONFIG = 'russian'
+
+
+def related_value(model, outer, field):
+    return Subquery(
+        model.objects.filter(pk=OuterRef(outer)).values(field)[:1])
+
+
+def search_document():
+    """
+    Текст поста важнее автора и группы, описание группы - меньше всего.
+    Поля связанных моделей берем подзапросами: UPDATE не умеет JOIN
+    """
+    return (
+        SearchVector('text', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(
+            related_value(User, 'author', 'username'),
+            related_value(User, 'author', 'first_name'),
+            related_value(User, 'author', 'last_name'),
+            weight='B', config=SEARCH_CONFIG)
+        + SearchVector(
+            related_value(Group, 'group', 'title'),
+            weight='B', config=SEARCH_CONFIG)
+        + SearchVector(
+            related_value(Group, 'group', 'description'),
+            weight='C', config=SEARCH_CONFIG))
+
+
+def search_posts(text):
+    """
+    Посты, подходящие под запрос, с рангом для сортировки
+    """
+    if not text:
+        return Post.objects.annotate(
+            rank=Value(0, output_field=FloatField())).none()
+    query = SearchQuery(text, config=SEARCH_CONFIG)
+    # ts_rank возвращает real: значение из курсора, прочитанное как
+    # double, не совпало бы с ним при сравнении
+    rank = Cast(SearchRank(F('search_vector'), query), FloatField())
+    return Post.objects.for_feed().annotate(rank=rank).filter(
+        search_vector=query)
+
+
+class PostgresBackend(BaseSearchBackend):
+    """
+    Полнотекстовый поиск PostgreSQL по Post.search_vector с GIN-индексом
+    """
+    def paginator(self, text, per_page):
+        return CursorPaginator(
+            search_posts(text), per_page, ordering=SEARCH_ORDERING)
+
+    def update(self, queryset):
+        queryset.update(search_vector=search_document())
+
+    def remove(self, ids):
+        # вектор удаляется вместе со строкой поста
+        pass
+
+    def rebuild(self):
+        self.update(Post.objects.all())
@@ -0,0 +1,349 @@
+import threading
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import follows, thumbnails, timeline, trending
+from .cache_tags import invalidate, post_tags
+from .models import Comment, Follow, Group, Post, Profile
+from .search import get_backend
+
+User = get_user_model()
+
+# поля автора, которые выводятся рядом с его постами и попадают
+# в их поисковый вектор
+AUTHOR_FIELDS = {'username', 'first_name', 'last_name'}
+# поля с файлами в хранилище с подсчетом ссылок (posts/storage.py)
+MEDIA_FIELDS = {Post: 'image', Profile: 'photo'}
+# см. deleting()
+_deleting = threading.local()
+
+
+@receiver(post_save, sender=Comment)
+def increment_comment_count(sender, instance, created, **kwargs):
+    if created:
+        Post.objects.filter(pk=instance.post_id).update(
+            comment_count=F('comment_count') + 1)
+
+
+def deleting(model):
+    """
+    id постов или пользователей, которые сейчас удаляются в этом потоке
+    """
+    if not hasattr(_deleting, 'ids'):
+        _deleting.ids = {Post: set(), User: set()}
+    return _deleting.ids[model]
+
+
+def deleted_in_cascade(comment):
+    """
+    Комментарий удаляется вместе с постом или автором: счетчики и
+    теги уже обновлены разом в pre_delete
+    """
+    return (comment.post_id in deleting(Post)
+            or comment.author_id in deleting(User))
+
+
+def tags_of_posts(post_ids):
+    """
+    Теги постов по id одним запросом, без загрузки самих постов
+    """
+    tags = {'posts'}
+    posts = Post.objects.filter(id__in=post_ids).values_list(
+        'id', 'author_id', 'group__slug')
+    for post_id, author_id, slug in posts:
+        tags.update((f'post:{post_id}', f'author:{author_id}'))
+        if slug:
+            tags.add(f'group:{slug}')
+    return tags
+
+
+@receiver(pre_delete, sender=Post)
+def remember_deleted_post(sender, instance, **kwargs):
+    # счетчик и теги самого поста уже не нужны
+    deleting(Post).add(instance.pk)
+
+
+@receiver(pre_delete, sender=User)
+def uncount_user_comments(sender, instance, **kwargs):
+    """
+    Комментарии пользователя к чужим постам удалятся каскадом:
+    счетчики этих постов уменьшаем одним запросом
+    """
+    deleting(User).add(instance.pk)
+    comments = Comment.objects.filter(author=instance).exclude(
+        post__author=instance).order_by()
+    post_ids = list(comments.values_list('post_id', flat=True).distinct())
+    if not post_ids:
+        return
+    counts = comments.filter(post=OuterRef('pk')).values(
+        'post').annotate(count=Count('id')).values('count')
+    Post.objects.filter(id__in=post_ids).update(
+        comment_count=F('comment_count') - Subquery(counts))
+    invalidate(*tags_of_posts(post_ids))
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=User)
+def forget_deleted(sender, instance, **kwargs):
+    # комментарии удаляются раньше поста и автора
+    deleting(sender).discard(instance.pk)
+
+
+@receiver(post_delete, sender=Comment)
+def decrement_comment_count(sender, instance, **kwargs):
+    if deleted_in_cascade(instance):
+        return
+    Post.objects.filter(pk=instance.post_id).update(
+        comment_count=F('comment_count') - 1)
+
+
+@receiver(post_save, sender=Post)
+def increment_post_count(sender, instance, created, **kwargs):
+    if created:
+        Profile.objects.filter(user=instance.author_id).update(
+            post_count=F('post_count') + 1)
+
+
+@receiver(post_delete, sender=Post)
+def decrement_post_count(sender, instance, **kwargs):
+    Profile.objects.filter(user=instance.author_id).update(
+        post_count=F('post_count') - 1)
+
+
+@receiver(post_save, sender=Follow)
+def increment_follow_counts(sender, instance, created, **kwargs):
+    if created:
+        Profile.objects.filter(user=instance.user_id).update(
+            follower_count=F('follower_count') + 1)
+        Profile.objects.filter(user=instance.author_id).update(
+            following_count=F('following_count') + 1)
+
+
+@receiver(post_delete, sender=Follow)
+def decrement_follow_counts(sender, instance, **kwargs):
+    Profile.objects.filter(user=instance.user_id).update(
+        follower_count=F('follower_count') - 1)
+    Profile.objects.filter(user=instance.author_id).update(
+        following_count=F('following_count') - 1)
+
+
+@receiver(post_save, sender=Post)
+def record_post_activity(sender, instance, created, **kwargs):
+    if created:
+        trending.record_post(instance)
+
+
+@receiver(post_save, sender=Comment)
+def record_comment_activity(sender, instance, created, **kwargs):
+    if created:
+        trending.record_comment(instance)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_followed_ids(sender, instance, **kwargs):
+    follows.invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def reset_followed_ids(sender, instance, created, **kwargs):
+    # id удаленного пользователя может достаться новому
+    if created:
+        follows.invalidate(instance.id)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        timeline.backfill(instance.user_id, instance.author_id)
+        timeline.followers_changed(instance.author_id, 1)
+
+
+@receiver(post_delete, sender=Follow)
+def clean_timeline(sender, instance, **kwargs):
+    timeline.remove(instance.user_id, instance.author_id)
+    timeline.followers_changed(instance.author_id, -1)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    get_backend().update(Post.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    get_backend().remove([instance.pk])
+
+
+@receiver(post_save, sender=Group)
+def index_group_posts(sender, instance, created, **kwargs):
+    if not created:
+        get_backend().update(instance.posts.all())
+
+
+@receiver(post_save, sender=User)
+def index_author_posts(sender, instance, created, update_fields, **kwargs):
+    # вход на сайт сохраняет только last_login, вектор от него не зависит
+    if created or (
+            update_fields and not AUTHOR_FIELDS & set(update_fields)):
+        return
+    get_backend().update(instance.posts.all())
+
+
+@receiver(pre_save, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    if not instance._state.adding:
+        instance.previous_group_slug = Post.objects.filter(
+            pk=instance.pk).values_list('group__slug', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post(sender, instance, **kwargs):
+    tags = post_tags(instance)
+    previous_group_slug = getattr(instance, 'previous_group_slug', None)
+    if previous_group_slug:
+        tags.append(f'group:{previous_group_slug}')
+    invalidate(*tags)
+
+
+@receiver(post_save, sender=Comment)
+def invalidate_comment(sender, instance, **kwargs):
+    invalidate(*post_tags(instance.post))
+
+
+@receiver(post_delete, sender=Comment)
+def invalidate_deleted_comment(sender, instance, **kwargs):
+    if not deleted_in_cascade(instance):
+        invalidate(*tags_of_posts([instance.post_id]))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow(sender, instance, **kwargs):
+    invalidate(f'author:{instance.user_id}', f'author:{instance.author_id}')
+
+
+@receiver(pre_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def remember_group_authors(sender, instance, **kwargs):
+    """
+    Название сообщества выводится в карточках его постов на страницах
+    авторов; после удаления посты уже не найти по группе
+    """
+    instance.author_ids = []
+    instance.previous_slug = None
+    if instance.pk is not None:
+        instance.author_ids = list(Post.objects.filter(
+            group=instance.pk).values_list('author_id', flat=True).distinct())
+        instance.previous_slug = Group.objects.filter(
+            pk=instance.pk).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group(sender, instance, **kwargs):
+    # страница поста помечена тегом автора, отдельные post:<id> не нужны
+    slugs = {instance.slug, instance.previous_slug} - {None}
+    invalidate(
+        'posts', *(f'group:{slug}' for slug in slugs),
+        *(f'author:{author_id}' for author_id in instance.author_ids))
+
+
+@receiver(post_save, sender=User)
+def invalidate_author(sender, instance, created, update_fields, **kwargs):
+    """
+    Имя автора выводится в ленте, в сообществах его постов и в
+    комментариях, адрес профиля строится из username
+    """
+    if created or (
+            update_fields and not AUTHOR_FIELDS & set(update_fields)):
+        return
+    slugs = instance.posts.exclude(group=None).values_list(
+        'group__slug', flat=True).distinct()
+    commented = instance.comments.values_list('post_id', flat=True).distinct()
+    invalidate(
+        'posts', f'author:{instance.id}',
+        *(f'group:{slug}' for slug in slugs),
+        *(f'post:{post_id}' for post_id in commented))
+
+
+@receiver(post_delete, sender=User)
+def invalidate_deleted_author(sender, instance, **kwargs):
+    # username освободился: его страницы не должны достаться новому
+    # пользователю с тем же именем
+    invalidate(f'author:{instance.id}')
+
+
+@receiver(post_save, sender=Profile)
+def invalidate_profile(sender, instance, **kwargs):
+    invalidate(f'author:{instance.user_id}')
+
+
+def schedule_thumbnails(instance, field, variants):
+    """
+    Превью новой картинки - после коммита: до него файла может
+    не быть в базе, а после отката - и на диске
+    """
+    if instance.media_changed:
+        name = getattr(instance, field).name
+        transaction.on_commit(lambda: thumbnails.schedule(name, variants))
+
+
+@receiver(post_save, sender=Post)
+def generate_post_thumbnails(sender, instance, **kwargs):
+    schedule_thumbnails(instance, 'image', ('post',))
+
+
+@receiver(post_save, sender=Profile)
+def generate_avatar_thumbnails(sender, instance, **kwargs):
+    schedule_thumbnails(instance, 'photo', ('avatar',))
+
+
+def release_media(model, name):
+    """
+    Снимаем ссылку на файл name; превью последней копии удаляем
+    вместе с ней, после коммита
+    """
+    storage = model._meta.get_field(MEDIA_FIELDS[model]).storage
+    if name and storage.release(name):
+        transaction.on_commit(lambda: thumbnails.delete_thumbnails(name))
+
+
+@receiver(pre_save, sender=Post)
+@receiver(pre_save, sender=Profile)
+def remember_media(sender, instance, **kwargs):
+    instance.replaced_media = None
+    file_ = getattr(instance, MEDIA_FIELDS[sender])
+    previous = None
+    if not instance._state.adding:
+        previous = sender.objects.filter(pk=instance.pk).values_list(
+            MEDIA_FIELDS[sender], flat=True).first()
+    # повторная загрузка того же файла тоже добавила ссылку
+    instance.media_changed = previous != file_.name or not file_._committed
+    if previous and instance.media_changed:
+        instance.replaced_media = previous
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Profile)
+def release_replaced_media(sender, instance, **kwargs):
+    release_media(sender, instance.replaced_media)
+    instance.replaced_media = None
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Profile)
+def release_deleted_media(sender, instance, **kwargs):
+    release_media(sender, getattr(instance, MEDIA_FIELDS[sender]).name)
@@ -0,0 +1,113 @@
+"""
+Хранилище медиафайлов с адресацией по содержимому: файл называется
+по SHA-256 своих байтов, поэтому одинаковые загрузки хранятся
+(и получают превью) один раз. Ссылки на каждую копию считаются
+в StoredFile, и файл удаляется с диска, только когда на него больше
+никто не ссылается. Файлы без записи в StoredFile (аватарка по
+умолчанию, загрузки до появления хранилища) никогда не удаляются
+"""
+import hashlib
+import os
+import re
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import StoredFile
+
+# имя из content_name: .../ab/ab<еще 62 знака SHA-256>.ext
+CONTENT_NAME = re.compile(r'(?:^|/)([0-9a-f]{2})/\1[0-9a-f]{62}\.\w+$')
+
+
+def is_content_addressed(name):
+    """
+    Имя дал content_name: под ним всегда одно и то же содержимое
+    """
+    return bool(CONTENT_NAME.search(name))
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def content_name(self, name, content):
+        """
+        upload_to/ab/abcd...ef.ext: каталог и расширение из исходного
+        имени, остальное - хэш содержимого
+        """
+        directory, filename = os.path.split(name)
+        digest = content_hash(content)
+        extension = os.path.splitext(filename)[1].lower()
+        return os.path.join(directory, digest[:2], digest + extension)
+
+    def _save(self, name, content):
+        name = self.content_name(name, content)
+        self.acquire(name)
+        if not self.exists(name):
+            saved = super()._save(name, content)
+            if saved != name:
+                # ту же картинку параллельно записал другой запрос
+                super().delete(saved)
+        return name
+
+    def acquire(self, name):
+        with transaction.atomic():
+            if StoredFile.objects.filter(name=name).update(
+                    ref_count=F('ref_count') + 1):
+                return
+            try:
+                with transaction.atomic():
+                    StoredFile.objects.create(name=name)
+            except IntegrityError:
+                StoredFile.objects.filter(name=name).update(
+                    ref_count=F('ref_count') + 1)
+
+    def release(self, name):
+        """
+        Снимаем одну ссылку на name. True, если она была последней:
+        файл удаляется с диска после коммита транзакции
+        """
+        with transaction.atomic():
+            released = StoredFile.objects.filter(
+                name=name, ref_count__gt=0).update(
+                ref_count=F('ref_count') - 1)
+            if not released:
+                return False
+            deleted, _ = StoredFile.objects.filter(
+                name=name, ref_count=0).delete()
+        if deleted:
+            transaction.on_commit(lambda: self.delete_unreferenced(name))
+        return bool(deleted)
+
+    def delete_unreferenced(self, name):
+        # пока шла транзакция, файл могли загрузить заново
+        if not StoredFile.objects.filter(name=name).exists():
+            super().delete(name)
+
+    def delete(self, name):
+        self.release(name)
+
+
+class ThumbnailStorage(FileSystemStorage):
+    """
+    Хранилище превью. Имя превью sorl строит из имени источника и опций,
+    поэтому одно имя - одно и то же превью. Если его одновременно создают
+    фоновый поток и запрос, второй просто перезаписывает файл, а не
+    сохраняет копию с суффиксом
+    """
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        # уникальное временное имя, затем атомарная замена
+        temporary = super()._save(f'{name}.{uuid.uuid4().hex}.tmp', content)
+        os.replace(self.path(temporary), self.path(name))
+        return name
@@ -0,0 +1,196 @@
+"""
+Рекомендации "Кого почитать", которые считаются заранее по графу
+подписок. Граф целиком загружается в разреженные массивы NumPy
+(CSR: для каждого пользователя отрезок в общем массиве соседей),
+оценки кандидатов считаются векторно по блокам пользователей, а лучшие
+SUGGESTIONS_PER_USER на каждого пишутся в таблицу Suggestion
+
+Оценка кандидата w для пользователя u складывается из путей в графе:
+
+* друзья друзей: u -> v -> w, каждый путь дает FOF_WEIGHT;
+* общие подписки: u -> a <- x -> w (x читает тех же авторов, что u,
+  и читает w), путь дает COFOLLOW_WEIGHT / число подписчиков a -
+  общий популярный автор говорит о вкусах меньше, чем редкий.
+  Авторов с подписчиками больше MAX_FANOUT пропускаем совсем
+"""
+import itertools
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+
+from .models import Follow, Suggestion
+
+User = get_user_model()
+
+SUGGESTIONS_PER_USER = 10
+FOF_WEIGHT = 1.0
+COFOLLOW_WEIGHT = 0.5
+MAX_FANOUT = 200
+# сколько путей разворачиваем за раз: ограничивает память
+BLOCK_PATHS = 5_000_000
+BATCH_SIZE = 10000
+
+
+def csr(rows, columns, size):
+    """
+    Соседи каждой вершины: columns[ptr[i]:ptr[i + 1]] - соседи i
+    """
+    order = np.argsort(rows, kind='stable')
+    ptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=size), out=ptr[1:])
+    return ptr, columns[order]
+
+
+def expand(graph, rows):
+    """
+    Все соседи вершин rows одним массивом: (номер в rows, сосед)
+    """
+    ptr, neighbours = graph
+    counts = ptr[rows + 1] - ptr[rows]
+    owners = np.repeat(np.arange(len(rows)), counts)
+    starts = np.repeat(ptr[rows] - (np.cumsum(counts) - counts), counts)
+    return owners, neighbours[starts + np.arange(counts.sum())]
+
+
+class FollowGraph:
+    """
+    Граф подписок на плотных номерах вершин 0..size-1; ids[i] -
+    id пользователя с номером i
+    """
+    def __init__(self, followers, authors):
+        self.ids, inverse = np.unique(
+            np.concatenate((followers, authors)), return_inverse=True)
+        self.size = len(self.ids)
+        self.sources = inverse[:len(followers)]
+        self.targets = inverse[len(followers):]
+        self.following = csr(self.sources, self.targets, self.size)
+        self.followers = csr(self.targets, self.sources, self.size)
+        self.out_degree = np.diff(self.following[0])
+        self.in_degree = np.diff(self.followers[0])
+
+    @classmethod
+    def load(cls):
+        """
+        Таблица Follow целиком, без создания объектов моделей
+        """
+        chunks = [np.empty((0, 2), dtype=np.int64)]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT user_id, author_id FROM {Follow._meta.db_table}')
+            for rows in iter(lambda: cursor.fetchmany(BATCH_SIZE), []):
+                chunks.append(np.array(rows, dtype=np.int64))
+        edges = np.concatenate(chunks)
+        return cls(edges[:, 0], edges[:, 1])
+
+    def path_counts(self):
+        """
+        Сколько путей развернется для каждой вершины - по этой оценке
+        вершины делятся на блоки
+        """
+        fof = np.bincount(
+            self.sources, weights=self.out_degree[self.targets],
+            minlength=self.size)
+        via_author = np.bincount(
+            self.targets, weights=self.out_degree[self.sources],
+            minlength=self.size)
+        via_author[self.in_degree > MAX_FANOUT] = 0
+        cofollow = np.bincount(
+            self.sources, weights=via_author[self.targets],
+            minlength=self.size)
+        return fof + cofollow
+
+    def blocks(self):
+        users = np.flatnonzero(self.out_degree)
+        if not len(users):
+            return
+        total = np.cumsum(self.path_counts()[users])
+        bounds = np.searchsorted(
+            total, np.arange(BLOCK_PATHS, total[-1], BLOCK_PATHS))
+        for block in np.split(users, np.unique(bounds)):
+            if len(block):
+                yield block
+
+    def candidates(self, block):
+        """
+        Пары (пользователь, кандидат) и вес каждого пути
+        """
+        owners, followed = expand(self.following, block)
+        users, candidates, weights = [], [], []
+
+        fof_owners, fof = expand(self.following, followed)
+        users.append(block[owners[fof_owners]])
+        candidates.append(fof)
+        weights.append(np.full(len(fof), FOF_WEIGHT))
+
+        rare = self.in_degree[followed] <= MAX_FANOUT
+        author_owners, readers = expand(self.followers, followed[rare])
+        author_weights = COFOLLOW_WEIGHT / self.in_degree[followed[rare]]
+        reader_owners, cofollowed = expand(self.following, readers)
+        user_of_reader = block[owners[rare][author_owners]]
+        users.append(user_of_reader[reader_owners])
+        candidates.append(cofollowed)
+        weights.append(author_weights[author_owners][reader_owners])
+
+        # сам пользователь и те, на кого он уже подписан, не кандидаты
+        followed_keys = block[owners] * self.size + followed
+        users = np.concatenate(users)
+        candidates = np.concatenate(candidates)
+        keys = users * self.size + candidates
+        keep = (users != candidates) & ~np.isin(keys, followed_keys)
+        return keys[keep], np.concatenate(weights)[keep]
+
+    def top(self, block, limit):
+        keys, weights = self.candidates(block)
+        keys, inverse = np.unique(keys, return_inverse=True)
+        scores = np.bincount(inverse.ravel(), weights=weights)
+        users, candidates = np.divmod(keys, self.size)
+
+        order = np.lexsort((-scores, users))
+        users, candidates, scores = (
+            users[order], candidates[order], scores[order])
+        # место кандидата в списке своего пользователя
+        position = np.arange(len(users))
+        group_start = np.r_[True, users[1:] != users[:-1]]
+        rank = position - np.maximum.accumulate(
+            np.where(group_start, position, 0))
+        best = rank < limit
+        return (
+            self.ids[users[best]], self.ids[candidates[best]], scores[best])
+
+    def suggestions(self, limit=SUGGESTIONS_PER_USER):
+        """
+        Лучшие limit кандидатов каждого пользователя:
+        (id пользователей, id авторов, оценки) по блокам
+        """
+        for block in self.blocks():
+            yield self.top(block, limit)
+
+
+def save(suggestions):
+    """
+    Заменяем таблицу рекомендаций целиком. Пользователей, удаленных
+    после загрузки графа, пропускаем
+    """
+    existing = np.fromiter(
+        User.objects.values_list('id', flat=True).iterator(),
+        dtype=np.int64)
+
+    def rows():
+        for users, authors, scores in suggestions:
+            alive = np.isin(users, existing) & np.isin(authors, existing)
+            for user, author, score in zip(
+                    users[alive].tolist(), authors[alive].tolist(),
+                    scores[alive].tolist()):
+                yield Suggestion(user_id=user, author_id=author, score=score)
+
+    saved = 0
+    batches = rows()
+    with transaction.atomic():
+        Suggestion.objects.all().delete()
+        while True:
+            batch = list(itertools.islice(batches, BATCH_SIZE))
+            if not batch:
+                return saved
+            Suggestion.objects.bulk_create(batch)
+            saved += len(batch)
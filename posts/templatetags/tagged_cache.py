@@ -0,0 +1,37 @@
+from django import template
+from django.templatetags.cache import CacheNode
+
+from posts.cache_tags import get_versions
+
+register = template.Library()
+
+
+class TagVersions:
+    """
+    Версии тегов как часть ключа фрагмента: после инвалидации тега
+    ключ меняется, и фрагмент рендерится заново
+    """
+    def __init__(self, tags_var):
+        self.tags_var = tags_var
+
+    def resolve(self, context):
+        return get_versions(self.tags_var.resolve(context) or [])
+
+
+@register.tag('tagged_cache')
+def do_tagged_cache(parser, token):
+    """
+    Как {% cache %}, но с тегами инвалидации:
+
+        {% tagged_cache [expire_time] [fragment_name] [tags] [var1] .. %}
+    """
+    nodelist = parser.parse(('endtagged_cache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 4:
+        raise template.TemplateSyntaxError(
+            f'{tokens[0]!r} tag requires at least 3 arguments.')
+    vary_on = [TagVersions(parser.compile_filter(tokens[3]))]
+    vary_on += [parser.compile_filter(t) for t in tokens[4:]]
+    return CacheNode(
+        nodelist, parser.compile_filter(tokens[1]), tokens[2], vary_on, None)
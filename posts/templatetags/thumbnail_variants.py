@@ -0,0 +1,48 @@
+import logging
+
+from django import template
+from django.db.models import Model
+from sorl.thumbnail.conf import settings as thumbnail_settings
+
+from .. import thumbnails
+
+logger = logging.getLogger(__name__)
+
+register = template.Library()
+
+
+@register.simple_tag
+def prefetch_thumbnails(*groups):
+    """
+    {% prefetch_thumbnails page 'image' 'post' photo 'photo' 'avatar' %} -
+    превью всех картинок фрагмента за одно обращение к хранилищу sorl
+    (posts.thumbnails.prefetch_thumbnails). Внутри tagged_cache
+    срабатывает, только когда фрагмент рендерится заново
+    """
+    thumbnails.prefetch_thumbnails(*(
+        [value] if isinstance(value, Model) else value for value in groups))
+    return ''
+
+
+@register.simple_tag
+def thumbnail_srcset(file_, variant):
+    """
+    {% thumbnail_srcset post.image 'post' as im %} - im.src,
+    im.srcset и im.webp_srcset для адаптивной картинки
+    """
+    return safe_thumbnail(thumbnails.srcset, file_, variant)
+
+
+def safe_thumbnail(function, file_, variant):
+    """
+    Как тег sorl-thumbnail: без картинки или при ошибке - None
+    """
+    if not file_:
+        return None
+    try:
+        return function(file_, variant)
+    except Exception:
+        if thumbnail_settings.THUMBNAIL_DEBUG:
+            raise
+        logger.exception('Не удалось получить превью %s', file_)
+        return None
@@ -0,0 +1,127 @@
+from importlib import import_module
+from io import StringIO
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from posts.models import Comment, Follow, Post, Profile
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='vika')
+        cls.author = User.objects.create_user(username='victor')
+
+    def profile(self, user):
+        return Profile.objects.get(user=user)
+
+    def test_comment_count(self):
+        post = Post.objects.create(text='Пост', author=CountersTests.author)
+        comment = Comment.objects.create(
+            post=post, author=CountersTests.user, text='Комментарий')
+        Comment.objects.create(
+            post=post, author=CountersTests.user, text='Еще комментарий')
+
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 2)
+
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+
+    def test_post_delete_does_not_depend_on_comments(self):
+        def delete_post(comments):
+            post = Post.objects.create(
+                text='Пост', author=CountersTests.author)
+            for _ in range(comments):
+                Comment.objects.create(
+                    post=post, author=CountersTests.user, text='Комментарий')
+            with CaptureQueriesContext(connection) as queries:
+                post.delete()
+            return len(queries)
+
+        self.assertEqual(delete_post(1), delete_post(20))
+
+    def test_deleted_user_comments_are_uncounted(self):
+        post = Post.objects.create(text='Пост', author=CountersTests.author)
+        Comment.objects.create(
+            post=post, author=CountersTests.user, text='Комментарий')
+
+        def delete_commenter(comments):
+            commenter = User.objects.create_user(username='zhanna')
+            own = Post.objects.create(text='Свой пост', author=commenter)
+            for _ in range(comments):
+                Comment.objects.create(
+                    post=post, author=commenter, text='Комментарий')
+                Comment.objects.create(
+                    post=own, author=commenter, text='Комментарий')
+            with CaptureQueriesContext(connection) as queries:
+                commenter.delete()
+            post.refresh_from_db()
+            self.assertEqual(post.comment_count, 1)
+            return len(queries)
+
+        self.assertEqual(delete_commenter(1), delete_commenter(10))
+
+    def test_post_count(self):
+        post = Post.objects.create(text='Пост', author=CountersTests.author)
+        self.assertEqual(self.profile(CountersTests.author).post_count, 1)
+
+        post.delete()
+        self.assertEqual(self.profile(CountersTests.author).post_count, 0)
+
+    def test_follow_counts(self):
+        follow = Follow.objects.create(
+            user=CountersTests.user, author=CountersTests.author)
+        self.assertEqual(self.profile(CountersTests.user).follower_count, 1)
+        self.assertEqual(
+            self.profile(CountersTests.author).following_count, 1)
+
+        follow.delete()
+        self.assertEqual(self.profile(CountersTests.user).follower_count, 0)
+        self.assertEqual(
+            self.profile(CountersTests.author).following_count, 0)
+
+    def test_missing_profiles_are_created_with_counters(self):
+        migration = import_module(
+            'posts.migrations.0006_create_missing_profiles')
+        Post.objects.create(text='Пост', author=CountersTests.author)
+        Follow.objects.create(
+            user=CountersTests.user, author=CountersTests.author)
+        Profile.objects.filter(user=CountersTests.author).delete()
+
+        migration.create_missing_profiles(apps, None)
+
+        profile = self.profile(CountersTests.author)
+        self.assertEqual(
+            (profile.post_count, profile.follower_count,
+             profile.following_count), (1, 0, 1))
+
+    def test_repair_counters(self):
+        post = Post.objects.create(text='Пост', author=CountersTests.author)
+        Comment.objects.create(
+            post=post, author=CountersTests.user, text='Комментарий')
+        Follow.objects.create(
+            user=CountersTests.user, author=CountersTests.author)
+        Post.objects.update(comment_count=10)
+        Profile.objects.update(
+            post_count=10, follower_count=10, following_count=10)
+
+        call_command('repair_counters', stdout=StringIO())
+
+        post.refresh_from_db()
+        author = self.profile(CountersTests.author)
+        user = self.profile(CountersTests.user)
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(author.post_count, 1)
+        self.assertEqual(author.following_count, 1)
+        self.assertEqual(user.follower_count, 1)
+        self.assertEqual(user.following_count, 0)
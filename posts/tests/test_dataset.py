@@ -0,0 +1,88 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db.models import Sum
+from django.test import TestCase
+
+from posts.models import (Comment, Follow, GroupActivity, Post, PostActivity,
+                          Profile, StoredFile, TrendingGroup, TrendingPost)
+from private_messages.models import Message, Participant, Topic
+
+from .test_storage import MediaRootMixin
+
+User = get_user_model()
+
+
+class GenerateDatasetTests(MediaRootMixin, TestCase):
+    def generate(self, prefix='bench', seed=1, days=365):
+        call_command(
+            'generate_dataset', users=30, groups=3, follows=100, posts=200,
+            images=2, image_share=0.5, comments=300, topics=20, messages=3,
+            seed=seed, prefix=prefix, days=days, stdout=StringIO())
+
+    def snapshot(self, prefix):
+        """
+        Посты и подписки набора без префикса в именах
+        """
+        def name(username):
+            return username[len(prefix):]
+
+        posts = Post.objects.filter(
+            author__username__startswith=prefix).order_by('id')
+        follows = Follow.objects.filter(user__username__startswith=prefix)
+        return (
+            [(name(author), text, image) for author, text, image in
+             posts.values_list('author__username', 'text', 'image')],
+            sorted((name(user), name(author)) for user, author in
+                   follows.values_list('user__username', 'author__username')))
+
+    def test_counts_and_derived_data(self):
+        self.generate()
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Profile.objects.count(), 30)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 300)
+        self.assertEqual(Follow.objects.count(), 100)
+        self.assertEqual(
+            Participant.objects.count(), Topic.objects.count() * 2)
+        self.assertGreaterEqual(Message.objects.count(), Topic.objects.count())
+        author = Profile.objects.order_by('-post_count').first()
+        self.assertEqual(author.post_count, author.user.posts.count())
+        with_images = Post.objects.exclude(image='').count()
+        self.assertEqual(
+            sum(StoredFile.objects.values_list('ref_count', flat=True)),
+            with_images)
+
+    def test_trending_activity(self):
+        # весь набор внутри окна популярного
+        self.generate(days=1)
+        self.assertEqual(
+            PostActivity.objects.aggregate(total=Sum('comments'))['total'],
+            Comment.objects.count())
+        self.assertEqual(
+            GroupActivity.objects.aggregate(total=Sum('posts'))['total'],
+            Post.objects.exclude(group=None).count())
+        self.assertTrue(TrendingPost.objects.exists())
+        self.assertTrue(TrendingGroup.objects.exists())
+
+    def test_last_read_message(self):
+        self.generate()
+        for participant in Participant.objects.all():
+            messages = participant.topic.topic_messages.order_by('-id')
+            last_read = messages.filter(read_at__isnull=False).first()
+            if not participant.unread_count:
+                last_read = messages.first()
+            with self.subTest(participant=participant.pk):
+                self.assertEqual(
+                    participant.last_read_id, last_read and last_read.id)
+
+    def test_same_seed_same_data(self):
+        self.generate('first')
+        self.generate('second')
+        self.assertEqual(self.snapshot('first'), self.snapshot('second'))
+
+    def test_existing_prefix_is_refused(self):
+        self.generate()
+        with self.assertRaises(CommandError):
+            self.generate()
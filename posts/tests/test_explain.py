@@ -0,0 +1,139 @@
+"""
+Планы запросов страниц posts/views.py и private_messages/views.py:
+на заполненной базе каждый SELECT/UPDATE страницы прогоняется через
+EXPLAIN. Тест падает, если большая таблица читается целиком или
+сортируется больше SORT_ROWS строк - значит, запросу не хватает
+индекса. Последовательное чтение запрещено планировщику
+(enable_seqscan), иначе на маленькой тестовой базе он выбирал бы
+его и при наличии индекса: оно останется в плане, только если
+индекса нет.
+
+Поиск не проверяем: сортировка найденного по релевантности -
+его суть. Только для PostgreSQL
+"""
+import json
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Comment, Follow, Group, Post, TimelineEntry
+from private_messages.models import Message, Participant, Topic
+
+User = get_user_model()
+
+LARGE_MODELS = (
+    Post, Comment, Follow, TimelineEntry, Message, Topic, Participant)
+SORT_ROWS = 200
+USERS = 50
+POSTS_PER_USER = 40
+COMMENTS = 500
+TOPICS = 100
+MESSAGES_PER_TOPIC = 20
+
+
+def plan_problems(plan, tables):
+    node = plan['Node Type']
+    if node == 'Seq Scan' and plan['Relation Name'] in tables:
+        yield f'Seq Scan on {plan["Relation Name"]}'
+    if node == 'Sort' and plan['Plan Rows'] > SORT_ROWS:
+        yield f'Sort of {plan["Plan Rows"]} rows by {plan["Sort Key"]}'
+    for child in plan.get('Plans', ()):
+        yield from plan_problems(child, tables)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'нужен PostgreSQL')
+@override_settings(PM_LONG_POLL_TIMEOUT=0)
+class ExplainTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        users = [
+            User.objects.create_user(username=f'user{n}')
+            for n in range(USERS)]
+        cls.user = users[0]
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {n}', author=author,
+                 group=cls.group if n % 5 == 0 else None)
+            for author in users for n in range(POSTS_PER_USER))
+        cls.post = Post.objects.filter(author=cls.user).first()
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=author, text='Комментарий')
+            for author in users[:COMMENTS // 10] * 10)
+        # bulk_create обходит сигналы счетчиков
+        Post.objects.filter(pk=cls.post.pk).update(comment_count=COMMENTS)
+        Follow.objects.bulk_create(
+            Follow(user=follower, author=author)
+            for follower in users for author in users[:10]
+            if follower != author)
+        TimelineEntry.objects.bulk_create(
+            TimelineEntry(user=cls.user, post=post, pub_date=post.pub_date)
+            for post in Post.objects.filter(author__in=users[1:10]))
+
+        now = timezone.now()
+        # у пользователя несколько топиков, остальные - чужие
+        topics = [
+            Topic.objects.create(
+                sender=users[n % USERS], recipient=users[n % USERS - 1],
+                last_sent_at=now)
+            for n in range(1, TOPICS + 1)]
+        cls.topic = topics[0]
+        Message.objects.bulk_create(
+            Message(topic=topic, sender_id=topic.sender_id, body='Привет')
+            for topic in topics for _ in range(MESSAGES_PER_TOPIC))
+        cls.message = cls.topic.topic_messages.order_by('id').first()
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def pages(self):
+        user, post, topic = self.user, self.post, self.topic
+        return [
+            reverse('index'),
+            reverse('group_posts', args=[self.group.slug]),
+            reverse('profile', args=[user.username]),
+            reverse('post', args=[user.username, post.id]),
+            reverse('follow_index'),
+            reverse('trending'),
+            reverse('private_messages'),
+            reverse('private_messages_topic', args=[topic.id]),
+            reverse('private_messages_since', args=[topic.id])
+            + f'?after_id={self.message.id}',
+            reverse('private_messages_wait') + f'?after_id={self.message.id}',
+        ]
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+            try:
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+                plan = cursor.fetchone()[0]
+            finally:
+                cursor.execute('RESET enable_seqscan')
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan[0]['Plan']
+
+    def test_pages_use_indexes(self):
+        tables = {model._meta.db_table for model in LARGE_MODELS}
+        for url in self.pages():
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            for query in queries:
+                sql = query['sql']
+                if not sql.startswith(('SELECT', 'UPDATE')):
+                    continue
+                with self.subTest(url=url, sql=sql):
+                    self.assertEqual(
+                        list(plan_problems(self.explain(sql), tables)), [])
@@ -67,7 +67,8 @@ class PostCreateFormTests(TestCase):
         self.assertEqual(post.text, text)
         self.assertEqual(post.author, PostCreateFormTests.user)
         self.assertEqual(post.group.id, PostCreateFormTests.group.id)
-        self.assertEqual(post.image, f'posts/{self.uploaded}')
+        # файл назван по хэшу содержимого, см. posts/storage.py
+        self.assertRegex(post.image.name, r'^posts/\w{2}/\w{64}\.gif$')
 
     def test_create_post(self):
         form_data = {
@@ -0,0 +1,87 @@
+import os
+from io import BytesIO
+
+from django.core.files.uploadedfile import (SimpleUploadedFile,
+                                            TemporaryUploadedFile)
+from django.forms import ValidationError
+from django.test import SimpleTestCase, TestCase, override_settings
+from PIL import Image
+
+from posts.forms import PostForm
+from posts.images import normalize_image
+
+# тег EXIF Orientation
+ORIENTATION = 0x0112
+
+
+def truncated(name):
+    """
+    JPEG с целым заголовком, но без половины данных
+    """
+    content = upload(name, 'JPEG').read()
+    return SimpleUploadedFile(name, content[:len(content) // 2])
+
+
+def upload(name, image_format, size=(400, 200), exif=None):
+    content = BytesIO()
+    image = Image.new('RGB', size, color=(200, 0, 0))
+    options = {'exif': exif} if exif else {}
+    image.save(content, image_format, **options)
+    return SimpleUploadedFile(name, content.getvalue())
+
+
+@override_settings(IMAGE_MAX_SIZE=100)
+class NormalizeImageTests(SimpleTestCase):
+    def open(self, uploaded):
+        image = Image.open(uploaded)
+        image.load()
+        return image
+
+    def test_photo_is_resized_reencoded_and_stripped(self):
+        exif = Image.Exif()
+        exif[ORIENTATION] = 6
+        exif[0x010F] = 'Camera'
+
+        normalized = normalize_image(
+            upload('photo.jpeg', 'JPEG', exif=exif.tobytes()))
+        image = self.open(normalized)
+
+        self.assertEqual(normalized.name, 'photo.jpg')
+        self.assertEqual(image.format, 'JPEG')
+        # поворот на 90 градусов применен, а затем размер ограничен
+        self.assertEqual(image.size, (50, 100))
+        self.assertFalse(image.getexif())
+
+    def test_png_keeps_name_and_format(self):
+        normalized = normalize_image(upload('picture.png', 'PNG'))
+        image = self.open(normalized)
+
+        self.assertEqual(normalized.name, 'picture.png')
+        self.assertEqual(image.format, 'PNG')
+        self.assertEqual(image.size, (100, 50))
+
+    def test_temporary_upload_is_rewritten_in_place(self):
+        uploaded = TemporaryUploadedFile('photo.jpg', 'image/jpeg', 0, None)
+        uploaded.write(upload('photo.jpg', 'JPEG').read())
+
+        normalized = normalize_image(uploaded)
+
+        self.assertIs(normalized, uploaded)
+        self.assertEqual(os.path.getsize(
+            normalized.temporary_file_path()), normalized.size)
+        self.assertEqual(self.open(normalized).size, (100, 50))
+        normalized.close()
+
+    def test_truncated_photo_is_invalid(self):
+        with self.assertRaises(ValidationError) as context:
+            normalize_image(truncated('photo.jpg'))
+        self.assertEqual(context.exception.code, 'invalid_image')
+
+
+class TruncatedUploadTests(TestCase):
+    def test_truncated_photo_is_form_error(self):
+        form = PostForm(
+            data={'text': 'Пост'}, files={'image': truncated('photo.jpg')})
+
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
@@ -0,0 +1,111 @@
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Post
+
+User = get_user_model()
+
+
+class AnonymousPageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='vika')
+        cls.post = Post.objects.create(text='Текст поста', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_page_is_served_from_cache(self):
+        self.client.get(reverse('index'))
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('index'))
+
+        self.assertContains(response, AnonymousPageCacheTests.post.text)
+
+    def test_cached_page_is_invalidated_by_new_post(self):
+        self.client.get(reverse('index'))
+        Post.objects.create(text='Свежий пост', author=self.user)
+
+        response = self.client.get(reverse('index'))
+
+        self.assertContains(response, 'Свежий пост')
+
+    def test_conditional_get(self):
+        url = reverse(
+            'post',
+            kwargs={
+                'username': AnonymousPageCacheTests.user.username,
+                'post_id': AnonymousPageCacheTests.post.id})
+        response = self.client.get(url)
+
+        self.assertIn('ETag', response)
+        self.assertEqual(
+            self.client.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag']).status_code,
+            HTTPStatus.NOT_MODIFIED)
+
+    def test_edit_changes_etag(self):
+        post = Post.objects.create(text='До правки', author=self.user)
+        url = reverse('post', args=[self.user.username, post.id])
+        etag = self.client.get(url)['ETag']
+        post.text = 'После правки'
+        post.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(response, 'После правки')
+
+    def test_if_modified_since_alone_is_ignored(self):
+        response = self.client.get(
+            reverse('index'),
+            HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_cached_pages_are_invalidated_by_rename(self):
+        author = User.objects.create_user(username='oldname')
+        Post.objects.create(text='Пост', author=author)
+        self.client.get(reverse('index'))
+        self.client.get(reverse('profile', args=['oldname']))
+
+        author.username = 'newname'
+        author.save()
+
+        self.assertContains(self.client.get(reverse('index')), '@newname')
+        self.assertEqual(
+            self.client.get(
+                reverse('profile', args=['oldname'])).status_code,
+            HTTPStatus.NOT_FOUND)
+
+    def test_cached_profile_is_invalidated_by_user_delete(self):
+        user = User.objects.create_user(username='zhanna', first_name='Жанна')
+        url = reverse('profile', args=[user.username])
+        self.assertContains(self.client.get(url), 'Жанна')
+
+        user.delete()
+        User.objects.create_user(username='zhanna', first_name='Другая')
+
+        response = self.client.get(url)
+        self.assertNotContains(response, 'Жанна')
+        self.assertContains(response, 'Другая')
+
+    def test_anonymous_page_sets_no_cookies(self):
+        response = self.client.get(reverse('index'))
+
+        self.assertFalse(response.cookies)
+
+    def test_authorized_user_is_not_served_from_cache(self):
+        self.client.get(reverse('index'))
+        self.client.force_login(AnonymousPageCacheTests.user)
+
+        response = self.client.get(reverse('index'))
+
+        self.assertNotIn('ETag', response)
+        self.assertContains(response, AnonymousPageCacheTests.user.username)
@@ -0,0 +1,126 @@
+import tempfile
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='vika')
+        cls.group = Group.objects.create(
+            title='Путешествия', slug='travel', description='Про поездки')
+
+    def search(self, query, **params):
+        response = self.client.get(
+            reverse('search_results'), {'q': query, **params})
+        return response.context['page']
+
+    def test_empty_query(self):
+        Post.objects.create(text='Пост', author=SearchTests.user)
+
+        self.assertEqual(list(self.search('')), [])
+
+    @skipUnless(connection.vendor == 'postgresql', 'нужен PostgreSQL')
+    def test_search_by_text_author_and_group(self):
+        post = Post.objects.create(
+            text='Поездка в горы', author=SearchTests.user,
+            group=SearchTests.group)
+
+        self.assertEqual(list(self.search('горы')), [post])
+        self.assertEqual(list(self.search('vika')), [post])
+        self.assertEqual(list(self.search('путешествия')), [post])
+
+    @skipUnless(connection.vendor == 'postgresql', 'нужен PostgreSQL')
+    def test_vector_follows_group_changes(self):
+        post = Post.objects.create(
+            text='Пост', author=SearchTests.user, group=SearchTests.group)
+
+        SearchTests.group.title = 'Кулинария'
+        SearchTests.group.save()
+
+        self.assertEqual(list(self.search('кулинария')), [post])
+
+    @skipUnless(connection.vendor == 'postgresql', 'нужен PostgreSQL')
+    def test_results_are_ranked_and_paginated(self):
+        for i in range(12):
+            Post.objects.create(
+                text=f'Заметка {i}', author=SearchTests.user)
+        best = Post.objects.create(
+            text='Заметка про заметки', author=SearchTests.user)
+
+        page = self.search('заметка')
+        self.assertEqual(page[0], best)
+        self.assertEqual(len(page), 10)
+
+        page = self.search('заметка', after=page.paginator.next_cursor)
+        self.assertEqual(len(page), 3)
+
+
+class InvertedIndexSearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.index_dir = tempfile.TemporaryDirectory()
+        cls.settings = override_settings(
+            SEARCH_BACKEND='posts.search.inverted.InvertedIndexBackend',
+            SEARCH_INDEX_DIR=cls.index_dir.name)
+        cls.settings.enable()
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='vika')
+        cls.group = Group.objects.create(
+            title='Путешествия', slug='travel', description='Про поездки')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.settings.disable()
+        cls.index_dir.cleanup()
+
+    def search(self, query, **params):
+        response = self.client.get(
+            reverse('search_results'), {'q': query, **params})
+        return list(response.context['page'])
+
+    def test_search_by_text_author_and_group(self):
+        post = Post.objects.create(
+            text='Поездки в горы', author=self.user, group=self.group)
+
+        self.assertEqual(self.search('поездка горная'), [])
+        self.assertEqual(self.search('поездка в горы'), [post])
+        self.assertEqual(self.search('vika'), [post])
+        self.assertEqual(self.search('путешествие'), [post])
+
+    def test_index_follows_changes(self):
+        post = Post.objects.create(text='Пост про море', author=self.user)
+
+        post.text = 'Пост про горы'
+        post.save()
+        self.assertEqual(self.search('море'), [])
+        self.assertEqual(self.search('горы'), [post])
+
+        post.delete()
+        self.assertEqual(self.search('горы'), [])
+
+    def test_results_are_ranked_and_paginated(self):
+        for i in range(12):
+            Post.objects.create(
+                text=f'Заметка номер {i} и еще немного текста',
+                author=self.user)
+        best = Post.objects.create(text='Заметка', author=self.user)
+
+        response = self.client.get(reverse('search_results'), {'q': 'заметки'})
+        page = response.context['page']
+        self.assertEqual(page[0], best)
+        self.assertEqual(len(page), 10)
+
+        next_page = self.search('заметки', after=page.paginator.next_cursor)
+        self.assertEqual(len(next_page), 3)
+        self.assertFalse(set(next_page) & set(page))
@@ -0,0 +1,90 @@
+import os
+import tempfile
+
+from django.test import SimpleTestCase
+
+from posts.search.analysis import analyze
+from posts.search.index import SearchIndex
+
+
+class AnalysisTests(SimpleTestCase):
+    def test_russian_and_english_stemming(self):
+        self.assertEqual(
+            analyze('Горы, горам и ГОРАХ'), ['гор', 'гор', 'гор'])
+        self.assertEqual(
+            analyze('running cities posts'), ['run', 'city', 'post'])
+
+    def test_stop_words_and_yo(self):
+        self.assertEqual(analyze('Ёлка в лесу'), analyze('елка лес'))
+
+
+class SearchIndexTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.index = SearchIndex(self.directory)
+
+    def ids(self, text, index=None):
+        return [doc_id for _, doc_id in (index or self.index).search(text)]
+
+    def test_bm25_prefers_denser_documents(self):
+        self.index.add([
+            (1, 'кот и собака гуляли по двору весь день'),
+            (2, 'кот'),
+        ])
+
+        self.assertEqual(self.ids('кот'), [1, 2])
+
+    def test_journal_is_shared_between_processes(self):
+        self.index.add([(1, 'горы')])
+
+        self.assertEqual(self.ids('горы', SearchIndex(self.directory)), [1])
+
+    def test_flushed_segments_hide_old_versions(self):
+        self.index.add([(1, 'горы'), (2, 'горы и море')])
+        self.index.flush()
+        self.index.add([(1, 'море')])
+        self.index.flush()
+        self.index.remove([2])
+
+        self.assertEqual(self.ids('горы'), [])
+        self.assertEqual(self.ids('море'), [1])
+
+    def test_segments_are_merged(self):
+        self.index.max_segments = 2
+        for doc_id in range(5):
+            self.index.add([(doc_id, 'текст')])
+            self.index.flush()
+
+        self.assertEqual(sorted(self.ids('текст')), list(range(5)))
+        segments = [
+            name for name in os.listdir(self.directory)
+            if name.endswith('.seg')]
+        self.assertLessEqual(len(segments), 2)
+
+    def test_rebuild(self):
+        self.index.add([(1, 'старый текст')])
+        self.index.rebuild_chunk = 2
+        self.index.rebuild(
+            (doc_id, f'новый текст {doc_id}') for doc_id in range(5))
+
+        self.assertEqual(sorted(self.ids('новый')), list(range(5)))
+
+    def test_flush_during_rebuild_keeps_new_records(self):
+        self.index.add([(1, 'старый текст')])
+
+        def documents():
+            yield 1, 'новый текст'
+            # другой процесс пишет и сбрасывает журнал посреди перестройки
+            other = SearchIndex(self.directory)
+            other.add([(2, 'свежий текст')])
+            other.flush()
+            yield 2, 'прочитанный до правки текст'
+
+        self.index.rebuild(documents())
+
+        self.assertEqual(self.ids('свежий'), [2])
+        self.assertEqual(self.ids('новый'), [1])
+        self.assertEqual(
+            self.ids('текст', SearchIndex(self.directory)), [1, 2])
@@ -0,0 +1,132 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import (RequestFactory, TestCase, TransactionTestCase,
+                         override_settings)
+from PIL import Image
+
+from posts.models import Post, StoredFile
+from posts.views import serve_media
+
+User = get_user_model()
+
+
+def uploaded(color='white'):
+    buffer = BytesIO()
+    Image.new('RGB', (2, 1), color).save(buffer, 'GIF')
+    return SimpleUploadedFile(
+        name='small.gif', content=buffer.getvalue(),
+        content_type='image/gif')
+
+
+class MediaRootMixin:
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = override_settings(
+            THUMBNAIL_WORKERS=0,
+            MEDIA_ROOT=tempfile.mkdtemp())
+        cls.media_root.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        cls.media_root.disable()
+
+
+class ContentAddressedStorageTests(MediaRootMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='vika')
+
+    def test_same_content_is_stored_once(self):
+        first = Post.objects.create(
+            text='Первый', author=self.user, image=uploaded())
+        second = Post.objects.create(
+            text='Второй', author=self.user, image=uploaded())
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(
+            StoredFile.objects.get(name=first.image.name).ref_count, 2)
+        self.assertEqual(
+            os.listdir(os.path.dirname(first.image.path)),
+            [os.path.basename(first.image.name)])
+
+    def test_replaced_image_is_released(self):
+        post = Post.objects.create(
+            text='Пост', author=self.user, image=uploaded())
+        previous = post.image.name
+
+        post.image = uploaded('black')
+        post.save()
+
+        self.assertNotEqual(post.image.name, previous)
+        self.assertFalse(StoredFile.objects.filter(name=previous).exists())
+        self.assertEqual(
+            StoredFile.objects.get(name=post.image.name).ref_count, 1)
+
+    def test_same_image_uploaded_again(self):
+        post = Post.objects.create(
+            text='Пост', author=self.user, image=uploaded())
+
+        post.image = uploaded()
+        post.save()
+
+        self.assertEqual(
+            StoredFile.objects.get(name=post.image.name).ref_count, 1)
+
+    def test_media_is_served_immutable(self):
+        name = default_storage.save('posts/small.gif', uploaded())
+
+        response = serve_media(
+            RequestFactory().get(f'/media/{name}'), name,
+            document_root=settings.MEDIA_ROOT)
+
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+
+    def test_other_media_is_not_immutable(self):
+        # файл не из хранилища, как аватарка по умолчанию
+        path = os.path.join(settings.MEDIA_ROOT, 'avatar.gif')
+        with open(path, 'wb') as file_:
+            file_.write(uploaded().read())
+
+        response = serve_media(
+            RequestFactory().get('/media/avatar.gif'), 'avatar.gif',
+            document_root=settings.MEDIA_ROOT)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('immutable', response.get('Cache-Control', ''))
+
+
+class StoredFileDeletionTests(MediaRootMixin, TransactionTestCase):
+    def test_file_is_deleted_with_last_reference(self):
+        user = User.objects.create_user(username='vika')
+        first = Post.objects.create(
+            text='Первый', author=user, image=uploaded())
+        second = Post.objects.create(
+            text='Второй', author=user, image=uploaded())
+        path = first.image.path
+
+        first.delete()
+        self.assertTrue(os.path.exists(path))
+
+        second.delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(StoredFile.objects.exists())
+
+    def test_unmanaged_file_is_kept(self):
+        user = User.objects.create_user(username='vika')
+        photo = user.profile.photo.name
+
+        user.delete()
+
+        self.assertEqual(photo, 'users/avatar180.jpg')
+        self.assertFalse(StoredFile.objects.exists())
@@ -0,0 +1,81 @@
+from io import StringIO
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Follow, Suggestion
+from posts.suggestions import FollowGraph
+
+User = get_user_model()
+
+
+class FollowGraphTests(TestCase):
+    def suggestions(self, graph, limit=10):
+        return [
+            pair for users, authors, scores in graph.suggestions(limit)
+            for pair in zip(users.tolist(), authors.tolist(), scores.tolist())]
+
+    def test_friends_of_friends_and_cofollows(self):
+        # 1 читает 2; 2 читает 3 и 4; 5 читает 2 и 6
+        graph = FollowGraph(
+            np.array([1, 2, 2, 5, 5]), np.array([2, 3, 4, 2, 6]))
+
+        self.assertEqual(self.suggestions(graph), [
+            (1, 3, 1.0), (1, 4, 1.0), (1, 6, 0.25),
+            (5, 3, 1.0), (5, 4, 1.0)])
+
+    def test_followed_authors_are_not_suggested(self):
+        graph = FollowGraph(np.array([1, 1, 2]), np.array([2, 3, 3]))
+
+        self.assertEqual(self.suggestions(graph), [])
+
+    def test_limit(self):
+        graph = FollowGraph(
+            np.array([1, 2, 2, 2]), np.array([2, 3, 4, 5]))
+
+        self.assertEqual(len(self.suggestions(graph, limit=2)), 2)
+
+    def test_empty_graph(self):
+        graph = FollowGraph(
+            np.array([], dtype=np.int64), np.array([], dtype=np.int64))
+
+        self.assertEqual(self.suggestions(graph), [])
+
+
+class SuggestionsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='vika')
+        cls.friend = User.objects.create_user(username='victor')
+        cls.author = User.objects.create_user(username='zhanna')
+        Follow.objects.create(user=cls.user, author=cls.friend)
+        Follow.objects.create(user=cls.friend, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        call_command('compute_suggestions', stdout=StringIO())
+        self.client.force_login(self.user)
+
+    def test_command_fills_table(self):
+        self.assertEqual(
+            list(Suggestion.objects.values_list('user', 'author')),
+            [(self.user.id, self.author.id)])
+
+    def test_suggestions_are_shown(self):
+        for url in (reverse('follow_index'),
+                    reverse('profile', args=(self.friend.username,))):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(
+                    response.context['suggestions'], [self.author])
+
+    def test_followed_after_computation_are_hidden(self):
+        Follow.objects.create(user=self.user, author=self.author)
+
+        response = self.client.get(reverse('follow_index'))
+
+        self.assertEqual(response.context['suggestions'], [])
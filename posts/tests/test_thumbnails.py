@@ -0,0 +1,134 @@
+import os
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TransactionTestCase
+from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from posts import thumbnails
+from posts.models import Post
+from posts.thumbnails import rendition, renditions, thumbnail_file
+
+from .test_storage import MediaRootMixin
+
+User = get_user_model()
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B')
+
+
+class ThumbnailsTests(MediaRootMixin, TransactionTestCase):
+    """
+    Превью создаются после коммита, поэтому без общей транзакции теста
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(username='vika')
+
+    def uploaded(self):
+        return SimpleUploadedFile(
+            name='small.gif', content=SMALL_GIF, content_type='image/gif')
+
+    def missing_thumbnails(self, file_):
+        source = ImageFile(file_)
+        return [
+            (width, image_format)
+            for width, image_format in renditions('post')
+            if not thumbnail_file(
+                source, *rendition('post', width, image_format)).exists()]
+
+    def test_thumbnails_are_generated_on_save(self):
+        post = Post.objects.create(
+            text='Пост с картинкой', author=self.user, image=self.uploaded())
+
+        self.assertEqual(self.missing_thumbnails(post.image), [])
+
+    def test_thumbnails_wait_for_commit(self):
+        with mock.patch('posts.thumbnails.schedule') as schedule:
+            with transaction.atomic():
+                post = Post.objects.create(
+                    text='Пост', author=self.user, image=self.uploaded())
+                schedule.assert_not_called()
+            schedule.assert_called_once_with(post.image.name, ('post',))
+
+            post.text = 'Правка без новой картинки'
+            post.save()
+            schedule.assert_called_once()
+
+    def test_thumbnail_is_overwritten_not_copied(self):
+        name = default.storage.save('cache/test/thumb.jpg', ContentFile(b'1'))
+        self.assertEqual(
+            default.storage.save(name, ContentFile(b'2')), name)
+
+        self.assertEqual(
+            os.listdir(os.path.dirname(default.storage.path(name))),
+            ['thumb.jpg'])
+        with default.storage.open(name) as file_:
+            self.assertEqual(file_.read(), b'2')
+
+    def test_srcset(self):
+        post = Post.objects.create(
+            text='Пост с картинкой', author=self.user, image=self.uploaded())
+
+        response = self.client.get(
+            reverse('post', args=(self.user.username, post.id)))
+
+        self.assertContains(response, '480w')
+        self.assertContains(response, '.webp 1440w')
+
+    def test_page_thumbnails_are_fetched_at_once(self):
+        for number in range(3):
+            Post.objects.create(
+                text=f'Пост {number}', author=self.user,
+                image=self.uploaded())
+        self.client.force_login(self.user)
+
+        with mock.patch.object(
+                default.kvstore, '_get_raw',
+                wraps=default.kvstore._get_raw) as get_raw:
+            response = self.client.get(reverse('index'))
+
+        self.assertContains(response, '.webp 1440w', count=3)
+        self.assertEqual(get_raw.call_count, 0)
+
+    def test_post_page_prefetches_once_on_fragment_miss(self):
+        post = Post.objects.create(
+            text='Пост', author=self.user, image=self.uploaded())
+        url = reverse('post', args=(self.user.username, post.id))
+        self.client.force_login(self.user)
+
+        with mock.patch(
+                'posts.thumbnails.get_many_raw',
+                wraps=thumbnails.get_many_raw) as get_many_raw:
+            self.client.get(url)
+            self.assertEqual(get_many_raw.call_count, 1)
+            self.client.get(url)
+            self.assertEqual(get_many_raw.call_count, 1)
+
+    def test_backfill_command(self):
+        post = Post.objects.create(text='Пост', author=self.user)
+        # картинка, которой еще не было: превью для нее не созданы
+        buffer = BytesIO()
+        Image.new('RGB', (3, 1), 'red').save(buffer, 'GIF')
+        image = default_storage.save(
+            'posts/red.gif', ContentFile(buffer.getvalue()))
+        Post.objects.filter(pk=post.pk).update(image=image)
+        post.refresh_from_db()
+        self.assertNotEqual(self.missing_thumbnails(post.image), [])
+
+        call_command('generate_thumbnails', workers=2, stdout=StringIO())
+
+        self.assertEqual(self.missing_thumbnails(post.image), [])
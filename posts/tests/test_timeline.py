@@ -0,0 +1,109 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Follow, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='vika')
+        cls.author = User.objects.create_user(username='victor')
+
+    def setUp(self):
+        self.client.force_login(TimelineTests.reader)
+
+    def feed(self):
+        response = self.client.get(reverse('follow_index'))
+        return [post.text for post in response.context['page']]
+
+    def test_new_post_fans_out_to_followers(self):
+        Follow.objects.create(
+            user=TimelineTests.reader, author=TimelineTests.author)
+        post = Post.objects.create(
+            text='Пост для подписчиков', author=TimelineTests.author)
+
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=TimelineTests.reader, post=post).exists())
+        self.assertEqual(self.feed(), [post.text])
+
+    def test_follow_and_unfollow_update_timeline(self):
+        Post.objects.create(text='Старый пост', author=TimelineTests.author)
+
+        follow = Follow.objects.create(
+            user=TimelineTests.reader, author=TimelineTests.author)
+        self.assertEqual(self.feed(), ['Старый пост'])
+
+        follow.delete()
+        self.assertEqual(self.feed(), [])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_popular_author_is_pulled_on_read(self):
+        Follow.objects.create(
+            user=TimelineTests.reader, author=TimelineTests.author)
+        Post.objects.create(text='Пост популярного автора',
+                            author=TimelineTests.author)
+
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed(), ['Пост популярного автора'])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_author_dropping_to_limit_is_backfilled(self):
+        other = User.objects.create_user(username='zhanna')
+        Follow.objects.create(
+            user=TimelineTests.reader, author=TimelineTests.author)
+        follow = Follow.objects.create(
+            user=other, author=TimelineTests.author)
+        post = Post.objects.create(
+            text='Пост популярного автора', author=TimelineTests.author)
+
+        follow.delete()
+
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=TimelineTests.reader, post=post).exists())
+        self.assertEqual(self.feed(), ['Пост популярного автора'])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_author_crossing_limit_is_pulled(self):
+        Follow.objects.create(
+            user=TimelineTests.reader, author=TimelineTests.author)
+        Post.objects.create(text='Пост', author=TimelineTests.author)
+
+        Follow.objects.create(
+            user=User.objects.create_user(username='zhanna'),
+            author=TimelineTests.author)
+
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed(), ['Пост'])
+
+    def test_feed_pages_merge_in_order(self):
+        Follow.objects.create(
+            user=TimelineTests.reader, author=TimelineTests.author)
+        for i in range(12):
+            Post.objects.create(text=f'Пост {i}', author=TimelineTests.author)
+
+        response = self.client.get(reverse('follow_index'))
+        after = response.context['page'].paginator.next_cursor
+        response = self.client.get(reverse('follow_index'), {'after': after})
+
+        self.assertEqual(
+            [post.text for post in response.context['page']],
+            ['Пост 1', 'Пост 0'])
+
+    def test_rebuild_command(self):
+        Follow.objects.create(
+            user=TimelineTests.reader, author=TimelineTests.author)
+        post = Post.objects.create(text='Пост', author=TimelineTests.author)
+        TimelineEntry.objects.all().delete()
+
+        call_command('rebuild_timeline', 'vika', stdout=StringIO())
+
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=TimelineTests.reader, post=post).exists())
@@ -0,0 +1,79 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import trending
+from posts.models import (Comment, Group, GroupActivity, Post, PostActivity,
+                          TrendingGroup, TrendingPost)
+
+User = get_user_model()
+
+
+@override_settings(TRENDING_HALF_LIFE=6, TRENDING_WINDOW=48)
+class TrendingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='vika')
+        cls.group = Group.objects.create(
+            title='Путешествия', slug='travel', description='Куда поехать')
+        cls.post = Post.objects.create(
+            text='Пост в сообществе', author=cls.user, group=cls.group)
+        cls.other = Post.objects.create(text='Другой пост', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_activity_is_counted_on_write(self):
+        Comment.objects.create(post=self.post, author=self.user, text='Да')
+        Comment.objects.create(post=self.post, author=self.user, text='Нет')
+
+        activity = GroupActivity.objects.get(group=self.group)
+        self.assertEqual((activity.posts, activity.comments), (1, 2))
+        self.assertEqual(
+            PostActivity.objects.get(post=self.post).comments, 2)
+        self.assertEqual(activity.hour, trending.current_hour())
+
+    def test_old_activity_decays(self):
+        now = trending.current_hour() + timedelta(minutes=30)
+        PostActivity.objects.create(
+            post=self.post, hour=now - timedelta(hours=12, minutes=30),
+            comments=10)
+        PostActivity.objects.create(
+            post=self.other, hour=trending.current_hour(now), comments=3)
+
+        trending.refresh(now)
+
+        scores = dict(TrendingPost.objects.values_list('post', 'score'))
+        self.assertAlmostEqual(
+            scores[self.post.id], 10 * 0.5 ** (12.5 / 6), places=6)
+        self.assertGreater(scores[self.other.id], scores[self.post.id])
+
+    def test_activity_outside_window_is_dropped(self):
+        PostActivity.objects.create(
+            post=self.post, hour=timezone.now() - timedelta(days=3),
+            comments=10)
+
+        call_command('refresh_trending', stdout=StringIO())
+
+        self.assertFalse(PostActivity.objects.exists())
+        self.assertFalse(TrendingPost.objects.exists())
+        self.assertTrue(TrendingGroup.objects.filter(
+            group=self.group).exists())
+
+    def test_trending_page(self):
+        Comment.objects.create(post=self.other, author=self.user, text='Да')
+        Comment.objects.create(post=self.other, author=self.user, text='Ну')
+        Comment.objects.create(post=self.post, author=self.user, text='Да')
+        trending.refresh()
+
+        response = self.client.get(reverse('trending'))
+
+        self.assertEqual(
+            response.context['posts'], [self.other, self.post])
+        self.assertContains(response, self.group.title)
@@ -6,10 +6,16 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.db import connection, transaction
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from posts.models import Comment, Follow, Group, Post
+from posts import follows
+from posts.cache_tags import get_versions, invalidate
+from posts.models import Comment, Follow, Group, Post, Profile
+from posts.paginator import COMMENTS_PER_PAGE
 from yatube.settings import BASE_DIR
 
 User = get_user_model()
@@ -44,6 +50,8 @@ class PostsPagesTests(TestCase):
             'posts/new_post.html': reverse('new_post')}
 
     def setUp(self):
+        # страницы прошлых тестов по тем же адресам остались в кэше
+        cache.clear()
         self.client_auth = Client()
         self.client_auth.force_login(PostsPagesTests.user)
 
@@ -258,15 +266,32 @@ class PaginatorViewsTest(TestCase):
             reverse('index'),
             reverse('group_posts', kwargs={'slug': group.slug}))
 
-        pages_list = {ten_records: 1, three_records: 2}
+        for page in response_pages:
+            response = self.client.get(page)
+            first_page = response.context.get('page')
+            after = first_page.paginator.next_cursor
+            response = self.client.get(page, {'after': after})
+            second_page = response.context.get('page')
+            before = second_page.paginator.previous_cursor
+            response = self.client.get(page, {'before': before})
+            with self.subTest(page=page):
+                self.assertEqual(len(first_page.object_list), ten_records)
+                self.assertEqual(len(second_page.object_list), three_records)
+                self.assertFalse(second_page.has_next())
+                self.assertEqual(
+                    list(response.context.get('page').object_list),
+                    list(first_page.object_list))
+
+    def test_page_does_not_count_posts(self):
+        user = User.objects.create_user(username='vika')
+        Post.objects.bulk_create(
+            Post(text=f'Текст {i}', author=user) for i in range(15))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('index'))
 
-        for records, page_number in pages_list.items():
-            for page in response_pages:
-                response = self.client.get(page, {'page': page_number})
-                with self.subTest():
-                    self.assertEqual(
-                        len(response.context.get('page').object_list),
-                        int(records))
+        self.assertFalse(any(
+            'COUNT(' in query['sql'] for query in queries.captured_queries))
 
 
 class TestCache(TestCase):
@@ -304,7 +329,74 @@ class TestCache(TestCase):
             author=TestCache.user, text='проверка кэша 2')
 
         response = self.client.get(reverse('index'))
-        self.assertNotContains(response, post_two.text)
+        self.assertContains(response, post_two.text)
+
+    def test_cache_index_page_is_reused(self):
+        Post.objects.create(author=TestCache.user, text='проверка кэша')
+        self.client.get(reverse('index'))
+
+        Post.objects.update(text='изменено в обход сигналов')
+
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, 'проверка кэша')
+
+        invalidate('posts')
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, 'изменено в обход сигналов')
+
+    def test_cached_pages_are_invalidated_by_rename(self):
+        author = User.objects.create_user(username='oldname')
+        group = Group.objects.create(title='Группа', slug='rename-slug')
+        Post.objects.create(text='Пост', author=author, group=group)
+        self.client.force_login(TestCache.user)
+        urls = [reverse('index'), reverse('group_posts', args=[group.slug])]
+        for url in urls:
+            self.assertContains(self.client.get(url), '@oldname')
+
+        author.username = 'newname'
+        author.save()
+
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertNotContains(response, '@oldname')
+                self.assertContains(response, '@newname')
+
+    def test_cached_pages_are_invalidated_by_group_rename(self):
+        group = Group.objects.create(title='Старое название', slug='g-slug')
+        post = Post.objects.create(
+            text='Пост', author=TestCache.user, group=group)
+        urls = [
+            reverse('profile', args=[TestCache.user.username]),
+            reverse('post', args=[TestCache.user.username, post.id])]
+        for url in urls:
+            self.assertContains(self.client.get(url), 'Старое название')
+
+        group.title = 'Новое название'
+        group.save()
+
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertNotContains(response, 'Старое название')
+                self.assertContains(response, 'Новое название')
+
+    def test_cached_pages_are_invalidated_by_group_delete(self):
+        group = Group.objects.create(title='Удаляемая группа', slug='d-slug')
+        Post.objects.create(text='Пост', author=TestCache.user, group=group)
+        url = reverse('profile', args=[TestCache.user.username])
+        self.assertContains(self.client.get(url), 'Удаляемая группа')
+
+        group.delete()
+
+        self.assertNotContains(self.client.get(url), 'Удаляемая группа')
+
+    def test_login_does_not_invalidate_cache(self):
+        versions = get_versions(['posts'])
+
+        TestCache.user.save(update_fields=['last_login'])
+
+        self.assertEqual(get_versions(['posts']), versions)
 
 
 class TestFollow(TestCase):
@@ -337,6 +429,55 @@ class TestFollow(TestCase):
 
         self.assertEqual(Follow.objects.count(), 0)
 
+    def test_follow_is_idempotent(self):
+        url = reverse(
+            'profile_follow', kwargs={
+                'username': TestFollow.user_following.username})
+        self.client_auth.get(url)
+        self.client_auth.get(url)
+
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(Profile.objects.get(
+            user=TestFollow.user_following).following_count, 1)
+
+    def test_unfollow_not_followed_author(self):
+        response = self.client_auth.get(reverse(
+            'profile_unfollow', kwargs={
+                'username': TestFollow.user_following.username}))
+
+        self.assertRedirects(response, reverse(
+            'profile', args=(TestFollow.user_following.username,)))
+
+    def test_follow_batch(self):
+        author = User.objects.create_user(username='zhanna')
+        Follow.objects.create(
+            user=TestFollow.user_follower, author=TestFollow.user_following)
+
+        response = self.client_auth.post(reverse('follow_batch'), {
+            'follow[]': [author.username, 'nobody'],
+            'unfollow[]': [TestFollow.user_following.username]})
+
+        self.assertEqual(response.json(), {
+            'followed': [author.username],
+            'unfollowed': [TestFollow.user_following.username]})
+        self.assertEqual(
+            follows.followed_ids(User.objects.get(pk=self.user_follower.pk)),
+            {author.id})
+
+    def test_followed_ids_are_cached(self):
+        follower = TestFollow.user_follower
+        self.assertEqual(follows.followed_ids(follower), set())
+        user = User.objects.get(pk=follower.pk)
+        with self.assertNumQueries(0):
+            follows.followed_ids(user)
+
+        Follow.objects.create(
+            user=follower, author=TestFollow.user_following)
+
+        user = User.objects.get(pk=follower.pk)
+        self.assertEqual(
+            follows.followed_ids(user), {TestFollow.user_following.id})
+
     def test_follow_not_authorized_user(self):
         response = self.client.get(reverse(
             'profile_follow', kwargs={
@@ -364,6 +505,34 @@ class TestFollow(TestCase):
         self.assertNotContains(response, TestFollow.post.text)
 
 
+class InvalidationOnCommitTests(TransactionTestCase):
+    """
+    Параллельный запрос до коммита видит старые данные и может положить
+    их в кэш уже после сброса
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='vika')
+        self.author = User.objects.create_user(username='victor')
+
+    def test_followed_ids_are_reset_after_commit(self):
+        with transaction.atomic():
+            follows.follow(self.user, [self.author.id])
+            # так кэширует подписки параллельный запрос
+            cache.set(follows.FOLLOWS_PREFIX + str(self.user.id), frozenset())
+
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual(follows.followed_ids(user), {self.author.id})
+
+    def test_tags_are_invalidated_after_commit(self):
+        with transaction.atomic():
+            Post.objects.create(text='Пост', author=self.author)
+            versions = get_versions(['posts', f'author:{self.author.id}'])
+
+        self.assertNotEqual(
+            get_versions(['posts', f'author:{self.author.id}']), versions)
+
+
 class TestComment(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -403,3 +572,62 @@ class TestComment(TestCase):
             Comment.objects.filter(
                 text='Комментарий неавторизированного пользователя',
                 post_id=TestComment.post.id).exists())
+
+    def test_comments_are_paginated(self):
+        for n in range(COMMENTS_PER_PAGE + 5):
+            Comment.objects.create(
+                post=TestComment.post, author=TestComment.user,
+                text=f'Комментарий {n}')
+        url = reverse(
+            'post', args=[TestComment.user.username, TestComment.post.id])
+
+        response = self.client.get(url)
+        self.assertEqual(len(response.context['comments']), COMMENTS_PER_PAGE)
+        self.assertTrue(response.context['comments_page'].has_next())
+
+        response = self.client.get(url, {'page': 2})
+        self.assertEqual(len(response.context['comments']), 5)
+
+
+class FeedQueriesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='vika')
+        cls.author = User.objects.create_user(username='victor')
+        cls.group = Group.objects.create(
+            title='Название тестовой группы', slug='test-slug')
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+        cls.urls = (
+            reverse('index'),
+            reverse('group_posts', kwargs={'slug': cls.group.slug}),
+            reverse('profile', kwargs={'username': cls.author.username}),
+            reverse('follow_index'))
+
+    def setUp(self):
+        self.client.force_login(FeedQueriesTests.user)
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        return len(queries)
+
+    def create_posts(self, count):
+        for i in range(count):
+            post = Post.objects.create(
+                text=f'Текст {i}',
+                author=FeedQueriesTests.author,
+                group=FeedQueriesTests.group)
+            Comment.objects.create(
+                post=post, author=FeedQueriesTests.user, text='Комментарий')
+
+    def test_feed_query_count_does_not_depend_on_page_size(self):
+        self.create_posts(1)
+        one_post = {url: self.count_queries(url) for url in self.urls}
+
+        self.create_posts(9)
+        for url in FeedQueriesTests.urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), one_post[url])
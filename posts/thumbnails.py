@@ -0,0 +1,256 @@
+"""
+Превью картинок постов и аватарок. Шаблоны и фоновая генерация берут
+размеры из одного места - VARIANTS, поэтому превью, сделанные заранее,
+совпадают с теми, что запрашивает страница
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connections
+from sorl.thumbnail import default, delete, get_thumbnail
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import \
+    KVStore as CachedDbKVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+logger = logging.getLogger(__name__)
+
+# вариант -> геометрия и опции sorl-thumbnail
+VARIANTS = {
+    'post': ('960x339', {'crop': 'center', 'upscale': True}),
+    'avatar': ('180x180', {'crop': 'center', 'upscale': True}),
+}
+# ширины для srcset, среди них и ширина самого варианта: каждая
+# в исходном формате и в WebP
+WIDTHS = {
+    'post': (480, 960, 1440),
+    'avatar': (180, 360),
+}
+WEBP = 'WEBP'
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails')
+    return _executor
+
+
+def rendition(variant, width=None, image_format=None):
+    """
+    Геометрия и опции sorl-thumbnail; width меняет ширину варианта
+    с сохранением пропорций
+    """
+    geometry, options = VARIANTS[variant]
+    if width:
+        base_width, base_height = map(int, geometry.split('x'))
+        geometry = f'{width}x{round(base_height * width / base_width)}'
+    if image_format:
+        options = {**options, 'format': image_format}
+    return geometry, options
+
+
+def source_file(file_):
+    """
+    Имя из базы - файл хранилища медиа: у превью свое хранилище
+    (THUMBNAIL_STORAGE), и по имени sorl искал бы источник в нем
+    """
+    if isinstance(file_, str):
+        return ImageFile(file_, default_storage)
+    return file_
+
+
+def thumbnail(file_, variant, width=None, image_format=None):
+    geometry, options = rendition(variant, width, image_format)
+    return get_thumbnail(source_file(file_), geometry, **options)
+
+
+def delete_thumbnails(name):
+    """
+    Удаляем превью файла name и их записи в хранилище sorl,
+    сам файл не трогаем
+    """
+    delete(source_file(name), delete_file=False)
+
+
+def renditions(variant):
+    """
+    Все превью варианта: (ширина, формат) для thumbnail
+    """
+    for width in WIDTHS.get(variant, ()):
+        yield width, None
+        yield width, WEBP
+
+
+def srcset(file_, variant):
+    """
+    Превью по умолчанию и строки srcset для <picture>. Если превью
+    уже получены prefetch_thumbnails, хранилище sorl не трогаем
+    """
+    prefetched = getattr(file_, 'prefetched_thumbnails', {})
+    if variant in prefetched:
+        return prefetched[variant]
+    return build_srcset(variant, {
+        (width, image_format): thumbnail(file_, variant, width, image_format)
+        for width, image_format in renditions(variant)})
+
+
+def build_srcset(variant, images):
+    """
+    images - превью по парам (ширина, формат) из renditions
+    """
+    sources = {None: [], WEBP: []}
+    for width, image_format in renditions(variant):
+        image = images[width, image_format]
+        sources[image_format].append(f'{image.url} {width}w')
+    base_width = int(VARIANTS[variant][0].split('x')[0])
+    return {
+        'src': images[base_width, None],
+        'srcset': ', '.join(sources[None]),
+        'webp_srcset': ', '.join(sources[WEBP])}
+
+
+def thumbnail_file(source, geometry, options):
+    """
+    Файл превью, как его назовет sorl-thumbnail, без обращения
+    к хранилищу: опции дополняются так же, как в get_thumbnail
+    """
+    backend = default.backend
+    options = dict(options)
+    if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(thumbnail_settings, attr)
+        if value != getattr(default_settings, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return ImageFile(name, default.storage)
+
+
+def get_many_raw(keys):
+    """
+    Значения хранилища sorl по ключам: кэш одним get_many, остальное
+    одним запросом к базе
+    """
+    kvstore = default.kvstore
+    if not isinstance(kvstore, CachedDbKVStore):
+        return {key: kvstore._get_raw(key) for key in keys}
+    values = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        found = dict(KVStoreModel.objects.filter(
+            key__in=missing).values_list('key', 'value'))
+        kvstore.cache.set_many(
+            found, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(found)
+    # значения-заглушки sorl для отсутствующих ключей - не строки
+    return {
+        key: value for key, value in values.items()
+        if isinstance(value, str)}
+
+
+def prefetch_thumbnails(objects, field, variant, *more):
+    """
+    Превью поля field у всех objects страницы за одно обращение
+    к хранилищу sorl; more - еще тройки (objects, field, variant)
+    для того же обращения. Результат кладем в FieldFile, где его
+    находит тег thumbnail_srcset; недостающие превью создаются как
+    обычно
+    """
+    # FieldFile сравниваются по имени, а одна картинка может быть
+    # у нескольких объектов, поэтому список, а не словарь
+    wanted = []
+    groups = [(objects, field, variant)] + list(zip(*[iter(more)] * 3))
+    for objects, field, variant in groups:
+        for obj in objects:
+            file_ = getattr(obj, field)
+            if not file_:
+                continue
+            source = ImageFile(file_)
+            wanted.append((file_, variant, {
+                (width, image_format): thumbnail_file(
+                    source, *rendition(variant, width, image_format))
+                for width, image_format in renditions(variant)}))
+
+    values = get_many_raw(list({
+        add_prefix(image.key)
+        for _, _, images in wanted for image in images.values()}))
+    for file_, variant, images in wanted:
+        try:
+            resolved = {
+                (width, image_format): resolve_thumbnail(
+                    values.get(add_prefix(image.key)),
+                    file_, variant, width, image_format)
+                for (width, image_format), image in images.items()}
+        except Exception:
+            # картинку без превью оставляем тегу: он обработает
+            # ошибку так же, как без предзагрузки
+            if thumbnail_settings.THUMBNAIL_DEBUG:
+                raise
+            continue
+        file_.prefetched_thumbnails = {
+            **getattr(file_, 'prefetched_thumbnails', {}),
+            variant: build_srcset(variant, resolved)}
+
+
+def resolve_thumbnail(value, file_, variant, width, image_format):
+    """
+    Превью из найденного значения хранилища или, если его нет,
+    созданное обычным путем
+    """
+    if value:
+        return deserialize_image_file(value)
+    return thumbnail(file_, variant, width, image_format)
+
+
+def generate(name, variants):
+    """
+    Создаем превью файла name во всех вариантах; ошибка одной картинки
+    не должна останавливать остальные
+    """
+    generated = 0
+    for variant in variants:
+        for width, image_format in renditions(variant):
+            try:
+                thumbnail(name, variant, width, image_format)
+                generated += 1
+            except Exception:
+                logger.exception(
+                    'Не удалось создать превью %s (%s, %s, %s)',
+                    name, variant, width, image_format)
+    return generated
+
+
+def generate_in_worker(name, variants):
+    """
+    generate для пула потоков: у потока свои соединения с базой
+    (хранилище sorl), закрываем их после работы
+    """
+    try:
+        return generate(name, variants)
+    finally:
+        connections.close_all()
+
+
+def schedule(name, variants):
+    """
+    Ставим генерацию превью в пул, чтобы не задерживать запрос.
+    Без пула (THUMBNAIL_WORKERS = 0) генерируем сразу
+    """
+    if not name:
+        return None
+    if not settings.THUMBNAIL_WORKERS:
+        generate(name, variants)
+        return None
+    return get_executor().submit(generate_in_worker, name, variants)
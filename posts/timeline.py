@@ -0,0 +1,133 @@
+from django.conf import settings
+
+from .models import Follow, Post, Profile, TimelineEntry
+from .paginator import POSTS_PER_PAGE, CursorPaginator
+
+BATCH_SIZE = 1000
+
+
+def is_popular(author_id):
+    """
+    Посты популярных авторов не рассылаются по лентам подписчиков
+    """
+    return Profile.objects.filter(
+        user=author_id,
+        following_count__gt=settings.TIMELINE_FANOUT_LIMIT).exists()
+
+
+def popular_authors(user):
+    """
+    Популярные авторы, на которых подписан пользователь
+    """
+    return list(Profile.objects.filter(
+        user__following__user=user,
+        following_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).values_list('user_id', flat=True))
+
+
+def _insert(entries):
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) == BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out(post):
+    """
+    Рассылаем новый пост по лентам подписчиков автора
+    """
+    if is_popular(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author=post.author_id).values_list('user_id', flat=True)
+    _insert(
+        TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+        for user_id in followers.iterator())
+
+
+def _backfill(user_ids, author_id):
+    posts = list(Post.objects.filter(
+        author=author_id).values_list('id', 'pub_date'))
+    _insert(
+        TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for user_id in user_ids
+        for post_id, pub_date in posts)
+
+
+def backfill(user_id, author_id):
+    """
+    Добавляем в ленту все посты автора после подписки на него
+    """
+    if is_popular(author_id):
+        return
+    _backfill([user_id], author_id)
+
+
+def followers_changed(author_id, delta):
+    """
+    Число подписчиков автора изменилось на delta. Если он пересек
+    порог, его посты переходят из разосланных лент в подмешиваемые
+    при чтении или обратно: иначе посты, опубликованные, пока автор
+    был популярен, пропали бы из лент
+    """
+    count = Profile.objects.filter(user=author_id).values_list(
+        'following_count', flat=True).first()
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    if delta > 0 and count == limit + 1:
+        TimelineEntry.objects.filter(post__author=author_id).delete()
+    elif delta < 0 and count == limit:
+        followers = Follow.objects.filter(
+            author=author_id).values_list('user_id', flat=True)
+        _backfill(followers, author_id)
+
+
+def remove(user_id, author_id):
+    """
+    Убираем посты автора из ленты после отписки
+    """
+    TimelineEntry.objects.filter(
+        user=user_id, post__author=author_id).delete()
+
+
+def rebuild(user):
+    """
+    Пересобираем ленту пользователя с нуля
+    """
+    TimelineEntry.objects.filter(user=user).delete()
+    authors = Follow.objects.filter(user=user).values_list(
+        'author_id', flat=True)
+    for author_id in authors:
+        backfill(user.id, author_id)
+
+
+class TimelinePaginator(CursorPaginator):
+    """
+    Лента подписок: готовый срез из TimelineEntry, к которому при чтении
+    подмешиваются посты популярных авторов
+    """
+    def __init__(self, user, per_page=POSTS_PER_PAGE):
+        self.entries = TimelineEntry.objects.filter(
+            user=user).values_list('post_id', flat=True)
+        authors = popular_authors(user)
+        pulled = Post.objects.filter(author__in=authors)
+        self.pull = bool(authors)
+        super().__init__(pulled.for_feed(), per_page)
+
+    def fetch(self, key, reverse=False):
+        post_ids = list(self.slice(
+            self.entries, ('-pub_date', '-post_id'), key, reverse))
+        posts = {
+            post.id: post
+            for post in Post.objects.for_feed().filter(id__in=post_ids)}
+        if self.pull:
+            posts.update(
+                (post.id, post)
+                for post in super().fetch(key, reverse))
+        return sorted(
+            posts.values(),
+            key=lambda post: (post.pub_date, post.id),
+            reverse=not reverse)[:self.per_page + 1]
@@ -0,0 +1,109 @@
+"""
+Популярное. Каждый новый пост и комментарий прибавляет единицу
+к счетчику текущего часа своего поста и сообщества (PostActivity,
+GroupActivity) - одна запись в базу. Команда refresh_trending
+периодически складывает часы окна TRENDING_WINDOW с затуханием:
+вклад часа падает вдвое каждые TRENDING_HALF_LIFE часов. Лучшие
+TRENDING_SIZE постов и сообществ сохраняются готовым списком, его
+и читает страница /trending/
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .cache_tags import invalidate
+from .models import (Group, GroupActivity, Post, PostActivity, TrendingGroup,
+                     TrendingPost)
+
+# новый пост в сообществе весит как несколько комментариев
+POST_WEIGHT = 3
+COMMENT_WEIGHT = 1
+
+
+def current_hour(now=None):
+    return (now or timezone.now()).replace(minute=0, second=0, microsecond=0)
+
+
+def increment(model, lookup, **counters):
+    """
+    Прибавляем counters к строке текущего часа: UPDATE, а если строки
+    еще нет - INSERT. Одновременную вставку отсекает ограничение
+    уникальности, тогда снова UPDATE
+    """
+    lookup = {**lookup, 'hour': current_hour()}
+    changes = {field: F(field) + value for field, value in counters.items()}
+    with transaction.atomic():
+        if model.objects.filter(**lookup).update(**changes):
+            return
+        try:
+            with transaction.atomic():
+                model.objects.create(**lookup, **counters)
+        except IntegrityError:
+            model.objects.filter(**lookup).update(**changes)
+
+
+def record_post(post):
+    if post.group_id:
+        increment(GroupActivity, {'group_id': post.group_id}, posts=1)
+
+
+def record_comment(comment):
+    increment(PostActivity, {'post_id': comment.post_id}, comments=1)
+    group_id = comment.post.group_id
+    if group_id:
+        increment(GroupActivity, {'group_id': group_id}, comments=1)
+
+
+def top_scores(rows, now):
+    """
+    rows - (id, час, вес); лучшие TRENDING_SIZE пар (id, оценка)
+    """
+    scores = defaultdict(float)
+    for object_id, hour, weight in rows:
+        age = (now - hour).total_seconds() / 3600
+        scores[object_id] += weight * 0.5 ** (
+            age / settings.TRENDING_HALF_LIFE)
+    return sorted(
+        scores.items(), key=lambda item: (-item[1], -item[0]),
+    )[:settings.TRENDING_SIZE]
+
+
+def replace(model, field, target, scores):
+    """
+    Новый список вместо старого; удаленные после расчета объекты
+    пропускаем
+    """
+    existing = set(target.objects.filter(
+        pk__in=[object_id for object_id, _ in scores],
+    ).values_list('pk', flat=True))
+    model.objects.all().delete()
+    model.objects.bulk_create(
+        model(**{field: object_id, 'score': score})
+        for object_id, score in scores if object_id in existing)
+
+
+def refresh(now=None):
+    """
+    Пересчитываем списки популярного и удаляем часы за пределами окна
+    """
+    now = now or timezone.now()
+    since = current_hour(now) - timedelta(hours=settings.TRENDING_WINDOW)
+    with transaction.atomic():
+        PostActivity.objects.filter(hour__lt=since).delete()
+        GroupActivity.objects.filter(hour__lt=since).delete()
+        posts = top_scores(
+            PostActivity.objects.values_list('post_id', 'hour', 'comments'),
+            now)
+        groups = top_scores((
+            (group_id, hour, posts * POST_WEIGHT + comments * COMMENT_WEIGHT)
+            for group_id, hour, posts, comments in
+            GroupActivity.objects.values_list(
+                'group_id', 'hour', 'posts', 'comments')), now)
+        replace(TrendingPost, 'post_id', Post, posts)
+        replace(TrendingGroup, 'group_id', Group, groups)
+    invalidate('trending')
+    return len(posts), len(groups)
@@ -7,7 +7,9 @@ urlpatterns = [
     path('group/<slug:slug>/', views.group_posts, name='group_posts'),
     path('new/', views.new_post, name='new_post'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('follow/batch/', views.follow_batch, name='follow_batch'),
     path('search/', views.search_results, name='search_results'),
+    path('trending/', views.trending, name='trending'),
     path('edit_profile/', views.edit_profile, name='edit_profile'),
     path('<str:username>/', views.profile, name='profile'),
     path(
@@ -1,56 +1,79 @@
 from django.contrib.auth import authenticate, get_user_model, login
 from django.contrib.auth.decorators import login_required
-from django.contrib.postgres.search import SearchVector
 from django.core.paginator import Paginator
-from django.http import HttpResponseRedirect
+from django.http import HttpResponseRedirect, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import require_POST
+from django.views.static import serve
 
 from users.forms import ProfileEditForm, UserEditForm
 
+from . import follows
+from .cache_tags import tag_request
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, Profile
+from .models import Group, Post
+from .paginator import COMMENTS_PER_PAGE, POSTS_PER_PAGE, paginate
+from .search import get_backend
+from .storage import is_content_addressed
+from .thumbnails import prefetch_thumbnails
+from .timeline import TimelinePaginator
 
 User = get_user_model()
 
+# сколько авторов можно передать в follow_batch за раз
+FOLLOW_BATCH_LIMIT = 100
+# год - дольше кэшировать не принято
+MEDIA_MAX_AGE = 365 * 24 * 60 * 60
+
 
 def search_results(request):
-    query = request.GET.get('q')
-    search_list = Post.objects.annotate(
-        search=SearchVector(
-            'text',
-            'author',
-            'author__username',
-            'group__title',
-            'group__description')).filter(search=query)
+    query = request.GET.get('q', '')
+    paginator = get_backend().paginator(query, POSTS_PER_PAGE)
+    page = paginator.get_cursor_page(
+        after=request.GET.get('after'), before=request.GET.get('before'))
+    prefetch_thumbnails(page, 'image', 'post')
     return render(
         request, 'search_results.html', {
-            'page': search_list,
+            'page': page,
             'query': query})
 
 
 def index(request):
-    post_list = Post.objects.select_related('group', 'author').all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    cache_tags = tag_request(request, 'posts')
+    page = paginate(request, Post.objects.for_feed())
     return render(
         request, 'index.html', {
             'page': page,
-            'is_active': True})
+            'is_active': True,
+            'cache_tags': cache_tags})
 
 
 def group_posts(request, slug):
+    cache_tags = tag_request(request, f'group:{slug}')
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    page = paginate(request, group.posts.for_feed())
     return render(
         request, 'group.html', {
             'group': group,
             'page': page,
-            'is_active': True})
+            'is_active': True,
+            'cache_tags': cache_tags})
+
+
+def trending(request):
+    cache_tags = tag_request(request, 'trending', 'posts')
+    posts = list(
+        Post.objects.for_feed().filter(trending__isnull=False)
+        .order_by('-trending__score'))
+    groups = Group.objects.filter(
+        trending__isnull=False).order_by('-trending__score')
+    return render(
+        request, 'posts/trending.html', {
+            'posts': posts,
+            'groups': groups,
+            'cache_tags': cache_tags})
 
 
 @login_required
@@ -65,23 +88,33 @@ def new_post(request):
 
 
 def post_view(request, username, post_id):
-    post = get_object_or_404(Post, author__username=username, id=post_id)
-    photo = get_object_or_404(Profile, user=post.author)
+    tag_request(request, f'post:{post_id}')
+    post = get_object_or_404(
+        Post.objects.select_related('author__profile', 'group'),
+        author__username=username, id=post_id)
+    cache_tags = tag_request(request, f'author:{post.author_id}')
+    photo = post.author.profile
     form = CommentForm(instance=None)
-    comments = post.comments.all()
-    following = Follow.objects.filter(
-        user=request.user.id, author=post.author.id).all()
+    paginator = Paginator(
+        post.comments.select_related('author').order_by('-created', '-id'),
+        COMMENTS_PER_PAGE)
+    # число комментариев уже посчитано в посте, COUNT(*) не нужен
+    paginator.count = post.comment_count
+    comments_page = paginator.get_page(request.GET.get('page'))
+    following = post.author_id in follows.followed_ids(request.user)
     return render(
         request, 'posts/post.html', {
             'profile': post.author,
             'photo': photo,
             'post': post,
-            'count': post.author.posts.count(),
+            'count': photo.post_count,
             'form': form,
-            'comments': comments,
+            'comments': comments_page.object_list,
+            'comments_page': comments_page,
             'following': following,
-            'follower_count': post.author.follower.count(),
-            'following_count': post.author.following.count()})
+            'follower_count': photo.follower_count,
+            'following_count': photo.following_count,
+            'cache_tags': cache_tags})
 
 
 @login_required
@@ -125,24 +158,24 @@ def post_delete(request, username, post_id):
 
 
 def profile(request, username):
-    profile = get_object_or_404(User, username=username)
-    photo = get_object_or_404(Profile, user=profile)
-    posts = profile.posts.all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    following = Follow.objects.filter(
-        user=request.user.id, author=profile.id).all()
+    profile = get_object_or_404(
+        User.objects.select_related('profile'), username=username)
+    cache_tags = tag_request(request, f'author:{profile.id}')
+    photo = profile.profile
+    page = paginate(request, profile.posts.for_feed())
+    following = profile.id in follows.followed_ids(request.user)
     return render(
         request, 'posts/profile.html', {
             'photo': photo,
             'page': page,
-            'count': posts.count(),
+            'count': photo.post_count,
             'profile': profile,
             'is_active': True,
             'following': following,
-            'follower_count': profile.follower.count(),
-            'following_count': profile.following.count()})
+            'follower_count': photo.follower_count,
+            'following_count': photo.following_count,
+            'suggestions': follows.suggested_authors(request.user),
+            'cache_tags': cache_tags})
 
 
 @login_required
@@ -169,37 +202,76 @@ def edit_profile(request):
 
 @login_required
 def follow_index(request):
-    posts = Post.objects.select_related('author').filter(
-        author__following__user=request.user).all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    paginator = TimelinePaginator(request.user)
+    page = paginator.get_cursor_page(
+        after=request.GET.get('after'), before=request.GET.get('before'))
+    prefetch_thumbnails(page, 'image', 'post')
     return render(
         request,
         'posts/follow.html',
         {
             'paginator': paginator,
-            'page': page})
+            'page': page,
+            'suggestions': follows.suggested_authors(request.user)})
 
 
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    follow = author.following.filter(
-        author=author.id, user=request.user.id).exists()
-    if not follow and request.user != author:
-        Follow.objects.create(author=author, user=request.user)
+    follows.follow(request.user, [author.id])
     return redirect('profile', username=username)
 
 
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    follow = get_object_or_404(Follow, author=author.id, user=request.user.id)
-    follow.delete()
+    follows.unfollow(request.user, [author.id])
     return redirect('profile', username=username)
 
 
+@login_required
+@require_POST
+def follow_batch(request):
+    """
+    Подписка и отписка сразу на нескольких авторов: follow[] и
+    unfollow[] - их имена. В ответе те, на кого подписка изменилась
+    """
+    names = {
+        key: request.POST.getlist(f'{key}[]')
+        for key in ('follow', 'unfollow')}
+    if sum(map(len, names.values())) > FOLLOW_BATCH_LIMIT:
+        return JsonResponse(
+            {'error': f'Не больше {FOLLOW_BATCH_LIMIT} авторов за раз'},
+            status=400)
+    authors = dict(User.objects.filter(
+        username__in=names['follow'] + names['unfollow'],
+    ).values_list('username', 'id'))
+    usernames = {author_id: name for name, author_id in authors.items()}
+
+    def author_ids(key):
+        return [authors[name] for name in names[key] if name in authors]
+
+    followed = follows.follow(request.user, author_ids('follow'))
+    unfollowed = follows.unfollow(request.user, author_ids('unfollow'))
+    return JsonResponse({
+        'followed': [usernames[author_id] for author_id in followed],
+        'unfollowed': [usernames[author_id] for author_id in unfollowed]})
+
+
+def serve_media(request, path, document_root=None):
+    """
+    Медиафайлы для разработки. Файл, названный по хэшу содержимого,
+    по своему адресу не меняется: браузер может не перепроверять кэш.
+    Остальные (аватарка по умолчанию, старые загрузки, превью)
+    отдаем как есть, с проверкой по Last-Modified
+    """
+    response = serve(request, path, document_root=document_root)
+    if response.status_code == 200 and is_content_addressed(path):
+        patch_cache_control(
+            response, public=True, max_age=MEDIA_MAX_AGE, immutable=True)
+    return response
+
+
 def page_not_found(request, exception):
     return render(
         request,
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class PrivateMessagesConfig(AppConfig):
     name = 'private_messages'
+
+    def ready(self):
+        from . import signals  # noqa
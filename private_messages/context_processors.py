@@ -0,0 +1,14 @@
+from django.utils.functional import SimpleLazyObject
+
+from .models import Message
+
+
+def unread_messages(request):
+    """
+    Непрочитанные сообщения для значка в шапке; запрос к базе
+    выполняется, только если шаблон выводит значок
+    """
+    if not request.user.is_authenticated:
+        return {}
+    return {'unread_messages': SimpleLazyObject(
+        lambda: Message.objects.count_unread(request.user))}
@@ -0,0 +1,97 @@
+"""
+Оповещения о новых личных сообщениях для long-poll (wait_messages).
+У каждого пользователя есть номер версии, он меняется с каждым новым
+сообщением в его топиках. Запрос запоминает версию до проверки базы
+и ждет, пока она не изменится: сообщение, пришедшее между проверкой
+и ожиданием, не теряется.
+
+Бэкенд задает настройка PM_HUB_BACKEND. InProcessHub будит ожидающих
+внутри одного процесса (runserver, один воркер с потоками); FileHub -
+замена брокеру для нескольких процессов на одной машине
+"""
+import os
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+
+class InProcessHub:
+    def __init__(self):
+        self.versions = {}
+        self.condition = threading.Condition()
+
+    def version(self, user_id):
+        with self.condition:
+            return self.versions.get(user_id, 0)
+
+    def notify(self, user_ids):
+        with self.condition:
+            for user_id in user_ids:
+                self.versions[user_id] = self.versions.get(user_id, 0) + 1
+            self.condition.notify_all()
+
+    def wait(self, user_id, version, timeout):
+        """
+        Ждем, пока версия user_id не отличится от version; возвращает
+        новую версию, по таймауту - прежнюю
+        """
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.versions.get(user_id, 0) != version, timeout)
+            return self.versions.get(user_id, 0)
+
+
+class FileHub:
+    """
+    Версия - размер файла пользователя в PM_HUB_DIR: оповещение
+    дописывает в него байт (запись с O_APPEND атомарна), ожидающий
+    раз в POLL_INTERVAL смотрит размер через stat
+    """
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, location=None):
+        self.location = location or settings.PM_HUB_DIR
+        os.makedirs(self.location, exist_ok=True)
+
+    def path(self, user_id):
+        return os.path.join(self.location, str(user_id))
+
+    def version(self, user_id):
+        try:
+            return os.stat(self.path(user_id)).st_size
+        except FileNotFoundError:
+            return 0
+
+    def notify(self, user_ids):
+        for user_id in user_ids:
+            fd = os.open(
+                self.path(user_id), os.O_WRONLY | os.O_CREAT | os.O_APPEND)
+            try:
+                os.write(fd, b'.')
+            finally:
+                os.close(fd)
+
+    def wait(self, user_id, version, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            current = self.version(user_id)
+            remaining = deadline - time.monotonic()
+            if current != version or remaining <= 0:
+                return current
+            time.sleep(min(self.POLL_INTERVAL, remaining))
+
+
+@lru_cache(maxsize=None)
+def get_hub():
+    return import_string(settings.PM_HUB_BACKEND)()
+
+
+@receiver(setting_changed)
+def reset_hub(setting, **kwargs):
+    if setting.startswith('PM_HUB_'):
+        get_hub.cache_clear()
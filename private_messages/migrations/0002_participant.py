@@ -0,0 +1,51 @@
+# Generated by Django 2.2.6 on 2026-10-18 19:30
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_participants(apps, schema_editor):
+    """
+    Участники уже существующих топиков со счетчиками по сообщениям
+    """
+    Topic = apps.get_model('private_messages', 'Topic')
+    Message = apps.get_model('private_messages', 'Message')
+    Participant = apps.get_model('private_messages', 'Participant')
+    participants = []
+    for topic in Topic.objects.iterator():
+        messages = Message.objects.filter(topic=topic.pk)
+        last_id = messages.aggregate(last=models.Max('id'))['last']
+        for user_id in {topic.sender_id, topic.recipient_id}:
+            unread = messages.exclude(sender=user_id).filter(
+                read_at=None).count()
+            participants.append(Participant(
+                topic_id=topic.pk, user_id=user_id, unread_count=unread,
+                last_read_id=None if unread else last_id))
+    Participant.objects.bulk_create(participants, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('private_messages', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Participant',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unread_count', models.PositiveIntegerField(default=0, verbose_name='Непрочитанных')),
+                ('last_read_id', models.PositiveIntegerField(blank=True, null=True, verbose_name='Последнее прочитанное')),
+                ('topic', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='participants', to='private_messages.Topic')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pm_participants', to=settings.AUTH_USER_MODEL, verbose_name='Участник')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='participant',
+            constraint=models.UniqueConstraint(fields=('user', 'topic'), name='unique topic participant'),
+        ),
+        migrations.RunPython(create_participants, migrations.RunPython.noop),
+    ]
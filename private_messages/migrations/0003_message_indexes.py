@@ -0,0 +1,21 @@
+# Generated by Django 2.2.6 on 2026-10-18 20:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('private_messages', '0002_participant'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['topic', '-sent_at', '-id'], name='message_topic_sent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(condition=models.Q(read_at=None), fields=['topic', '-sent_at'], name='message_unread_idx'),
+        ),
+    ]
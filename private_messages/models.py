@@ -1,28 +1,69 @@
 from datetime import datetime
 
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
 
 User = get_user_model()
 
+# сколько сообщений удаляем одной транзакцией в TopicManager.delete_for
+DELETE_CHUNK = 10000
+
 
 class TopicManager(models.Manager):
     def by_user(self, user):
         """
-        Все топики выбранного пользователя
+        Все топики выбранного пользователя вместе с участниками, числом
+        непрочитанных сообщений (unread_count) и id автора последнего
+        непрочитанного (last_unread_sender) - для списка одним запросом
+        """
+        unread = Message.objects.filter(
+            topic=models.OuterRef('pk'), read_at=None).order_by('-sent_at')
+        return self.filter(
+            models.Q(sender=user) | models.Q(recipient=user),
+        ).select_related('sender', 'recipient').annotate(
+            unread_count=models.Count(
+                'topic_messages',
+                filter=models.Q(topic_messages__read_at=None)),
+            last_unread_sender=models.Subquery(unread.values('sender')[:1]))
+
+    def delete_for(self, user, topic_ids):
         """
-        return self.filter(models.Q(sender=user) | models.Q(recipient=user))
+        Удаляем топики из topic_ids, в которых участвует user, вместе
+        с сообщениями - число запросов не зависит от числа топиков.
+        Сообщения сверх DELETE_CHUNK удаляются порциями в отдельных
+        транзакциях, чтобы огромная история не держала блокировки
+        одним DELETE. Возвращает число удаленных топиков
+        """
+        ids = list(self.filter(
+            models.Q(sender=user) | models.Q(recipient=user),
+            pk__in=topic_ids,
+        ).values_list('pk', flat=True))
+        if not ids:
+            return 0
+        messages = Message.objects.filter(topic__in=ids).order_by()
+        while True:
+            with transaction.atomic():
+                chunk = list(messages.values_list(
+                    'pk', flat=True)[:DELETE_CHUNK + 1])
+                if len(chunk) <= DELETE_CHUNK:
+                    # остаток сообщений и участники удаляются каскадом
+                    # одним DELETE на таблицу
+                    self.filter(pk__in=ids).delete()
+                    return len(ids)
+                Message.objects.filter(pk__in=chunk[:DELETE_CHUNK]).delete()
 
 
 class MessageManager(models.Manager):
     def count_unread(self, user, topic=None):
         """
-        Количество непрочитанных сообщений
+        Количество непрочитанных сообщений: сумма счетчиков участника,
+        по индексу и без соединения с сообщениями
         """
-        qs = self.filter(models.Q(topic__recipient=user) | models.Q(topic__sender=user), read_at__exact=None).exclude(sender=user)
+        participants = Participant.objects.filter(user=user)
         if topic is not None:
-            qs = qs.filter(topic=topic)
-        return qs.count()
+            participants = participants.filter(topic=topic)
+        return participants.aggregate(
+            total=models.Sum('unread_count'))['total'] or 0
 
     def by_topic(self, topic):
         """
@@ -32,9 +73,20 @@ class MessageManager(models.Manager):
 
     def mark_read(self, user, topic):
         """
-        Помечаем сообщения как прочитанные
+        Помечаем сообщения как прочитанные. Строка участника
+        блокируется до конца транзакции: сообщение, которое придет
+        в это время, увеличит счетчик уже после сброса
         """
-        self.exclude(sender=user).filter(topic=topic, read_at__exact=None).update(read_at=datetime.now())
+        with transaction.atomic():
+            list(Participant.objects.select_for_update().filter(
+                topic=topic, user=user).values_list('pk', flat=True))
+            last_id = self.filter(topic=topic).aggregate(
+                last=models.Max('id'))['last']
+            self.exclude(sender=user).filter(
+                topic=topic, read_at__exact=None).update(
+                read_at=datetime.now())
+            Participant.objects.filter(topic=topic, user=user).update(
+                unread_count=0, last_read_id=last_id)
 
 
 class Topic(models.Model):
@@ -84,3 +136,38 @@ class Message(models.Model):
 
     class Meta:
         ordering = ['-sent_at']
+        indexes = [
+            # история топика в порядке пагинации
+            models.Index(
+                fields=['topic', '-sent_at', '-id'],
+                name='message_topic_sent_idx'),
+            # непрочитанные: последнее в списке топиков и mark_read
+            models.Index(
+                fields=['topic', '-sent_at'],
+                name='message_unread_idx',
+                condition=models.Q(read_at=None)),
+        ]
+
+
+class Participant(models.Model):
+    """
+    Состояние топика для одного из его участников: счетчик
+    непрочитанных и id последнего прочитанного сообщения. Счетчик
+    увеличивают сигналы при новом сообщении, сбрасывает mark_read
+    """
+    topic = models.ForeignKey(
+        Topic, related_name='participants', on_delete=models.CASCADE)
+    user = models.ForeignKey(
+        User,
+        verbose_name='Участник',
+        related_name='pm_participants',
+        on_delete=models.CASCADE)
+    unread_count = models.PositiveIntegerField('Непрочитанных', default=0)
+    # не внешний ключ: сообщение может быть удалено
+    last_read_id = models.PositiveIntegerField(
+        'Последнее прочитанное', null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'topic'], name='unique topic participant')]
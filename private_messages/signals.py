@@ -0,0 +1,41 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .hub import get_hub
+from .models import Message, Participant, Topic
+
+
+@receiver(post_save, sender=Topic)
+def add_participants(sender, instance, created, **kwargs):
+    if created:
+        Participant.objects.bulk_create(
+            [Participant(topic=instance, user_id=user_id)
+             for user_id in {instance.sender_id, instance.recipient_id}],
+            ignore_conflicts=True)
+
+
+@receiver(post_save, sender=Message)
+def count_unread(sender, instance, created, **kwargs):
+    if not created:
+        return
+    participants = Participant.objects.filter(topic=instance.topic_id)
+    participants.exclude(user=instance.sender_id).update(
+        unread_count=F('unread_count') + 1)
+    # свое сообщение автор прочитал
+    participants.filter(user=instance.sender_id).update(
+        last_read_id=instance.id)
+
+
+@receiver(post_save, sender=Message)
+def notify_participants(sender, instance, created, **kwargs):
+    """
+    Будим ожидающие запросы собеседника, когда сообщение уже видно
+    в базе
+    """
+    if not created:
+        return
+    topic = instance.topic
+    user_ids = {topic.sender_id, topic.recipient_id} - {instance.sender_id}
+    transaction.on_commit(lambda: get_hub().notify(user_ids))
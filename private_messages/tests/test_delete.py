@@ -0,0 +1,82 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from private_messages.models import Message, Participant, Topic
+
+User = get_user_model()
+
+
+class TopicDeleteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='vika')
+        cls.friend = User.objects.create_user(username='victor')
+        cls.stranger = User.objects.create_user(username='stranger')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def create_topic(self, sender, recipient, messages=2):
+        topic = Topic.objects.create(
+            sender=sender, recipient=recipient, last_sent_at=timezone.now())
+        Message.objects.bulk_create(
+            Message(topic=topic, sender=sender, body='Привет')
+            for _ in range(messages))
+        return topic
+
+    def delete(self, topics):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse('private_messages_topic_delete'),
+                {'topic[]': [topic.id for topic in topics]})
+        self.assertRedirects(response, reverse('private_messages'))
+        return len(queries)
+
+    def test_deletes_own_topics_with_messages(self):
+        topics = [
+            self.create_topic(self.friend, self.user),
+            self.create_topic(self.user, self.friend)]
+        self.delete(topics)
+        self.assertFalse(Topic.objects.exists())
+        self.assertFalse(Message.objects.exists())
+        self.assertFalse(Participant.objects.exists())
+
+    def test_foreign_topic_is_kept(self):
+        foreign = self.create_topic(self.friend, self.stranger)
+        self.delete([foreign])
+        self.assertTrue(Topic.objects.filter(pk=foreign.pk).exists())
+        self.assertEqual(foreign.topic_messages.count(), 2)
+
+    def test_queries_do_not_grow_with_topics(self):
+        few = self.delete([self.create_topic(self.friend, self.user)])
+        many = self.delete([
+            self.create_topic(self.friend, self.user) for _ in range(5)])
+        self.assertEqual(few, many)
+
+    def test_large_history_deleted_in_chunks(self):
+        topic = self.create_topic(self.friend, self.user, messages=7)
+        with mock.patch('private_messages.models.DELETE_CHUNK', 3):
+            self.assertEqual(
+                Topic.objects.delete_for(self.user, [topic.id]), 1)
+        self.assertFalse(Topic.objects.exists())
+        self.assertFalse(Message.objects.exists())
+
+    def test_invalid_ids_are_ignored(self):
+        topic = self.create_topic(self.friend, self.user)
+        self.client.post(
+            reverse('private_messages_topic_delete'),
+            {'topic[]': ['abc', topic.id]})
+        self.assertFalse(Topic.objects.exists())
+
+    def test_get_deletes_nothing(self):
+        topic = self.create_topic(self.friend, self.user)
+        response = self.client.get(
+            reverse('private_messages_topic_delete'), {'topic_id': topic.id})
+        self.assertEqual(response.status_code, 405)
+        self.assertTrue(Topic.objects.filter(pk=topic.pk).exists())
@@ -0,0 +1,75 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from private_messages.models import Message, Topic
+from private_messages.views import MESSAGES_PER_PAGE
+
+User = get_user_model()
+
+
+class HistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='vika')
+        cls.friend = User.objects.create_user(username='victor')
+        cls.topic = Topic.objects.create(
+            sender=cls.friend, recipient=cls.user, subject='Тема',
+            last_sent_at=timezone.now())
+        cls.messages = [
+            Message.objects.create(
+                topic=cls.topic, sender=cls.friend, body=f'Сообщение {n}')
+            for n in range(MESSAGES_PER_PAGE + 5)]
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def read(self, **params):
+        return self.client.get(
+            reverse('private_messages_topic', args=[self.topic.id]), params)
+
+    def since(self, after_id, **params):
+        return self.client.get(
+            reverse('private_messages_since', args=[self.topic.id]),
+            {'after_id': after_id, **params})
+
+    def test_shows_latest_messages(self):
+        page = self.read().context['messages_all']
+        self.assertEqual(
+            [message.id for message in page],
+            [message.id for message in self.messages[::-1]][
+                :MESSAGES_PER_PAGE])
+        self.assertTrue(page.has_next())
+
+    def test_older_messages_by_cursor(self):
+        cursor = self.read().context['messages_all'].paginator.next_cursor
+        page = self.read(after=cursor).context['messages_all']
+        self.assertEqual(
+            [message.id for message in page],
+            [message.id for message in self.messages[4::-1]])
+        self.assertFalse(page.has_next())
+
+    def test_since_returns_only_newer(self):
+        last = self.messages[-3]
+        response = self.since(last.id, format='json')
+        self.assertEqual(
+            [message['id'] for message in response.json()['messages']],
+            [message.id for message in self.messages[-2:]])
+
+    def test_since_fragment(self):
+        response = self.since(self.messages[-2].id)
+        self.assertTemplateUsed(
+            response, 'private_messages/includes/messages.html')
+        self.assertContains(response, self.messages[-1].body)
+        self.assertNotContains(response, self.messages[-2].body)
+
+    def test_since_nothing_new_is_cheap(self):
+        with self.assertNumQueries(4):
+            response = self.since(self.messages[-1].id, format='json')
+        self.assertEqual(response.json(), {'messages': []})
+
+    def test_since_foreign_topic(self):
+        stranger = User.objects.create_user(username='stranger')
+        self.client.force_login(stranger)
+        self.assertEqual(self.since(0).status_code, 404)
@@ -0,0 +1,71 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from private_messages.models import Message, Topic
+from private_messages.views import TOPICS_PER_PAGE
+
+User = get_user_model()
+
+
+class InboxTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='vika')
+        cls.friend = User.objects.create_user(username='victor')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def create_topics(self, count, sender=None):
+        sender = sender or self.friend
+        recipient = self.user if sender == self.friend else self.friend
+        for number in range(count):
+            topic = Topic.objects.create(
+                sender=sender, recipient=recipient,
+                subject=f'Тема {number}', last_sent_at=timezone.now())
+            Message.objects.create(topic=topic, sender=sender, body='Привет')
+
+    def inbox_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('private_messages'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_queries_do_not_grow_with_topics(self):
+        self.create_topics(2)
+        few = self.inbox_queries()
+
+        self.create_topics(TOPICS_PER_PAGE)
+
+        self.assertEqual(self.inbox_queries(), few)
+
+    def test_unread_status(self):
+        self.create_topics(1)
+        self.create_topics(1, sender=self.user)
+
+        response = self.client.get(reverse('private_messages'))
+
+        topics = {
+            topic.sender: topic for topic in response.context['pm_topics']}
+        self.assertEqual(topics[self.friend].unread_count, 1)
+        self.assertEqual(
+            topics[self.user].last_unread_sender, self.user.id)
+        self.assertContains(response, 'Новое')
+        self.assertContains(response, 'Отправлено')
+
+    def test_inbox_is_paginated(self):
+        self.create_topics(TOPICS_PER_PAGE + 1)
+
+        response = self.client.get(reverse('private_messages'))
+        page = response.context['pm_topics']
+        self.assertEqual(len(page), TOPICS_PER_PAGE)
+        self.assertTrue(page.has_next())
+
+        response = self.client.get(
+            reverse('private_messages'),
+            {'after': page.paginator.next_cursor})
+        self.assertEqual(len(response.context['pm_topics']), 1)
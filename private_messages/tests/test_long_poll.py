@@ -0,0 +1,112 @@
+import tempfile
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from private_messages.hub import FileHub, InProcessHub, get_hub
+from private_messages.models import Message, Topic
+
+User = get_user_model()
+
+
+class HubMixin:
+    def make_hub(self):
+        raise NotImplementedError
+
+    def test_wait_times_out(self):
+        hub = self.make_hub()
+        version = hub.version(1)
+        started = time.monotonic()
+        self.assertEqual(hub.wait(1, version, 0.2), version)
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+
+    def test_missed_notification_returns_at_once(self):
+        hub = self.make_hub()
+        version = hub.version(1)
+        hub.notify([1])
+        started = time.monotonic()
+        self.assertNotEqual(hub.wait(1, version, 5), version)
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_notify_wakes_waiter(self):
+        hub = self.make_hub()
+        version = hub.version(1)
+        threading.Timer(0.1, hub.notify, [[1]]).start()
+        started = time.monotonic()
+        self.assertNotEqual(hub.wait(1, version, 5), version)
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_other_users_are_not_woken(self):
+        hub = self.make_hub()
+        version = hub.version(1)
+        hub.notify([2])
+        self.assertEqual(hub.wait(1, version, 0.1), version)
+
+
+class InProcessHubTests(HubMixin, TestCase):
+    def make_hub(self):
+        return InProcessHub()
+
+
+class FileHubTests(HubMixin, TestCase):
+    def make_hub(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return FileHub(directory.name)
+
+
+@override_settings(PM_LONG_POLL_TIMEOUT=0.1)
+class WaitMessagesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='vika')
+        cls.friend = User.objects.create_user(username='victor')
+        cls.topic = Topic.objects.create(
+            sender=cls.friend, recipient=cls.user, subject='Тема',
+            last_sent_at=timezone.now())
+        cls.message = Message.objects.create(
+            topic=cls.topic, sender=cls.friend, body='Привет')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def wait(self, **params):
+        return self.client.get(reverse('private_messages_wait'), params).json()
+
+    def test_without_cursor_returns_last_id(self):
+        self.assertEqual(
+            self.wait(), {'messages': [], 'last_id': self.message.id})
+
+    def test_new_message_returned_at_once(self):
+        data = self.wait(after_id=0)
+        self.assertEqual(
+            [message['id'] for message in data['messages']],
+            [self.message.id])
+        self.assertEqual(data['last_id'], self.message.id)
+
+    def test_timeout_returns_nothing(self):
+        self.assertEqual(
+            self.wait(after_id=self.message.id),
+            {'messages': [], 'last_id': self.message.id})
+
+    def test_own_messages_are_skipped(self):
+        Message.objects.create(topic=self.topic, sender=self.user, body='Я')
+        self.assertEqual(self.wait(after_id=self.message.id)['messages'], [])
+
+
+class NotifyTests(TransactionTestCase):
+    def test_message_notifies_recipient_after_commit(self):
+        user = User.objects.create_user(username='vika')
+        friend = User.objects.create_user(username='victor')
+        topic = Topic.objects.create(
+            sender=friend, recipient=user, last_sent_at=timezone.now())
+        hub = get_hub()
+        user_version = hub.version(user.id)
+        friend_version = hub.version(friend.id)
+        Message.objects.create(topic=topic, sender=friend, body='Привет')
+        self.assertNotEqual(hub.version(user.id), user_version)
+        self.assertEqual(hub.version(friend.id), friend_version)
@@ -0,0 +1,68 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from private_messages.models import Message, Participant, Topic
+
+User = get_user_model()
+
+
+class UnreadCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='vika')
+        cls.friend = User.objects.create_user(username='victor')
+
+    def send_topic(self, sender, recipient):
+        self.client.force_login(sender)
+        self.client.post(
+            reverse('private_messages_new', args=[recipient.id]),
+            {'subject': 'Привет', 'body': 'Как дела?'})
+        return Topic.objects.latest('id')
+
+    def answer(self, sender, topic):
+        self.client.force_login(sender)
+        self.client.post(
+            reverse('answer_messages', args=[topic.id]), {'body': 'Ответ'})
+
+    def test_new_topic_counts_for_recipient(self):
+        topic = self.send_topic(self.friend, self.user)
+        self.assertEqual(Message.objects.count_unread(self.user), 1)
+        self.assertEqual(Message.objects.count_unread(self.friend), 0)
+        sender = Participant.objects.get(topic=topic, user=self.friend)
+        self.assertEqual(
+            sender.last_read_id, topic.topic_messages.get().id)
+
+    def test_answers_add_up_across_topics(self):
+        topic = self.send_topic(self.friend, self.user)
+        self.answer(self.friend, topic)
+        self.send_topic(self.friend, self.user)
+        self.assertEqual(Message.objects.count_unread(self.user), 3)
+        self.assertEqual(
+            Message.objects.count_unread(self.user, topic=topic), 2)
+
+    def test_reading_resets_counter(self):
+        topic = self.send_topic(self.friend, self.user)
+        self.answer(self.friend, topic)
+        self.client.force_login(self.user)
+        self.client.get(reverse('private_messages_topic', args=[topic.id]))
+        participant = Participant.objects.get(topic=topic, user=self.user)
+        self.assertEqual(participant.unread_count, 0)
+        self.assertEqual(
+            participant.last_read_id,
+            topic.topic_messages.latest('id').id)
+        self.assertFalse(
+            topic.topic_messages.filter(read_at=None).exists())
+
+    def test_total_is_one_query(self):
+        self.send_topic(self.friend, self.user)
+        self.send_topic(self.friend, self.user)
+        with self.assertNumQueries(1):
+            self.assertEqual(Message.objects.count_unread(self.user), 2)
+
+    def test_badge_in_menu(self):
+        self.send_topic(self.friend, self.user)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('index'))
+        self.assertEqual(response.context['unread_messages'], 1)
+        self.assertContains(response, "class='badge badge-danger'>1<")
@@ -8,6 +8,11 @@ urlpatterns = [
         'messages/read/<int:topic_id>/',
         views.topic_read,
         name='private_messages_topic'),
+    path(
+        'messages/read/<int:topic_id>/since/',
+        views.topic_since,
+        name='private_messages_since'),
+    path('messages/wait/', views.wait_messages, name='private_messages_wait'),
     path(
         'messages/new/<int:user_id>/', views.topic_new,
         name='private_messages_new'),
@@ -1,23 +1,38 @@
 from datetime import datetime
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
+from django.views.decorators.http import require_POST
 
-from posts.models import Profile
+from posts.paginator import paginate
+from posts.thumbnails import prefetch_thumbnails
 
 from .forms import MessageSendForm, NewTopicForm
-from .models import Message, Topic
+from .hub import get_hub
+from .models import Message, Participant, Topic
 
 User = get_user_model()
 
+TOPICS_PER_PAGE = 20
+MESSAGES_PER_PAGE = 20
+# сколько новых сообщений отдает topic_since за один запрос
+SINCE_LIMIT = 100
+
 
 @login_required
 def topics(request):
-    profile = get_object_or_404(User, id=request.user.id)
-    pm_topics = Topic.objects.by_user(profile)
-    photo = get_object_or_404(Profile, user=profile)
+    profile = get_object_or_404(
+        User.objects.select_related('profile'), id=request.user.id)
+    pm_topics = paginate(
+        request, Topic.objects.by_user(profile), TOPICS_PER_PAGE,
+        ordering=('-last_sent_at', '-id'))
+    photo = profile.profile
+    prefetch_thumbnails([photo], 'photo', 'avatar')
 
     return render(
         request,
@@ -30,8 +45,10 @@ def topics(request):
 
 @login_required
 def topic_new(request, user_id):
-    recipient = get_object_or_404(User, id=user_id)
-    photo = get_object_or_404(Profile, user=recipient)
+    recipient = get_object_or_404(
+        User.objects.select_related('profile'), id=user_id)
+    photo = recipient.profile
+    prefetch_thumbnails([photo], 'photo', 'avatar')
     count_message = Topic.objects.by_user(user=recipient).count()
     count_unread = Message.objects.count_unread(user=recipient)
 
@@ -44,11 +61,13 @@ def topic_new(request, user_id):
 
         topic.last_sent_at = datetime.now()
         topic.subject = form.cleaned_data['subject']
-        topic.save()
+        # топик, сообщение и счетчики участников - одной транзакцией
+        with transaction.atomic():
+            topic.save()
 
-        message.topic = topic
-        message.sender = request.user
-        message.save()
+            message.topic = topic
+            message.sender = request.user
+            message.save()
 
         return redirect(reverse('private_messages'))
     return render(
@@ -65,39 +84,37 @@ def topic_new(request, user_id):
 
 @login_required
 def answer_topic(request, topic_id):
-    topic = get_object_or_404(Topic, id=topic_id)
-    recipient = get_object_or_404(User, id=topic.sender.id)
+    topic = get_object_or_404(Topic.objects.by_user(request.user), id=topic_id)
 
-    form = NewTopicForm(request.POST or None, instance=topic)
+    form = NewTopicForm(request.POST or None)
     if form.is_valid():
         message = form.save(commit=False)
 
-        topic.recipient = recipient
         topic.last_sent_at = datetime.now()
-        topic.subject = topic.subject
-        topic.save()
+        with transaction.atomic():
+            topic.save()
 
-        message.topic = topic
-        message.sender = request.user
-        message.save()
+            message.topic = topic
+            message.sender = request.user
+            message.save()
 
         return redirect(reverse('private_messages'))
-    return render(
-        request,
-        'private_messages/topic_read.html',
-        {
-            'pm_form': form,
-            'recipient': recipient,
-            'profile': recipient})
+    # форма ответа живет на странице переписки
+    return redirect(reverse('private_messages_topic', args=[topic.id]))
 
 
 @login_required
 def topic_read(request, topic_id):
     topic = get_object_or_404(Topic.objects.by_user(request.user), id=topic_id)
     recipient = get_object_or_404(User, id=topic.recipient.id)
-    messages_all = topic.topic_messages.all()
-    profile = get_object_or_404(User, id=request.user.id)
-    photo = get_object_or_404(Profile, user=profile)
+    # последние сообщения, более ранние - по курсору after
+    messages_all = paginate(
+        request, Message.objects.by_topic(topic), MESSAGES_PER_PAGE,
+        ordering=('-sent_at', '-id'))
+    profile = get_object_or_404(
+        User.objects.select_related('profile'), id=request.user.id)
+    photo = profile.profile
+    prefetch_thumbnails([photo], 'photo', 'avatar')
 
     form = MessageSendForm(request.POST or None, instance=topic)
 
@@ -118,18 +135,75 @@ def topic_read(request, topic_id):
 
 
 @login_required
+def topic_since(request, topic_id):
+    """
+    Сообщения топика новее after_id - для опроса клиентом без
+    перезагрузки всей переписки. По умолчанию фрагмент HTML (новые
+    сверху), с format=json - список по возрастанию id
+    """
+    get_object_or_404(Participant, topic=topic_id, user=request.user)
+    try:
+        after_id = int(request.GET.get('after_id', 0))
+    except ValueError:
+        after_id = 0
+    messages = list(Message.objects.by_topic(topic_id).filter(
+        id__gt=after_id).order_by('id')[:SINCE_LIMIT])
+    if messages:
+        Message.objects.mark_read(request.user, topic_id)
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse({'messages': [
+            message_json(message) for message in messages]})
+    return render(
+        request,
+        'private_messages/includes/messages.html',
+        {'messages_all': messages[::-1]})
+
+
+def message_json(message):
+    return {
+        'id': message.id,
+        'topic': message.topic_id,
+        'sender': message.sender.username,
+        'body': message.body,
+        'sent_at': message.sent_at.isoformat()}
+
+
+@login_required
+def wait_messages(request):
+    """
+    Long-poll: ждем новое сообщение от собеседника в любом из топиков
+    пользователя с id больше after_id, но не дольше PM_LONG_POLL_TIMEOUT.
+    Ответ - сообщения и last_id для следующего запроса; без after_id
+    сразу возвращается только last_id
+    """
+    user = request.user
+    incoming = Message.objects.filter(
+        topic__participants__user=user).exclude(sender=user)
+    try:
+        after_id = int(request.GET['after_id'])
+    except (KeyError, ValueError):
+        last = incoming.order_by('-id').values_list('id', flat=True).first()
+        return JsonResponse({'messages': [], 'last_id': last or 0})
+
+    hub = get_hub()
+    version = hub.version(user.id)
+    newer = incoming.filter(id__gt=after_id).select_related(
+        'sender').order_by('id')
+    messages = list(newer[:SINCE_LIMIT])
+    if not messages and hub.wait(
+            user.id, version, settings.PM_LONG_POLL_TIMEOUT) != version:
+        messages = list(newer[:SINCE_LIMIT])
+    return JsonResponse({
+        'messages': [message_json(message) for message in messages],
+        'last_id': messages[-1].id if messages else after_id})
+
+
+@login_required
+@require_POST
 def topic_delete(request):
-    topics = []
-    if request.method == 'POST':
-        topics = request.POST.getlist('topic[]')
-    elif 'topic_id' in request:
-        topics.append(request.GET['topic_id'])
-
-    for topic_id in topics:
-        try:
-            topic = Topic.objects.by_user(request.user).get(pk=topic_id)
-            topic.delete()
-        except Topic.DoesNotExist:
-            pass
+    topics = request.POST.getlist('topic[]')
+    Topic.objects.delete_for(
+        request.user, [topic for topic in topics if topic.isdigit()])
 
     return redirect(reverse('private_messages'))
@@ -4,8 +4,10 @@ from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.forms import UserCreationForm
+from django.core.files.uploadedfile import UploadedFile
 from django.utils.safestring import mark_safe
 
+from posts.images import normalize_image
 from posts.models import Profile
 
 User = get_user_model()
@@ -42,3 +44,9 @@ class ProfileEditForm(forms.ModelForm):
         widgets = {
             'photo': PictureWidget
         }
+
+    def clean_photo(self):
+        photo = self.cleaned_data.get('photo')
+        if isinstance(photo, UploadedFile):
+            return normalize_image(photo)
+        return photo
@@ -0,0 +1,18 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from posts.models import Profile
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User)
+def create_profile(sender, instance, created, **kwargs):
+    """
+    автоматическое создание профиля для новых пользователей; профили
+    тех, кто зарегистрировался раньше, создала миграция
+    posts 0006_create_missing_profiles
+    """
+    if created:
+        Profile.objects.create(user=instance)
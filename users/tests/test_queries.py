@@ -0,0 +1,72 @@
+import os
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from posts.cache_tags import invalidate
+from posts.models import Post, Profile
+from posts.tests.test_storage import MediaRootMixin
+
+User = get_user_model()
+
+
+class ProfileQueriesTests(MediaRootMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='vika', password='Qwerty-12345')
+        cls.post = Post.objects.create(text='Пост', author=cls.user)
+        # аватарка по умолчанию, у нее есть превью
+        path = os.path.join(settings.MEDIA_ROOT, cls.user.profile.photo.name)
+        os.makedirs(os.path.dirname(path))
+        Image.new('RGB', (180, 180)).save(path)
+
+    def setUp(self):
+        cache.clear()
+
+    def profile_queries(self, queries):
+        return [
+            query['sql'] for query in queries.captured_queries
+            if 'posts_profile' in query['sql']]
+
+    def test_profile_is_created_with_user(self):
+        self.assertTrue(Profile.objects.filter(user=self.user).exists())
+
+    def test_login_does_not_touch_profile(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('login'), {
+                'username': 'vika', 'password': 'Qwerty-12345'})
+
+        self.assertEqual(self.profile_queries(queries), [])
+        self.assertTrue(self.client.session.get('_auth_user_id'))
+
+    def test_profile_pages_join_profile(self):
+        self.client.force_login(self.user)
+        urls = (
+            reverse('profile', args=(self.user.username,)),
+            reverse('post', args=(self.user.username, self.post.id)),
+            reverse('private_messages'),
+            reverse('private_messages_new', args=(self.user.id,)),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(url)
+                profile_queries = self.profile_queries(queries)
+                self.assertEqual(len(profile_queries), 1)
+                self.assertIn('JOIN', profile_queries[0])
+
+    def test_profile_page_queries(self):
+        url = reverse('profile', args=(self.user.username,))
+        # превью создаются при первом показе
+        self.client.get(url)
+        invalidate(f'author:{self.user.id}')
+
+        with self.assertNumQueries(2):
+            self.client.get(url)
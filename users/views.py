@@ -1,17 +1,10 @@
-from django.contrib.auth import authenticate, get_user_model, login
-from django.core.exceptions import ObjectDoesNotExist
-from django.db.models.signals import post_save
-from django.dispatch import receiver
+from django.contrib.auth import authenticate, login
 from django.shortcuts import redirect
 from django.urls import reverse, reverse_lazy
 from django.views.generic import CreateView
 
-from posts.models import Profile
-
 from .forms import CreationForm
 
-User = get_user_model()
-
 
 class SignUp(CreateView):
     form_class = CreationForm
@@ -28,17 +21,3 @@ class SignUp(CreateView):
             password=form.cleaned_data['password1'])
         login(self.request, user)
         return redirect(reverse('index'))
-
-
-@receiver(post_save, sender=User)
-def save_or_create_profile(sender, instance, created, **kwargs):
-    """
-    автоматическое создание профиля для существующих и новых пользователей
-    """
-    if created:
-        Profile.objects.create(user=instance)
-    else:
-        try:
-            instance.profile.save()
-        except ObjectDoesNotExist:
-            Profile.objects.create(user=instance)
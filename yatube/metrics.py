@@ -0,0 +1,430 @@
+"""
+Метрики страниц в формате Prometheus: число запросов, гистограмма
+времени ответа, число и время SQL-запросов, время рендеринга шаблонов,
+попадания и промахи кэша - все с меткой view (имя адреса из urls.py).
+
+Каждый поток пишет в свои словари без блокировок; процесс раз в
+METRICS_FLUSH_INTERVAL секунд складывает их и сохраняет в файл
+METRICS_DIR/<pid>-<время запуска>.json. Страница /metrics суммирует
+файлы всех воркеров, подставляя вместо файла своего процесса свежие
+значения. Счетчики монотонны, поэтому вклад остановленных воркеров
+остается в сумме: их файлы переносятся в archived.json. METRICS_DIR =
+None - метрики только в памяти процесса, без файлов
+"""
+import atexit
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+from django.template.backends.django import DjangoTemplates
+from django.urls import Resolver404, resolve
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float('inf'))
+
+DESCRIPTIONS = {
+    'yatube_requests_total': ('counter', 'Запросы по view и коду ответа'),
+    'yatube_request_duration_seconds': ('histogram', 'Время ответа'),
+    'yatube_db_queries_total': ('counter', 'SQL-запросы'),
+    'yatube_db_duration_seconds_total': ('counter', 'Время SQL-запросов'),
+    'yatube_template_duration_seconds_total': (
+        'counter', 'Время рендеринга шаблонов'),
+    'yatube_cache_hits_total': ('counter', 'Попадания в кэш'),
+    'yatube_cache_misses_total': ('counter', 'Промахи кэша'),
+}
+
+_local = threading.local()
+# поток -> его хранилище; блокировка нужна только при появлении
+# нового потока и при сборе. Хранилища завершившихся потоков при сборе
+# складываются в _retired, иначе поток на соединение (runserver)
+# копил бы их без конца
+_stores = {}
+_stores_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_flushed_at = 0.0
+# (pid, имя файла воркера); после fork pid другой
+_worker = None
+
+ARCHIVE = 'archived'
+
+
+class Store:
+    def __init__(self):
+        self.counters = defaultdict(float)
+        # (имя, метки) -> [число в каждом интервале..., сумма]
+        self.histograms = defaultdict(
+            lambda: [0] * len(LATENCY_BUCKETS) + [0.0])
+
+
+_retired = Store()
+
+
+def _store():
+    store = getattr(_local, 'store', None)
+    if store is None:
+        store = _local.store = Store()
+        with _stores_lock:
+            _stores[threading.current_thread()] = store
+    return store
+
+
+def _merge(to, store):
+    # копия словаря атомарна под GIL, даже если поток пишет в него
+    for key, value in dict(store.counters).items():
+        to.counters[key] += value
+    for key, row in dict(store.histograms).items():
+        current = to.histograms[key]
+        for index, value in enumerate(list(row)):
+            current[index] += value
+
+
+def inc(name, labels, value=1):
+    _store().counters[name, labels] += value
+
+
+def observe(name, labels, value):
+    row = _store().histograms[name, labels]
+    for index, bound in enumerate(LATENCY_BUCKETS):
+        if value <= bound:
+            row[index] += 1
+            break
+    row[-1] += value
+
+
+def record_cache(hits, misses):
+    """
+    Вызывается бэкендом кэша; вне запроса ничего не считает
+    """
+    request = getattr(_local, 'request', None)
+    if request is not None:
+        request['hits'] += hits
+        request['misses'] += misses
+
+
+def _add(to, metrics):
+    for (name, labels), value in metrics['counters']:
+        to['counters'][name, tuple(labels)] += value
+    for (name, labels), row in metrics['histograms']:
+        current = to['histograms'].setdefault(
+            (name, tuple(labels)), [0] * len(row))
+        for index, value in enumerate(row):
+            current[index] += value
+
+
+def _dump(counters, histograms):
+    return {
+        'counters': [[[name, list(labels)], value]
+                     for (name, labels), value in counters.items()],
+        'histograms': [[[name, list(labels)], row]
+                       for (name, labels), row in histograms.items()]}
+
+
+def snapshot():
+    """
+    Сумма по потокам процесса в виде, пригодном для JSON
+    """
+    total = Store()
+    with _stores_lock:
+        for thread in [thread for thread in _stores
+                       if not thread.is_alive()]:
+            _merge(_retired, _stores.pop(thread))
+        _merge(total, _retired)
+        stores = list(_stores.values())
+    for store in stores:
+        _merge(total, store)
+    return _dump(total.counters, total.histograms)
+
+
+def _started(pid):
+    """
+    Время запуска процесса pid из /proc; без /proc - 0, если процесс
+    есть. None - процесса нет
+    """
+    if os.path.isdir('/proc'):
+        try:
+            with open(f'/proc/{pid}/stat') as file:
+                stat = file.read()
+        except OSError:
+            return None
+        # имя процесса в скобках может содержать пробелы
+        return int(stat.rsplit(')', 1)[1].split()[19])
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return None
+    except PermissionError:
+        pass
+    return 0
+
+
+def _worker_name(pid=None):
+    """
+    Имя файла воркера: один pid может достаться новому процессу,
+    время запуска у него будет другим
+    """
+    global _worker
+    if pid is not None:
+        return f'{pid}-{_started(pid)}'
+    pid = os.getpid()
+    if _worker is None or _worker[0] != pid:
+        _worker = (pid, _worker_name(pid))
+    return _worker[1]
+
+
+def _alive(worker):
+    pid, _, started = worker.partition('-')
+    try:
+        return _started(int(pid)) == int(started)
+    except ValueError:
+        # не файл воркера
+        return True
+
+
+def _path(worker):
+    return os.path.join(settings.METRICS_DIR, f'{worker}.json')
+
+
+def _read(worker):
+    try:
+        with open(_path(worker)) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _write(worker, metrics):
+    fd, name = tempfile.mkstemp(dir=settings.METRICS_DIR, suffix='.tmp')
+    with os.fdopen(fd, 'w') as file:
+        json.dump(metrics, file)
+    os.replace(name, _path(worker))
+
+
+def flush():
+    if not settings.METRICS_DIR:
+        return
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    _write(_worker_name(), snapshot())
+
+
+def maybe_flush():
+    """
+    Сохраняем не чаще раза в METRICS_FLUSH_INTERVAL; если сохраняет
+    другой поток, не ждем его
+    """
+    global _flushed_at
+    if time.monotonic() - _flushed_at < settings.METRICS_FLUSH_INTERVAL:
+        return
+    if not _flush_lock.acquire(blocking=False):
+        return
+    try:
+        _flushed_at = time.monotonic()
+        flush()
+    finally:
+        _flush_lock.release()
+
+
+def _workers():
+    return [
+        name[:-len('.json')] for name in os.listdir(settings.METRICS_DIR)
+        if name.endswith('.json')]
+
+
+def _archive(dead):
+    """
+    Файлы остановленных воркеров переносим в архив, иначе новый воркер
+    с тем же pid и временем запуска затер бы файл, и сумма уменьшилась
+    бы. Запись архива и удаление файлов вместе не атомарны, поэтому
+    архив помнит, чьи файлы в нем уже учтены
+    """
+    with open(os.path.join(settings.METRICS_DIR, 'lock'), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        archive = _read(ARCHIVE) or {
+            'counters': [], 'histograms': [], 'workers': []}
+        for worker in archive['workers']:
+            try:
+                os.remove(_path(worker))
+            except FileNotFoundError:
+                pass
+        total = {'counters': defaultdict(float), 'histograms': {}}
+        _add(total, archive)
+        archived = []
+        for worker in dead:
+            metrics = _read(worker)
+            # уже перенес другой процесс
+            if metrics is not None:
+                _add(total, metrics)
+                archived.append(worker)
+        if not archived:
+            return
+        _write(ARCHIVE, {
+            **_dump(total['counters'], total['histograms']),
+            'workers': archived})
+        for worker in archived:
+            os.remove(_path(worker))
+
+
+def collect():
+    """
+    Сумма по всем воркерам
+    """
+    total = {'counters': defaultdict(float), 'histograms': {}}
+    if settings.METRICS_DIR and os.path.isdir(settings.METRICS_DIR):
+        own = _worker_name()
+        dead = [
+            worker for worker in _workers()
+            if worker not in (own, ARCHIVE) and not _alive(worker)]
+        if dead:
+            _archive(dead)
+        for worker in _workers():
+            metrics = _read(worker) if worker != own else None
+            if metrics is not None:
+                _add(total, metrics)
+    _add(total, snapshot())
+    return total
+
+
+def flush_at_exit():
+    """
+    Досчитанное после последнего сохранения не теряется. Процесс,
+    который не обслужил ни одного запроса, файла не оставляет
+    """
+    if _stores or _retired.counters:
+        flush()
+
+
+atexit.register(flush_at_exit)
+
+
+def _number(value):
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+def _labels(labels):
+    return ','.join(
+        f'{key}="{value}"' for key, value in zip(labels[::2], labels[1::2]))
+
+
+def render(metrics):
+    """
+    Текстовый формат Prometheus
+    """
+    samples = defaultdict(list)
+    for (name, labels), value in sorted(metrics['counters'].items()):
+        samples[name].append(
+            f'{name}{{{_labels(labels)}}} {_number(value)}')
+    for (name, labels), row in sorted(metrics['histograms'].items()):
+        labels = _labels(labels)
+        count = 0
+        for bound, value in zip(LATENCY_BUCKETS, row):
+            count += value
+            le = '+Inf' if bound == float('inf') else f'{bound:g}'
+            samples[name].append(
+                f'{name}_bucket{{{labels},le="{le}"}} {count}')
+        samples[name].append(f'{name}_sum{{{labels}}} {_number(row[-1])}')
+        samples[name].append(f'{name}_count{{{labels}}} {count}')
+    lines = []
+    for name in sorted(samples):
+        kind, description = DESCRIPTIONS[name]
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} {kind}']
+        lines += samples[name]
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    return HttpResponse(
+        render(collect()), content_type='text/plain; version=0.0.4')
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        # ответ из кэша страниц отдается до разбора адреса
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return 'not_found'
+    return match.view_name or 'unnamed'
+
+
+class MetricsMiddleware:
+    """
+    Ставить первым: время ответа включает остальные middleware
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = _local.request = {
+            'queries': 0, 'sql': 0.0, 'templates': 0.0,
+            'hits': 0, 'misses': 0}
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(self.time_query))
+                response = self.get_response(request)
+        finally:
+            _local.request = None
+        elapsed = time.perf_counter() - start
+
+        view = ('view', view_name(request))
+        inc('yatube_requests_total',
+            view + ('status', str(response.status_code)))
+        observe('yatube_request_duration_seconds', view, elapsed)
+        inc('yatube_db_queries_total', view, stats['queries'])
+        inc('yatube_db_duration_seconds_total', view, stats['sql'])
+        inc('yatube_template_duration_seconds_total', view,
+            stats['templates'])
+        inc('yatube_cache_hits_total', view, stats['hits'])
+        inc('yatube_cache_misses_total', view, stats['misses'])
+        maybe_flush()
+        return response
+
+    @staticmethod
+    def time_query(execute, sql, params, many, context):
+        stats = _local.request
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            stats['queries'] += 1
+            stats['sql'] += time.perf_counter() - start
+
+
+class TimedTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        start = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            stats = getattr(_local, 'request', None)
+            if stats is not None:
+                stats['templates'] += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    Шаблонизатор Django, который меряет время рендеринга страницы.
+    Вложенные шаблоны (include, extends) рендерятся внутри и отдельно
+    не считаются
+    """
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
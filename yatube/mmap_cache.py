@@ -0,0 +1,390 @@
+"""
+Кэш в файле, отображенном в память (mmap), общий для всех процессов
+на одной машине.
+
+Устройство файла:
+
+    заголовок | индекс из slots записей | область данных (arena)
+
+Индекс - открытая адресация с линейным пробированием по 64-битному хэшу
+ключа. Запись данных - байты ключа и pickle значения, которые пишутся
+подряд в конец области данных. Когда место или слоты заканчиваются,
+самые давно читанные записи вытесняются (LRU по логическим часам),
+а оставшиеся переписываются в начало области без дыр. Удаленные слоты
+остаются в индексе метками, пока их не наберется TOMBSTONE_RATIO, -
+тогда индекс перестраивается.
+
+Процессы синхронизируются через flock на файле, потоки одного процесса -
+через threading.Lock (flock принадлежит открытому файлу, а не потоку).
+"""
+import fcntl
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from .metrics import record_cache
+
+MAGIC = b'YTCACHE2'
+# magic, slots, arena_size, arena_used, clock, count, deleted
+HEADER = struct.Struct('<8sQQQQQQ')
+HEADER_SIZE = 64
+# hash, offset, expires, access, key_len, value_len
+SLOT = struct.Struct('<QQdQII')
+
+EMPTY = 0
+DELETED = 1
+
+# доля места и слотов, которая остается после вытеснения
+COMPACT_RATIO = 0.75
+# доля удаленных слотов, после которой индекс перестраивается: промах
+# идет до пустого слота и проходит все метки удаленных на пути
+TOMBSTONE_RATIO = 0.25
+
+
+def key_hash(key):
+    digest = hashlib.blake2b(key, digest_size=8).digest()
+    # 0 и 1 заняты под пустой и удаленный слот
+    return int.from_bytes(digest, 'little') | 2
+
+
+class MmapCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._slots = self._max_entries * 2
+        self._arena_size = int(options.get('MAX_SIZE', 64 * 1024 * 1024))
+        self._lock = threading.Lock()
+        self._pid = None
+        self._file = None
+        self._map = None
+
+    # файл и блокировки
+
+    def _open(self):
+        """
+        Открываем файл заново в каждом процессе: после fork общий
+        дескриптор разделял бы flock между родителем и потомком
+        """
+        if self._pid == os.getpid():
+            return
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._file = os.fdopen(fd, 'r+b')
+        size = HEADER_SIZE + self._slots * SLOT.size + self._arena_size
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        try:
+            header = self._file.read(HEADER_SIZE)
+            if len(header) < HEADER.size or not self._compatible(header):
+                self._file.truncate(0)
+                self._file.truncate(size)
+                self._map = mmap.mmap(self._file.fileno(), size)
+                self._write_header(0, 0, 0, 0)
+            else:
+                self._map = mmap.mmap(self._file.fileno(), size)
+        finally:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._pid = os.getpid()
+
+    def _compatible(self, header):
+        magic, slots, arena_size, *_ = HEADER.unpack(header[:HEADER.size])
+        return (
+            magic == MAGIC
+            and slots == self._slots
+            and arena_size == self._arena_size)
+
+    def _locked(self):
+        return _FileLock(self)
+
+    # заголовок и слоты
+
+    def _read_header(self):
+        _, _, _, used, clock, count, deleted = HEADER.unpack_from(
+            self._map, 0)
+        return used, clock, count, deleted
+
+    def _write_header(self, used, clock, count, deleted):
+        HEADER.pack_into(
+            self._map, 0, MAGIC, self._slots, self._arena_size,
+            used, clock, count, deleted)
+
+    def _slot_offset(self, index):
+        return HEADER_SIZE + index * SLOT.size
+
+    def _read_slot(self, index):
+        return SLOT.unpack_from(self._map, self._slot_offset(index))
+
+    def _write_slot(self, index, *values):
+        SLOT.pack_into(self._map, self._slot_offset(index), *values)
+
+    def _data_offset(self, offset):
+        return HEADER_SIZE + self._slots * SLOT.size + offset
+
+    def _find(self, key):
+        """
+        Номер слота с ключом или None
+        """
+        hashed = key_hash(key)
+        index = hashed % self._slots
+        for _ in range(self._slots):
+            slot = self._read_slot(index)
+            if slot[0] == EMPTY:
+                return None
+            if slot[0] == hashed and slot[4] == len(key):
+                start = self._data_offset(slot[1])
+                if self._map[start:start + slot[4]] == key:
+                    return index
+            index = (index + 1) % self._slots
+        return None
+
+    def _free_slot(self, key):
+        index = key_hash(key) % self._slots
+        while self._read_slot(index)[0] > DELETED:
+            index = (index + 1) % self._slots
+        return index
+
+    def _alive(self, slot):
+        expires = slot[2]
+        return not expires or expires > time.time()
+
+    def _touch_slot(self, index, slot):
+        used, clock, count, deleted = self._read_header()
+        self._write_slot(index, *slot[:3], clock + 1, *slot[4:])
+        self._write_header(used, clock + 1, count, deleted)
+
+    def _read_value(self, slot):
+        start = self._data_offset(slot[1]) + slot[4]
+        return self._map[start:start + slot[5]]
+
+    def _remove(self, index):
+        used, clock, count, deleted = self._read_header()
+        self._write_slot(index, DELETED, 0, 0.0, 0, 0, 0)
+        self._write_header(used, clock, count - 1, deleted + 1)
+        if deleted + 1 > self._slots * TOMBSTONE_RATIO:
+            self._rehash()
+
+    def _rehash(self):
+        """
+        Индекс заново, без удаленных слотов; данные не двигаются
+        """
+        slots = [
+            slot for slot in map(self._read_slot, range(self._slots))
+            if slot[0] > DELETED]
+        self._map[HEADER_SIZE:self._data_offset(0)] = bytes(
+            self._slots * SLOT.size)
+        for slot in slots:
+            start = self._data_offset(slot[1])
+            self._write_slot(
+                self._free_slot(self._map[start:start + slot[4]]), *slot)
+        used, clock, count, _ = self._read_header()
+        self._write_header(used, clock, count, 0)
+
+    # базовые операции под блокировкой
+
+    def _get(self, key):
+        index = self._find(key)
+        if index is None:
+            return None
+        slot = self._read_slot(index)
+        if not self._alive(slot):
+            self._remove(index)
+            return None
+        self._touch_slot(index, slot)
+        return self._read_value(slot)
+
+    def _set(self, key, pickled, expires):
+        index = self._find(key)
+        if index is not None:
+            self._remove(index)
+        size = len(key) + len(pickled)
+        if size > self._arena_size * (1 - COMPACT_RATIO):
+            # слишком большое значение не кэшируем
+            return False
+        used, clock, count, deleted = self._read_header()
+        if (used + size > self._arena_size
+                or count + 1 > self._slots * COMPACT_RATIO):
+            self._compact(size)
+            used, clock, count, deleted = self._read_header()
+        start = self._data_offset(used)
+        self._map[start:start + size] = key + pickled
+        index = self._free_slot(key)
+        if self._read_slot(index)[0] == DELETED:
+            deleted -= 1
+        self._write_slot(
+            index, key_hash(key), used, expires or 0.0,
+            clock + 1, len(key), len(pickled))
+        self._write_header(used + size, clock + 1, count + 1, deleted)
+        return True
+
+    def _compact(self, needed):
+        """
+        Вытесняем давно не читанные и просроченные записи и переписываем
+        оставшиеся в начало области данных
+        """
+        entries = []
+        for index in range(self._slots):
+            slot = self._read_slot(index)
+            if slot[0] > DELETED and self._alive(slot):
+                start = self._data_offset(slot[1])
+                entries.append(
+                    (slot, self._map[start:start + slot[4] + slot[5]]))
+        entries.sort(key=lambda entry: entry[0][3], reverse=True)
+
+        budget = self._arena_size * COMPACT_RATIO - needed
+        max_count = int(self._slots * COMPACT_RATIO / 2)
+        kept = []
+        for slot, data in entries:
+            if len(kept) >= max_count or budget < len(data):
+                break
+            budget -= len(data)
+            kept.append((slot, data))
+
+        self._map[HEADER_SIZE:self._data_offset(0)] = bytes(
+            self._slots * SLOT.size)
+        _, clock, _, _ = self._read_header()
+        used = 0
+        for slot, data in kept:
+            start = self._data_offset(used)
+            self._map[start:start + len(data)] = data
+            key = data[:slot[4]]
+            self._write_slot(self._free_slot(key), slot[0], used, *slot[2:])
+            used += len(data)
+        self._write_header(used, clock, len(kept), 0)
+
+    def _expires(self, timeout):
+        expires = self.get_backend_timeout(timeout)
+        return expires or 0.0
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key.encode()
+
+    # API кэша Django
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        with self._locked():
+            if self._get(key) is not None:
+                return False
+            return self._set(key, pickled, self._expires(timeout))
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        with self._locked():
+            pickled = self._get(key)
+        record_cache(int(pickled is not None), int(pickled is None))
+        if pickled is None:
+            return default
+        return pickle.loads(pickled)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        with self._locked():
+            self._set(key, pickled, self._expires(timeout))
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._locked():
+            index = self._find(key)
+            if index is None or not self._alive(self._read_slot(index)):
+                return False
+            slot = self._read_slot(index)
+            self._write_slot(
+                index, *slot[:2], self._expires(timeout), *slot[3:])
+            return True
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        with self._locked():
+            index = self._find(key)
+            if index is not None:
+                self._remove(index)
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        with self._locked():
+            index = self._find(key)
+            return index is not None and self._alive(self._read_slot(index))
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        with self._locked():
+            index = self._find(key)
+            slot = index is not None and self._read_slot(index)
+            if not slot or not self._alive(slot):
+                raise ValueError(f"Key '{key.decode()}' not found")
+            value = pickle.loads(self._read_value(slot)) + delta
+            self._set(
+                key, pickle.dumps(value, self.pickle_protocol), slot[2])
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        with self._locked():
+            found = {
+                key: pickled for key, pickled in (
+                    (key, self._get(key)) for key in keys)
+                if pickled is not None}
+        record_cache(len(found), len(keys) - len(found))
+        return {
+            keys[key]: pickle.loads(pickled)
+            for key, pickled in found.items()}
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        items = [
+            (self._key(key, version),
+             pickle.dumps(value, self.pickle_protocol))
+            for key, value in data.items()]
+        expires = self._expires(timeout)
+        with self._locked():
+            for key, pickled in items:
+                self._set(key, pickled, expires)
+        return []
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        with self._locked():
+            for key in keys:
+                index = self._find(key)
+                if index is not None:
+                    self._remove(index)
+
+    def clear(self):
+        with self._locked():
+            self._map[HEADER_SIZE:self._data_offset(0)] = bytes(
+                self._slots * SLOT.size)
+            self._write_header(0, 0, 0, 0)
+
+
+class _FileLock:
+    """
+    Эксклюзивная блокировка кэша между потоками и процессами
+    """
+    def __init__(self, cache):
+        self.cache = cache
+
+    def __enter__(self):
+        self.cache._lock.acquire()
+        try:
+            self.cache._open()
+            fcntl.flock(self.cache._file, fcntl.LOCK_EX)
+        except BaseException:
+            self.cache._lock.release()
+            raise
+
+    def __exit__(self, *exc_info):
+        fcntl.flock(self.cache._file, fcntl.LOCK_UN)
+        self.cache._lock.release()
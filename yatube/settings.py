@@ -1,4 +1,8 @@
+import atexit
 import os
+import shutil
+import sys
+import tempfile
 
 from dotenv import load_dotenv
 
@@ -26,9 +30,9 @@ INTERNAL_IPS = [
 
 INSTALLED_APPS = [
     'about',
-    'users',
-    'posts',
-    'private_messages',
+    'users.apps.UsersConfig',
+    'posts.apps.PostsConfig',
+    'private_messages.apps.PrivateMessagesConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -41,7 +45,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'yatube.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'posts.middleware.AnonymousPageCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -56,7 +62,8 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, который меряет время рендеринга для /metrics
+        'BACKEND': 'yatube.metrics.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -65,6 +72,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'private_messages.context_processors.unread_messages',
             ],
         },
     },
@@ -117,6 +125,22 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# файлы называются по хэшу содержимого, см. posts/storage.py
+DEFAULT_FILE_STORAGE = 'posts.storage.ContentAddressedStorage'
+# превью называются по имени источника, повторная запись их заменяет
+THUMBNAIL_STORAGE = 'posts.storage.ThumbnailStorage'
+
+# загрузки пишутся сразу во временный файл, а не в память
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+# загруженные картинки ужимаются до этого размера по большей стороне
+IMAGE_MAX_SIZE = 2560
+IMAGE_JPEG_QUALITY = 85
+
+# потоки, которые заранее создают превью загруженных картинок;
+# 0 - создавать сразу при сохранении
+THUMBNAIL_WORKERS = 2
 
 
 LOGIN_URL = '/auth/login/'
@@ -127,8 +151,56 @@ LOGIN_REDIRECT_URL = 'index'
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
+# общий для всех воркеров на машине кэш в файле, отображенном в память
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'yatube.mmap_cache.MmapCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'yatube.cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+            'MAX_SIZE': 64 * 1024 * 1024,
+        },
     }
 }
+
+# авторы, у которых подписчиков больше этого числа, не рассылают посты
+# по лентам, а подмешиваются в ленту при чтении
+TIMELINE_FANOUT_LIMIT = 1000
+
+# популярное (posts/trending.py): за сколько часов вклад активности
+# падает вдвое, сколько часов активности учитывать и сколько постов
+# и сообществ показывать
+TRENDING_HALF_LIFE = 6
+TRENDING_WINDOW = 48
+TRENDING_SIZE = 20
+
+# бэкенд поиска по постам; None - поиск PostgreSQL на postgres-базе,
+# иначе встроенный индекс posts.search.inverted.InvertedIndexBackend
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND')
+SEARCH_INDEX_DIR = os.path.join(BASE_DIR, 'search_index')
+
+# оповещения о новых личных сообщениях (private_messages/hub.py):
+# InProcessHub - в пределах процесса, FileHub - для нескольких
+# процессов на одной машине; сколько секунд держать long-poll запрос
+PM_HUB_BACKEND = os.getenv(
+    'PM_HUB_BACKEND', 'private_messages.hub.InProcessHub')
+PM_HUB_DIR = os.path.join(tempfile.gettempdir(), 'yatube.pm_hub')
+PM_LONG_POLL_TIMEOUT = 25
+
+# метрики страниц (yatube/metrics.py): куда воркеры сохраняют свои
+# счетчики (None - не сохранять) и как часто
+METRICS_DIR = os.path.join(tempfile.gettempdir(), 'yatube.metrics')
+METRICS_FLUSH_INTERVAL = 5
+
+# тесты не делят с запущенным сайтом файлы кэша, индекса и метрик:
+# у каждого прогона свой временный каталог
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+if TESTING:
+    TEST_DIR = tempfile.mkdtemp(prefix='yatube-test-')
+    atexit.register(shutil.rmtree, TEST_DIR, ignore_errors=True)
+    CACHES['default']['LOCATION'] = os.path.join(TEST_DIR, 'yatube.cache')
+    SEARCH_INDEX_DIR = os.path.join(TEST_DIR, 'search_index')
+    MEDIA_ROOT = os.path.join(TEST_DIR, 'media')
+    METRICS_DIR = os.path.join(TEST_DIR, 'metrics')
+    # превью создаются сразу: поток пула пережил бы тест и его настройки
+    THUMBNAIL_WORKERS = 0
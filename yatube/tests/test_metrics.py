@@ -0,0 +1,120 @@
+import json
+import os
+import tempfile
+import threading
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from yatube import metrics
+
+
+def parse(text):
+    """
+    {строка метрики с метками: значение}
+    """
+    return {
+        line.rsplit(' ', 1)[0]: float(line.rsplit(' ', 1)[1])
+        for line in text.splitlines() if not line.startswith('#')}
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(METRICS_DIR=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        cache.clear()
+
+    def scrape(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        return parse(response.content.decode())
+
+    def test_view_metrics(self):
+        before = self.scrape()
+        self.client.get(reverse('index'))
+        after = self.scrape()
+
+        def delta(sample):
+            return after.get(sample, 0) - before.get(sample, 0)
+
+        view = 'view="index"'
+        self.assertEqual(
+            delta(f'yatube_requests_total{{{view},status="200"}}'), 1)
+        self.assertEqual(
+            delta(f'yatube_request_duration_seconds_count{{{view}}}'), 1)
+        self.assertEqual(
+            delta(f'yatube_request_duration_seconds_bucket'
+                  f'{{{view},le="+Inf"}}'), 1)
+        self.assertGreater(delta(f'yatube_db_queries_total{{{view}}}'), 0)
+        self.assertGreater(
+            delta(f'yatube_template_duration_seconds_total{{{view}}}'), 0)
+        self.assertGreater(delta(f'yatube_cache_misses_total{{{view}}}'), 0)
+
+    def test_page_cache_hits_are_counted(self):
+        self.client.get(reverse('index'))
+        before = self.scrape()
+        self.client.get(reverse('index'))
+        after = self.scrape()
+        sample = 'yatube_cache_hits_total{view="index"}'
+        self.assertGreater(after[sample], before.get(sample, 0))
+
+    def test_finished_threads_are_kept_in_sum(self):
+        for _ in range(2):
+            thread = threading.Thread(
+                target=metrics.inc, args=('yatube_db_queries_total',
+                                          ('view', 'thread_test'), 3))
+            thread.start()
+            thread.join()
+        counters = {
+            (name, tuple(labels)): value
+            for (name, labels), value in metrics.snapshot()['counters']}
+        self.assertEqual(
+            counters['yatube_db_queries_total', ('view', 'thread_test')], 6)
+        self.assertNotIn(thread, metrics._stores)
+
+    @override_settings(METRICS_DIR=None)
+    def test_without_metrics_dir(self):
+        self.client.get(reverse('index'))
+        metrics.flush()
+        self.assertIn(
+            'yatube_requests_total{view="index",status="200"}',
+            self.scrape())
+
+    def write_worker(self, worker, value):
+        other = {
+            'counters': [
+                [['yatube_requests_total',
+                  ['view', 'worker_test', 'status', '200']], value]],
+            'histograms': []}
+        with open(metrics._path(worker), 'w') as file:
+            json.dump(other, file)
+
+    def test_workers_are_summed(self):
+        # живой процесс, но не этот
+        self.write_worker(metrics._worker_name(os.getppid()), 5)
+        metrics.inc(
+            'yatube_requests_total', ('view', 'worker_test', 'status', '200'))
+        metrics.flush()
+        samples = self.scrape()
+        self.assertEqual(
+            samples['yatube_requests_total'
+                    '{view="worker_test",status="200"}'], 6)
+
+    def test_stopped_workers_are_archived(self):
+        sample = 'yatube_requests_total{view="worker_test",status="200"}'
+        # тот же pid, но другое время запуска - процессы уже завершились
+        stopped = f'{os.getpid()}-0'
+        self.write_worker(stopped, 5)
+
+        self.assertEqual(self.scrape()[sample], 5)
+        self.assertFalse(os.path.exists(metrics._path(stopped)))
+
+        # следующий процесс с этим pid считал с нуля
+        self.write_worker(f'{os.getpid()}-1', 2)
+        self.assertEqual(self.scrape()[sample], 7)
+        self.assertEqual(self.scrape()[sample], 7)
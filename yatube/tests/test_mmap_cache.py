@@ -0,0 +1,114 @@
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.test import SimpleTestCase
+
+from yatube.mmap_cache import TOMBSTONE_RATIO, MmapCache
+
+
+def increment(location, times):
+    cache = MmapCache(location, {'OPTIONS': {'MAX_SIZE': 1024 * 1024}})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class MmapCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.location = os.path.join(directory.name, 'cache')
+        self.cache = self.make_cache()
+
+    def make_cache(self, **options):
+        options.setdefault('MAX_SIZE', 1024 * 1024)
+        return MmapCache(self.location, {'OPTIONS': options})
+
+    def test_set_get_delete(self):
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        self.assertIn('key', self.cache)
+
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+        self.assertEqual(self.cache.get('key', 'default'), 'default')
+
+    def test_add(self):
+        self.assertTrue(self.cache.add('key', 1))
+        self.assertFalse(self.cache.add('key', 2))
+        self.assertEqual(self.cache.get('key'), 1)
+
+    def test_expiry(self):
+        self.cache.set('key', 1, timeout=0.1)
+        time.sleep(0.2)
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_many(self):
+        self.cache.set_many({'a': 1, 'b': 2})
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2})
+
+        self.cache.delete_many(['a', 'b'])
+        self.assertEqual(self.cache.get_many(['a', 'b']), {})
+
+    def test_entries_are_shared_between_instances(self):
+        self.cache.set('key', 'value')
+        self.assertEqual(self.make_cache().get('key'), 'value')
+
+    def test_lru_eviction(self):
+        cache = self.make_cache(MAX_ENTRIES=10)
+        cache.set('hot', 'value')
+        for i in range(50):
+            cache.get('hot')
+            cache.set(f'key{i}', i)
+
+        self.assertEqual(cache.get('hot'), 'value')
+        self.assertIsNone(cache.get('key0'))
+        self.assertEqual(cache.get('key49'), 49)
+
+    def test_size_cap(self):
+        cache = self.make_cache(MAX_SIZE=64 * 1024)
+        for i in range(100):
+            cache.set(f'key{i}', 'x' * 1024)
+
+        self.assertLessEqual(cache._read_header()[0], 64 * 1024)
+        self.assertEqual(cache.get('key99'), 'x' * 1024)
+        self.assertIsNone(cache.get('key0'))
+
+    def test_incr_is_atomic_between_processes(self):
+        self.cache.set('counter', 0)
+        workers = [
+            multiprocessing.Process(
+                target=increment, args=(self.location, 200))
+            for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(self.cache.get('counter'), 800)
+
+    def test_incr_missing_key(self):
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_clear(self):
+        self.cache.set('key', 1)
+        self.cache.clear()
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_deleted_slots_are_reclaimed(self):
+        cache = self.make_cache(MAX_ENTRIES=10)
+        cache.set_many({f'keep{n}': n for n in range(5)})
+        for n in range(100):
+            cache.set(f'churn{n}', n)
+            cache.delete(f'churn{n}')
+
+        _, _, count, deleted = cache._read_header()
+        self.assertEqual(count, 5)
+        self.assertLessEqual(deleted, cache._slots * TOMBSTONE_RATIO)
+        self.assertEqual(
+            cache.get_many([f'keep{n}' for n in range(5)]),
+            {f'keep{n}': n for n in range(5)})
+        self.assertIsNone(cache.get('churn0'))
@@ -4,6 +4,10 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from posts.views import serve_media
+
+from .metrics import metrics_view
+
 handler404 = 'posts.views.page_not_found'  # noqa
 handler500 = 'posts.views.server_error'  # noqa
 
@@ -12,6 +16,7 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
+    path('metrics', metrics_view, name='metrics'),
     path('', include('posts.urls')),
     path('about/', include('about.urls', namespace='about')),
     path('chat/', include('private_messages.urls')),
@@ -20,7 +25,8 @@ urlpatterns = [
 if settings.DEBUG:
     import debug_toolbar
     urlpatterns += static(
-        settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+        settings.MEDIA_URL, view=serve_media,
+        document_root=settings.MEDIA_ROOT)
     urlpatterns += static(
         settings.STATIC_URL, document_root=settings.STATIC_ROOT)
     urlpatterns += (path('__debug__/', include(debug_toolbar.urls)),)